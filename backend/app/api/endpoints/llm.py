@@ -0,0 +1,42 @@
+"""
+LLM 调用状态 API 端点
+"""
+
+import asyncio
+from fastapi import APIRouter
+from typing import Dict, Any
+
+from app.core.config import settings
+from app.services.llm_cache import llm_cache
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_providers import TokenUsage
+from app.services.llm_retry import llm_retry
+from app.services.llm_router import llm_router
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def llm_stats() -> Dict[str, Any]:
+    """
+    LLM 调用统计：各服务商的健康状态与 token 用量（含前缀缓存命中）、
+    结果缓存、重试和并发控制
+    """
+    router_stats = llm_router.stats()
+
+    # 汇总各服务商的 token 用量
+    usage = TokenUsage()
+    for provider in llm_router.providers:
+        usage.requests += provider.usage.requests
+        usage.prompt_tokens += provider.usage.prompt_tokens
+        usage.cached_tokens += provider.usage.cached_tokens
+        usage.completion_tokens += provider.usage.completion_tokens
+
+    return {
+        "prompt_layout": settings.LLM_PROMPT_LAYOUT,
+        "usage": usage.stats(),
+        "router": router_stats,
+        "cache": await asyncio.to_thread(llm_cache.stats),
+        "retry": llm_retry.stats(),
+        "concurrency": llm_limiter.stats()
+    }
@@ -2,8 +2,9 @@
 规则管理 API 端点
 """
 
+import asyncio
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, HTTPException, Query, Depends
 from sqlmodel import select
 from sqlalchemy.orm import Session
@@ -15,9 +16,12 @@ from app.models.rule import (
     RuleSetCreate, RuleSetUpdate, RuleSetPublic, RuleSetWithRules,
     RuleType, RuleScope
 )
+from app.services.rule_dry_run import dry_run_rule
 from app.services.rule_engine import rule_engine
+from app.services.rule_plan import compile_rule
+from app.services.rule_profiler import SORT_FIELDS, rule_profiler
 from app.services.rule_service import RuleService
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 router = APIRouter()
 
@@ -28,7 +32,7 @@ router = APIRouter()
 async def create_rule(rule_data: RuleCreate, session: SessionDep):
     """创建新规则"""
     # 验证规则
-    validation_result = await rule_engine.validate_rule(rule_data.dict())
+    validation_result = await asyncio.to_thread(rule_engine.validate_rule, rule_data.dict())
     if not validation_result["valid"]:
         raise HTTPException(
             status_code=400,
@@ -97,7 +101,7 @@ async def update_rule(rule_id: int, rule_update: RuleUpdate, session: SessionDep
         # 合并当前规则数据和更新数据进行验证
         rule_dict = rule.dict()
         rule_dict.update(update_data)
-        validation_result = await rule_engine.validate_rule(rule_dict)
+        validation_result = await asyncio.to_thread(rule_engine.validate_rule, rule_dict)
         if not validation_result["valid"]:
             raise HTTPException(
                 status_code=400,
@@ -111,6 +115,7 @@ async def update_rule(rule_id: int, rule_update: RuleUpdate, session: SessionDep
     rule.updated_at = datetime.utcnow()
     session.commit()
     session.refresh(rule)
+    rule_engine.invalidate_rule(rule_id)
     
     return rule
 
@@ -124,6 +129,7 @@ async def delete_rule(rule_id: int, session: SessionDep):
     
     session.delete(rule)
     session.commit()
+    rule_engine.invalidate_rule(rule_id)
     
     return {"message": "规则已删除"}
 
@@ -145,7 +151,7 @@ async def test_rule(
     
     # 测试规则
     rule_dict = rule.dict()
-    result = await rule_engine.test_rule(test_text, rule_dict)
+    result = await asyncio.to_thread(rule_engine.test_rule, test_text, rule_dict)
     
     return result
 
@@ -260,6 +266,7 @@ async def update_rule_set(
     rule_set.updated_at = datetime.utcnow()
     session.commit()
     session.refresh(rule_set)
+    rule_engine.invalidate_rule_set(rule_set_id)
     
     return rule_set
 
@@ -273,6 +280,7 @@ async def delete_rule_set(rule_set_id: int, session: SessionDep):
     
     session.delete(rule_set)
     session.commit()
+    rule_engine.invalidate_rule_set(rule_set_id)
     
     return {"message": "规则集已删除"}
 
@@ -292,9 +300,9 @@ async def test_rule_set(
     if not test_text:
         raise HTTPException(status_code=400, detail="测试文本不能为空")
     
-    # 应用规则集
+    # 应用规则集，反复修改同一文本测试时只重新执行变化的部分
     result_text, rule_info = await rule_engine.apply_rules(
-        test_text, rule_set_id
+        test_text, rule_set_id, incremental=test_data.get("incremental", True)
     )
     
     return {
@@ -303,7 +311,8 @@ async def test_rule_set(
         "result_text": result_text,
         "applied_rules": rule_info.get("applied_rules", []),
         "transformations": rule_info.get("transformations", []),
-        "total_rules_applied": rule_info.get("total_rules_applied", 0)
+        "total_rules_applied": rule_info.get("total_rules_applied", 0),
+        "incremental": rule_info.get("incremental")
     }
 
 
@@ -334,10 +343,95 @@ async def get_rule_scopes():
 @router.get("/default-rules")
 async def get_default_rules():
     """获取默认规则列表"""
-    default_rules = await rule_engine._get_default_rules()
+    default_rules = rule_engine._get_default_rules()
     return default_rules
 
 
+@router.get("/engine/cache-stats")
+async def get_engine_cache_stats():
+    """获取规则引擎缓存统计（正则编译、执行计划、规则集）"""
+    return rule_engine.cache_stats()
+
+
+@router.get("/engine/profile")
+async def get_engine_profile(
+    session: SessionDep,
+    top: int = Query(20, ge=1, le=500),
+    sort_by: str = Query("total_time")
+):
+    """获取最近时间窗口内的规则执行统计，附带数据库中的规则使用统计"""
+    if sort_by not in SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的排序字段，可选: {', '.join(SORT_FIELDS)}"
+        )
+    
+    report = rule_profiler.report(top=top, sort_by=sort_by)
+    pending = rule_profiler.pending_usage()
+    
+    rule_ids = [row["rule_id"] for row in report["rules"] if isinstance(row["rule_id"], int)]
+    db_rules = {}
+    if rule_ids:
+        statement = select(Rule).where(Rule.id.in_(rule_ids))
+        db_rules = {rule.id: rule for rule in session.exec(statement).all()}
+    
+    for row in report["rules"]:
+        rule = db_rules.get(row["rule_id"])
+        row["usage_count"] = rule.usage_count if rule else None
+        row["success_rate"] = rule.success_rate if rule else None
+        row["pending_usage"] = pending.get(row["rule_id"], (0, 0))[0]
+    
+    return report
+
+
+@router.post("/engine/profile/flush")
+async def flush_engine_profile():
+    """立即将累积的规则使用统计写回数据库"""
+    updated = await asyncio.to_thread(rule_profiler.flush_usage)
+    return {"success": True, "updated_rules": updated}
+
+
+class RuleDryRunRequest(BaseModel):
+    """规则试运行请求：指定已有规则，或直接给出候选规则（可覆盖已有规则的字段）"""
+    rule_id: Optional[int] = None
+    name: Optional[str] = None
+    pattern: Optional[str] = None
+    replacement: Optional[str] = None
+    conditions: Optional[Dict[str, Any]] = None
+    limit: Optional[int] = Field(default=None, ge=1, description="最多评估的笔录数")
+    samples: int = Field(default=10, ge=0, le=100, description="返回的示例差异数量")
+
+
+@router.post("/rules/dry-run")
+async def dry_run_rule_on_corpus(request: RuleDryRunRequest, session: SessionDep):
+    """
+    在全部已存储笔录上试运行规则，返回匹配统计、改动规模分布和示例差异
+    
+    不修改任何数据，用于在保存规则前评估修改的影响范围。
+    """
+    rule_dict = {"name": "试运行规则"}
+    if request.rule_id is not None:
+        rule = session.get(Rule, request.rule_id)
+        if not rule:
+            raise HTTPException(status_code=404, detail="规则不存在")
+        rule_dict = rule.dict()
+    
+    for field in ("name", "pattern", "replacement", "conditions"):
+        value = getattr(request, field)
+        if value is not None:
+            rule_dict[field] = value
+    
+    if not rule_dict.get("pattern"):
+        raise HTTPException(status_code=400, detail="规则的正则表达式不能为空")
+    
+    compiled = compile_rule(rule_dict)
+    if compiled is None:
+        raise HTTPException(status_code=400, detail="规则的正则表达式或替换模板无效")
+    
+    result = await asyncio.to_thread(dry_run_rule, compiled, request.limit, request.samples)
+    return {"success": True, **result}
+
+
 class RuleGenerateRequest(BaseModel):
     description: str
 
@@ -389,6 +483,7 @@ def update_rule(rule_id: int, rule: RuleUpdate, session: SessionDep):
     updated_rule = rule_service.update_rule(rule_id, rule)
     if not updated_rule:
         raise HTTPException(status_code=404, detail="规则不存在")
+    rule_engine.invalidate_rule(rule_id)
     return updated_rule
 
 @router.delete("/{rule_id}")
@@ -400,4 +495,5 @@ def delete_rule(rule_id: int, session: SessionDep):
     success = rule_service.delete_rule(rule_id)
     if not success:
         raise HTTPException(status_code=404, detail="规则不存在")
+    rule_engine.invalidate_rule(rule_id)
     return {"message": "规则删除成功"} 
\ No newline at end of file
@@ -5,8 +5,8 @@
 
 import time
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Form, Query
+from typing import List, Literal, Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Form, Query, Header
 from fastapi.responses import StreamingResponse
 import io
 from pydantic import BaseModel
@@ -20,19 +20,72 @@ from app.models.supabase_models import (
     ConversionHistorySummary
 )
 from app.services.supabase_service import ConversionHistoryService
+from app.services.llm_limiter import LLMPriority, llm_priority
 from app.services.llm_service_simple import simple_llm_service
+from app.services.stream_sessions import StreamSessionLimitError, parse_event_id, stream_sessions
 
 router = APIRouter()
 
+# 流式协议版本：1 每块附带全文，2 仅增量、可断点续传；其他值返回 422
+StreamProtocol = Literal[1, 2]
+
 
 class SimpleConversionRequest(BaseModel):
     text: str
+    protocol: StreamProtocol = 1
 
 
 class AdvancedConversionRequest(BaseModel):
     text: str
     rule_config: Optional[Dict[str, Any]] = None
     conversation_type: Optional[str] = None
+    protocol: StreamProtocol = 1
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "Cache-Control, Last-Event-ID"
+}
+
+
+def _stream_conversion_response(
+    text: str,
+    rule_config: Optional[Dict[str, Any]],
+    protocol: StreamProtocol
+) -> StreamingResponse:
+    """
+    按协议版本返回流式转换响应
+    
+    v2 协议在后台会话中生成事件，响应头 X-Stream-Id 为会话ID，
+    断开后可通过 GET /convert/stream/{会话ID} 续传；进行中的会话数
+    达到 LLM_SSE_MAX_SESSIONS 时返回 503。
+    """
+    if protocol == 2:
+        events = simple_llm_service.stream_conversion_events(text, rule_config, protocol=2)
+        try:
+            session = stream_sessions.start(events)
+        except StreamSessionLimitError as e:
+            logger.warning(str(e))
+            raise HTTPException(
+                status_code=503,
+                detail="当前流式转换请求过多，请稍后重试"
+            )
+        return StreamingResponse(
+            session.replay(),
+            media_type="text/event-stream",
+            headers={**SSE_HEADERS, "X-Stream-Id": session.id}
+        )
+    
+    return StreamingResponse(
+        simple_llm_service.stream_convert_transcription(
+            original_text=text,
+            rule_config=rule_config
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
 
 @router.post("/upload", response_model=ConversionHistory)
@@ -379,8 +432,9 @@ async def process_supabase_transcription(
     try:
         start_time = time.time()
         
-        # 执行转换
-        converted_text = await simple_llm_service.convert_transcription(original_text, rule_id)
+        # 执行转换（后台任务排在交互式请求之后）
+        with llm_priority(LLMPriority.BATCH):
+            converted_text = await simple_llm_service.convert_transcription(original_text, rule_id)
         
         processing_time = time.time() - start_time
         
@@ -578,7 +632,7 @@ async def smart_conversion_test(request: SimpleConversionRequest):
 async def stream_conversion(request: AdvancedConversionRequest):
     """
     流式转换API - 实时返回转换进度和结果
-    支持Server-Sent Events (SSE)
+    支持Server-Sent Events (SSE)，protocol=2 时使用仅增量、可续传的 v2 协议
     """
     # 验证输入
     if not request.text.strip():
@@ -597,20 +651,10 @@ async def stream_conversion(request: AdvancedConversionRequest):
         logger.info(f"开始流式转换，文本长度: {len(request.text)}")
         
         # 返回流式响应
-        return StreamingResponse(
-            simple_llm_service.stream_convert_transcription(
-                original_text=request.text,
-                rule_config=request.rule_config
-            ),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Cache-Control"
-            }
-        )
+        return _stream_conversion_response(request.text, request.rule_config, request.protocol)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"流式转换API失败: {str(e)}")
         raise HTTPException(
@@ -619,6 +663,35 @@ async def stream_conversion(request: AdvancedConversionRequest):
         )
 
 
+@router.get("/convert/stream/{stream_id}")
+async def resume_stream_conversion(stream_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    续传 v2 协议的流式转换，从 Last-Event-ID 之后的事件开始发送
+    
+    未带 Last-Event-ID 时从头发送；会话结束超过 LLM_SSE_SESSION_TTL 秒后不可续传，
+    所需事件已因超过 LLM_SSE_SESSION_MAX_BYTES 被丢弃时返回 410。
+    """
+    session = stream_sessions.get(stream_id)
+    if session is None:
+        raise HTTPException(
+            status_code=404,
+            detail="流式会话不存在或已过期"
+        )
+    
+    parsed = parse_event_id(last_event_id)
+    after = parsed[1] if parsed is not None and parsed[0] == stream_id else 0
+    if not session.can_replay(after):
+        raise HTTPException(
+            status_code=410,
+            detail="续传所需的事件已被丢弃，请重新发起转换"
+        )
+    return StreamingResponse(
+        session.replay(after),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Stream-Id": session.id}
+    )
+
+
 @router.post("/convert/stream-simple")
 async def stream_simple_conversion(request: SimpleConversionRequest):
     """
@@ -641,20 +714,10 @@ async def stream_simple_conversion(request: SimpleConversionRequest):
         logger.info(f"开始简化流式转换，文本长度: {len(request.text)}")
         
         # 返回流式响应
-        return StreamingResponse(
-            simple_llm_service.stream_convert_transcription(
-                original_text=request.text,
-                rule_config=None
-            ),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "Cache-Control"
-            }
-        )
+        return _stream_conversion_response(request.text, None, request.protocol)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"简化流式转换API失败: {str(e)}")
         raise HTTPException(
@@ -2,13 +2,18 @@
 笔录转换 API 端点
 """
 
+import codecs
 import time
 from datetime import datetime
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional
 from fastapi import APIRouter, HTTPException, BackgroundTasks, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from pydantic import BaseModel
 from sqlmodel import select
 import io
 
+from app.core.config import settings
 from app.core.database import SessionDep
 from app.models.transcription import (
     Transcription, 
@@ -17,11 +22,18 @@ from app.models.transcription import (
     TranscriptionSummary,
     TranscriptionStatus
 )
+from app.services.llm_limiter import LLMPriority, llm_priority
 from app.services.llm_service import llm_service
+from app.services.rule_engine import rule_engine
 
 router = APIRouter()
 
 
+class StreamConversionRequest(BaseModel):
+    original_text: str
+    rule_config: Optional[Dict[str, Any]] = None
+
+
 @router.post("/upload", response_model=TranscriptionPublic)
 async def upload_file_conversion(
     file: UploadFile = File(...),
@@ -47,13 +59,8 @@ async def upload_file_conversion(
             detail=f"不支持的文件类型: {file.content_type}。支持的类型: {', '.join(allowed_types.values())}"
         )
     
-    # 验证文件大小 (10MB)
-    content = await file.read()
-    if len(content) > 10 * 1024 * 1024:
-        raise HTTPException(
-            status_code=400,
-            detail="文件大小超过限制 (最大10MB)"
-        )
+    # 验证文件大小 (10MB)，超出时不再继续读取
+    content = await _read_upload(file)
     
     try:
         # 提取文本内容
@@ -140,6 +147,61 @@ async def upload_file_conversion(
         )
 
 
+@router.post("/upload/stream")
+async def stream_file_preprocessing(
+    file: UploadFile = File(...),
+    rule_set_id: Optional[int] = Form(None)
+):
+    """
+    上传文本文件，流式返回规则预处理后的文本
+    
+    文件边读取边解码、边应用规则，不受 50000 字符的限制，
+    内存占用与文件大小无关（规则需要全文时除外）。仅支持 .txt 文件。
+    """
+    if file.content_type != 'text/plain':
+        raise HTTPException(
+            status_code=400,
+            detail=f"流式处理仅支持 txt 文件，当前类型: {file.content_type}"
+        )
+    
+    chunk_size = settings.RULE_STREAM_CHUNK_SIZE
+    first = await file.read(chunk_size)
+    if not first.strip():
+        raise HTTPException(status_code=400, detail="文件内容为空")
+    
+    # 编码由第一块内容确定，之后才开始输出
+    decoder = _detect_decoder(first, final=len(first) < chunk_size)
+    if decoder is None:
+        raise HTTPException(
+            status_code=400,
+            detail="无法解码文件内容，请确保文件为UTF-8或GBK编码"
+        )
+    
+    async def decoded_chunks() -> AsyncIterator[str]:
+        total = len(first)
+        yield decoder.decode(first)
+        while True:
+            data = await file.read(chunk_size)
+            if not data:
+                break
+            total += len(data)
+            if total > settings.MAX_FILE_SIZE:
+                raise ValueError("文件大小超过限制 (最大10MB)")
+            yield decoder.decode(data)
+        yield decoder.decode(b"", final=True)
+    
+    async def processed_chunks() -> AsyncIterator[str]:
+        try:
+            async for piece in rule_engine.apply_rules_stream(decoded_chunks(), rule_set_id):
+                yield piece
+        except Exception as e:
+            # 响应已开始发送，只能中断输出
+            logger.error(f"流式预处理 {file.filename} 失败: {e}")
+            raise
+    
+    return StreamingResponse(processed_chunks(), media_type="text/plain; charset=utf-8")
+
+
 @router.post("/convert", response_model=TranscriptionPublic)
 async def create_transcription(
     transcription_data: TranscriptionCreate,
@@ -181,6 +243,34 @@ async def create_transcription(
     return transcription
 
 
+@router.post("/convert/stream")
+async def stream_conversion(request: StreamConversionRequest):
+    """
+    流式转换，以 Server-Sent Events 返回
+    
+    处理流程与 /convert 相同（预处理规则、LLM 转换、后处理规则、质量检验），
+    chunk 事件为已完成后处理的文本增量，complete 事件包含完整结果。
+    不创建转换记录。
+    """
+    if not request.original_text.strip():
+        raise HTTPException(status_code=400, detail="文本内容为空")
+    
+    if len(request.original_text) > 50000:
+        raise HTTPException(
+            status_code=400, 
+            detail="文本长度超过限制 (最大50000字符)"
+        )
+    
+    return StreamingResponse(
+        llm_service.stream_convert_transcription(request.original_text, request.rule_config),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 @router.get("/convert/test", response_model=dict)
 async def test_conversion():
     """
@@ -315,6 +405,38 @@ async def list_saved_transcriptions(
     ]
 
 
+async def _read_upload(file: UploadFile) -> bytes:
+    """分块读取上传文件，超过 MAX_FILE_SIZE 时立即拒绝"""
+    parts = []
+    total = 0
+    while True:
+        data = await file.read(settings.RULE_STREAM_CHUNK_SIZE)
+        if not data:
+            break
+        total += len(data)
+        if total > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail="文件大小超过限制 (最大10MB)"
+            )
+        parts.append(data)
+    return b"".join(parts)
+
+
+def _detect_decoder(data: bytes, final: bool) -> Optional[codecs.IncrementalDecoder]:
+    """按 UTF-8、GBK 的顺序选择能解码首块内容的增量解码器"""
+    # GB2312 是 GBK 的子集，无需单独尝试
+    for encoding in ['utf-8', 'gbk']:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(data, final=final)
+        except UnicodeDecodeError:
+            continue
+        decoder.reset()
+        return decoder
+    return None
+
+
 async def process_transcription(
     transcription_id: int, 
     original_text: str, 
@@ -338,12 +460,13 @@ async def process_transcription(
             transcription.updated_at = datetime.utcnow()
             session.commit()
             
-            # 执行转换
+            # 执行转换（后台任务排在交互式请求之后）
             start_time = time.time()
-            conversion_result = await llm_service.convert_transcription(
-                original_text, 
-                rule_config
-            )
+            with llm_priority(LLMPriority.BATCH):
+                conversion_result = await llm_service.convert_transcription(
+                    original_text, 
+                    rule_config
+                )
             processing_time = time.time() - start_time
             
             if conversion_result.get("success"):
@@ -3,7 +3,7 @@ API 路由配置
 """
 
 from fastapi import APIRouter
-from app.api.endpoints import transcription, rules, advanced_quality
+from app.api.endpoints import transcription, rules, advanced_quality, llm
 
 # 创建主路由器
 api_router = APIRouter()
@@ -26,4 +26,11 @@ api_router.include_router(
     advanced_quality.router,
     prefix="/quality",
     tags=["advanced-quality"]
-) 
\ No newline at end of file
+)
+
+# LLM 调用统计路由
+api_router.include_router(
+    llm.router,
+    prefix="/llm",
+    tags=["llm"]
+)
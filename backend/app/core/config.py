@@ -2,11 +2,17 @@
 应用核心配置
 """
 
+from pathlib import Path
 from typing import List, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+# 后端目录及运行时数据目录，数据文件不随启动时的工作目录变化
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+DATA_DIR = BACKEND_DIR / "data"
+
+
 class Settings(BaseSettings):
     """应用配置类"""
     
@@ -50,6 +56,54 @@ class Settings(BaseSettings):
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "qwen2.5:7b-instruct"
     
+    # LLM 服务商路由配置
+    LLM_PROVIDERS: List[str] = ["deepseek"]  # 启用的服务商，按偏好顺序（deepseek、openai、ollama）
+    LLM_PROVIDER_FAILURE_THRESHOLD: int = 3  # 连续失败该次数后暂停使用该服务商
+    LLM_PROVIDER_COOLDOWN: float = 30.0  # 暂停使用的时长(秒)
+    
+    # LLM 连接池配置
+    LLM_HTTP2: bool = True  # LLM 请求使用 HTTP/2（需安装 httpx[http2]）
+    LLM_POOL_MAX_CONNECTIONS: int = 20  # 共享客户端的最大连接数
+    LLM_POOL_MAX_KEEPALIVE: int = 10  # 保持空闲的最大连接数
+    LLM_POOL_KEEPALIVE_EXPIRY: float = 60.0  # 空闲连接保持时间(秒)
+    
+    # LLM 并发控制配置
+    LLM_CONCURRENCY_INITIAL: int = 4  # 初始并发上限
+    LLM_CONCURRENCY_MIN: int = 1  # 并发上限的下限
+    LLM_CONCURRENCY_MAX: int = 16  # 并发上限的上限
+    LLM_CONCURRENCY_BACKOFF: float = 0.5  # 遇到限流/服务端错误/超时时上限的缩减倍数
+    
+    # LLM 重试配置
+    LLM_RETRY_ATTEMPTS: int = 3  # 最多尝试次数（含首次）
+    LLM_RETRY_BASE_DELAY: float = 1.0  # 首次重试前的最大等待时间(秒)，此后指数增长
+    LLM_RETRY_MAX_DELAY: float = 20.0  # 重试等待时间上限(秒)
+    LLM_ATTEMPT_TIMEOUT: float = 120.0  # 单次尝试的时限(秒)，所有尝试共享 DEFAULT_TIMEOUT
+    LLM_HEDGE_ENABLED: bool = False  # 是否对慢请求发起对冲请求
+    LLM_HEDGE_QUANTILE: float = 0.95  # 超过近期成功请求耗时的该分位数时发起对冲
+    LLM_HEDGE_MIN_DELAY: float = 5.0  # 发起对冲请求前的最短等待时间(秒)
+    
+    # 长笔录分块转换配置
+    LLM_CHUNK_THRESHOLD: int = 6000  # 超过该长度的笔录分块转换
+    LLM_CHUNK_SIZE: int = 4000  # 每块的最大长度(字符)
+    LLM_CHUNK_CONCURRENCY: int = 4  # 同时转换的块数
+    LLM_STITCH_WINDOW: int = 200  # 拼接处前后参与润色的文字长度(字符)
+    
+    # 提示词布局配置
+    LLM_PROMPT_LAYOUT: str = "split"  # split: 指令和示例作为固定的系统消息，笔录作为用户消息；inline: 合为一条用户消息
+    
+    # 流式转换 SSE 配置
+    LLM_SSE_PROGRESS_INTERVAL: float = 0.5  # 进度事件的最短间隔(秒)
+    LLM_SSE_CHECKPOINT_CHARS: int = 2000  # v2 协议每输出该长度的文本发送一次校验点
+    LLM_SSE_SESSION_TTL: int = 300  # v2 协议的会话结束后保留供断点续传的时长(秒)
+    LLM_SSE_SESSION_MAX_BYTES: int = 2 * 1024 * 1024  # 每个 v2 会话缓存的事件上限(字节)，超出时丢弃最早的事件
+    LLM_SSE_MAX_SESSIONS: int = 100  # 同时保留的 v2 会话数上限
+    
+    # LLM 结果缓存配置
+    LLM_CACHE_ENABLED: bool = True  # 相同请求复用已缓存的 LLM 结果
+    LLM_CACHE_PATH: str = str(DATA_DIR / "llm_cache.db")  # 缓存文件路径
+    LLM_CACHE_TTL: int = 7 * 24 * 3600  # 缓存有效期(秒)
+    LLM_CACHE_MAX_ENTRIES: int = 10000  # 最多保留的缓存条目数
+    
     # 文件上传配置
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_FILE_TYPES: List[str] = [".txt", ".docx"]
@@ -59,6 +113,25 @@ class Settings(BaseSettings):
     MAX_TEXT_LENGTH: int = 50000  # 最大文本长度
     DEFAULT_TIMEOUT: int = 300  # 默认超时时间(秒)
     
+    # 规则引擎配置
+    RULE_SET_CACHE_SIZE: int = 64  # 规则集缓存容量
+    RULE_SET_CACHE_TTL: int = 300  # 规则集缓存最长保留时间(秒)，每次使用前另按数据库版本标识校验
+    PATTERN_CACHE_SIZE: int = 512  # 正则编译缓存容量
+    RULE_ENGINE_OFFLOAD_THRESHOLD: int = 5000  # 超过该长度的文本在线程池中执行规则
+    RULE_ENGINE_WORKERS: int = 4  # 规则执行线程数
+    RULE_ENGINE_PARALLEL_THRESHOLD: int = 20000  # 超过该长度的文本分段并行执行行内规则
+    RULE_ENGINE_PROCESSES: int = 0  # 分段执行进程数，0 表示使用 CPU 核数
+    RULE_PROFILING_ENABLED: bool = False  # 是否记录每条规则的执行耗时等指标
+    RULE_PROFILE_WINDOW: int = 600  # 规则执行统计的时间窗口(秒)
+    RULE_STATS_FLUSH_INTERVAL: int = 60  # 规则使用统计写回数据库的间隔(秒)
+    RULE_EXECUTION_TIMEOUT: float = 2.0  # 有回溯风险的规则单次执行时限(秒)
+    RULE_GUARD_WORKERS: int = 2  # 执行有风险规则的子进程数
+    RULE_VALIDATION_BUDGET: float = 0.5  # 校验规则时对抗性输入测试的时限(秒)
+    RULE_STREAM_WINDOW: int = 4096  # 流式执行规则时跨分块保留的回看窗口(字符)
+    RULE_STREAM_CHUNK_SIZE: int = 64 * 1024  # 流式上传每次读取的字节数
+    LLM_STREAM_RULE_WINDOW: int = 64  # 对 LLM 流式输出应用后处理规则时的回看窗口(字符)，决定输出的暂缓长度
+    RULE_INCREMENTAL_CACHE_SIZE: int = 1024  # 增量执行缓存的文本块结果数量（每块最多 8192 字符）
+    
     # 安全配置
     SECRET_KEY: str = Field(
         default="your-secret-key-change-in-production",
@@ -2,6 +2,8 @@
 笔录转换系统 - FastAPI 主应用入口
 """
 
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -10,6 +12,12 @@ from contextlib import asynccontextmanager
 from app.core.config import settings
 from app.core.database import create_db_and_tables
 from app.api.routes import api_router
+from app.services.http_client import http_client
+from app.services.llm_cache import llm_cache
+from app.services.regex_guard import regex_guard
+from app.services.rule_engine import rule_engine
+from app.services.rule_profiler import rule_profiler
+from app.services.stream_sessions import stream_sessions
 
 
 @asynccontextmanager
@@ -20,10 +28,27 @@ async def lifespan(app: FastAPI):
     create_db_and_tables()
     print("✅ 数据库初始化完成")
     
+    # LLM 请求共用的 HTTP 连接池
+    await http_client.start()
+    
+    # 预先创建执行有风险规则的子进程
+    await asyncio.to_thread(regex_guard.start)
+    
+    # 定期批量写回规则使用统计
+    stats_flush_task = asyncio.create_task(
+        rule_profiler.run_periodic_flush(settings.RULE_STATS_FLUSH_INTERVAL)
+    )
+    
     yield
     
     # 关闭时执行
     print("🔄 正在关闭笔录转换系统...")
+    stats_flush_task.cancel()
+    stream_sessions.close()
+    rule_profiler.flush_usage()
+    rule_engine.shutdown()
+    await http_client.close()
+    llm_cache.close()
 
 
 # 创建 FastAPI 应用实例
@@ -0,0 +1,61 @@
+"""
+共享 HTTP 客户端 - 所有 LLM 调用复用同一个连接池
+
+每次请求新建 httpx.AsyncClient 需要重新建立 TCP/TLS 连接，连接也无法复用。
+这里维护一个随应用生命周期创建和关闭的客户端，启用 HTTP/2 与保持连接，
+连接池大小由配置决定。未经应用启动流程使用（如脚本中直接调用服务）时按需创建。
+"""
+
+import importlib.util
+from typing import Optional
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+
+
+class SharedHttpClient:
+    """应用级共享的 httpx.AsyncClient"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _create(self) -> httpx.AsyncClient:
+        http2 = settings.LLM_HTTP2
+        # HTTP/2 依赖 h2 包 (httpx[http2])，未安装时使用 HTTP/1.1
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("未安装 h2，LLM 请求使用 HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY
+        )
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=limits,
+            timeout=httpx.Timeout(settings.DEFAULT_TIMEOUT, connect=10.0)
+        )
+
+    async def start(self) -> None:
+        """创建客户端（应用启动时调用）"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共享客户端，尚未创建时按需创建"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create()
+        return self._client
+
+    async def close(self) -> None:
+        """关闭客户端并释放连接（应用关闭时调用）"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# 创建全局共享 HTTP 客户端实例
+http_client = SharedHttpClient()
@@ -0,0 +1,162 @@
+"""
+增量规则执行 - 按文本块缓存行内步骤的执行结果
+
+笔录稍作修改后重新执行规则时，大部分对话轮次与上次相同。
+文本在对话轮次边界处切分为文本块，连续的行内步骤在各块上独立执行
+（与分段并行执行相同的前提），以 (执行计划指纹, 起始步骤, 块内容摘要)
+为键缓存每个块的输出，只有内容变化的块需要重新执行。键中只保存 16 字节的
+摘要而不是块内容本身，缓存的内存占用只有各块的输出。
+规则集修改后执行计划指纹随之变化，旧的缓存项不再命中，由 LRU 自然淘汰。
+同时记录修改过的文本块在原文中的区间，供调用方了解本次只有哪些部分需要重新处理。
+
+需要重新执行的文本块总长超过 RULE_ENGINE_PARALLEL_THRESHOLD 时
+（如首次处理一份长笔录），这些块交给分段执行进程池并行执行。
+
+逐轮次缓存的哈希和查找开销会超过执行行内规则本身，因此若干轮次
+合为一块。切分位置由边界后的文本内容决定，而不是由累计长度决定，
+局部修改只影响所在的块，不会使后续块的边界整体移动。
+"""
+
+import hashlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.core.lru_cache import LRUCache
+from app.services.rule_plan import PlanStep, RuleMatch, RulePlan
+from app.services.segment_executor import (
+    TURN_BOUNDARY, apply_segment_steps, merge_segment_matches, segment_executor
+)
+
+
+# 文本块的最小、最大长度
+MIN_BLOCK_SIZE = 1024
+MAX_BLOCK_SIZE = 8192
+
+# 边界后用于决定是否切分的字符数，约 1/4 的轮次边界可作为切分位置。
+# 缓存只在进程内使用，字符串哈希在同一进程内稳定即可
+_CUT_PROBE = 16
+_CUT_MASK = 3
+
+
+def split_blocks(text: str, min_size: int = MIN_BLOCK_SIZE, max_size: int = MAX_BLOCK_SIZE) -> List[str]:
+    """
+    在对话轮次边界处将文本切分为文本块
+
+    每块（最后一块除外）都以换行符结尾，拼接后与原文相同。
+    超过 max_size 仍没有合适的轮次边界时在换行处切分。
+    """
+    blocks = []
+    start = 0
+    length = len(text)
+    while length - start > min_size:
+        cut = -1
+        for match in TURN_BOUNDARY.finditer(text, start + min_size, start + max_size):
+            probe = text[match.start() + 1:match.start() + 1 + _CUT_PROBE]
+            if hash(probe) & _CUT_MASK == 0:
+                cut = match.start()
+                break
+        if cut < 0:
+            cut = text.find("\n", start + max_size)
+            if cut < 0:
+                break
+        blocks.append(text[start:cut + 1])
+        start = cut + 1
+    blocks.append(text[start:])
+    return blocks
+
+
+def block_digest(block: str) -> bytes:
+    """文本块内容摘要，作为缓存键的一部分"""
+    return hashlib.blake2b(block.encode("utf-8"), digest_size=16).digest()
+
+
+def _compute_blocks(
+    steps: Sequence[PlanStep],
+    blocks: List[str]
+) -> List[Tuple[str, List[Tuple[int, int, int, bool, int]]]]:
+    """执行未命中缓存的文本块，总长足够时在分段执行进程池中并行执行"""
+    if (
+        len(blocks) > 1
+        and sum(len(block) for block in blocks) >= settings.RULE_ENGINE_PARALLEL_THRESHOLD
+        and segment_executor.enabled
+    ):
+        try:
+            futures = [segment_executor.submit(apply_segment_steps, steps, block) for block in blocks]
+            return [future.result() for future in futures]
+        except Exception as e:
+            logger.warning(f"文本块并行执行失败，改为顺序执行: {e}")
+            segment_executor.shutdown()
+    return [apply_segment_steps(steps, block) for block in blocks]
+
+
+class IncrementalRuleCache:
+    """行内步骤的分块结果缓存"""
+
+    def __init__(self, max_size: int = 4096):
+        self._cache = LRUCache(max_size)
+
+    def apply_steps(
+        self,
+        text: str,
+        plan: RulePlan,
+        start: int,
+        end: int,
+        counters: Optional[Dict[str, int]] = None
+    ) -> Tuple[str, List[RuleMatch]]:
+        """
+        按文本块执行 plan.steps[start:end]，复用已缓存的文本块结果
+
+        Args:
+            counters: 累计 "segments"（文本块数）和 "recomputed"（重新执行的文本块数）
+
+        Returns:
+            (结果文本, 产生了变化的规则的匹配结果)
+        """
+        steps = plan.steps[start:end]
+        blocks = split_blocks(text)
+        keys = [(plan.fingerprint, start, block_digest(block)) for block in blocks]
+        results = [self._cache.get(key) for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+        computed = _compute_blocks(steps, [blocks[index] for index in missing])
+        for index, result in zip(missing, computed):
+            self._cache.set(keys[index], result)
+            results[index] = result
+
+        if counters is not None:
+            counters["segments"] = counters.get("segments", 0) + len(results)
+            counters["recomputed"] = counters.get("recomputed", 0) + len(missing)
+
+        return "".join(segment for segment, _ in results), merge_segment_matches(steps, results)
+
+    def changed_ranges(self, text: str, plan: RulePlan) -> List[Tuple[int, int]]:
+        """
+        文本中此前未用该执行计划处理过的文本块区间（按原文位置，相邻区间合并）
+
+        与块结果分开记录，表示提交的笔录相对之前版本修改了哪些部分，
+        不受执行计划中非行内步骤改变文本位置的影响。
+        """
+        ranges: List[Tuple[int, int]] = []
+        position = 0
+        for block in split_blocks(text):
+            key = (plan.fingerprint, None, block_digest(block))
+            end = position + len(block)
+            if self._cache.get(key) is None:
+                self._cache.set(key, True)
+                if ranges and ranges[-1][1] == position:
+                    ranges[-1] = (ranges[-1][0], end)
+                else:
+                    ranges.append((position, end))
+            position = end
+        return ranges
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        return self._cache.stats()
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+# 创建全局增量执行缓存实例
+incremental_cache = IncrementalRuleCache(settings.RULE_INCREMENTAL_CACHE_SIZE)
@@ -0,0 +1,169 @@
+"""
+多模式字面量匹配 - 识别纯字面量规则并合并为单次扫描
+
+许多规则本质上是若干固定词语的选择（如语气词 "嗯|啊|呃|那个"），
+逐条执行时每条规则都要完整扫描一遍文本。这里将可安全合并的字面量
+规则编译为一个按字典树组织的正则，在 re 引擎中一次扫描完成全部替换。
+"""
+
+import re
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+# 单条规则展开后允许的最大字面量数量，防止组合爆炸
+MAX_LITERALS_PER_RULE = 256
+
+
+def _expand(items) -> Optional[List[str]]:
+    """按正则选择优先级展开子模式能匹配的全部字面量，不是纯字面量时返回 None"""
+    alternatives = [""]
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            options = [chr(av)]
+        elif op is sre_constants.IN:
+            if not all(item_op is sre_constants.LITERAL for item_op, _ in av):
+                return None
+            options = [chr(code) for _, code in av]
+        elif op is sre_constants.BRANCH:
+            options = []
+            for branch in av[1]:
+                expanded = _expand(branch)
+                if expanded is None:
+                    return None
+                options.extend(expanded)
+        elif op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            if add_flags or del_flags:
+                return None
+            options = _expand(sub)
+            if options is None:
+                return None
+        elif op is sre_constants.MAX_REPEAT and av[0] == av[1] and av[0] <= 4:
+            # 固定次数重复，如 a{2}
+            sub = _expand(av[2])
+            if sub is None:
+                return None
+            options = ["".join(parts) for parts in product(sub, repeat=av[0])]
+        else:
+            return None
+
+        alternatives = [prefix + option for prefix, option in product(alternatives, options)]
+        if len(alternatives) > MAX_LITERALS_PER_RULE:
+            return None
+    return alternatives
+
+
+def _is_run(items) -> bool:
+    """子模式是否为 X+ 形式"""
+    return (
+        len(items) == 1
+        and items[0][0] is sre_constants.MAX_REPEAT
+        and items[0][1][0] == 1
+        and items[0][1][1] is sre_constants.MAXREPEAT
+    )
+
+
+def is_run_pattern(pattern: str, flags: int = 0) -> bool:
+    """
+    正则是否为 (a|b)+ 形式
+
+    这类删除型规则被展开为逐个字面量执行，连续的字面量匹配
+    对应原规则的一次匹配。
+    """
+    try:
+        return _is_run(list(sre_parse.parse(pattern, flags)))
+    except (re.error, TypeError):
+        return False
+
+
+def extract_literals(pattern: str, replacement: str, flags: int = 0) -> Optional[Tuple[str, ...]]:
+    """
+    识别纯字面量规则
+
+    Args:
+        pattern: 规则正则
+        replacement: 替换模板
+        flags: 编译标志
+
+    Returns:
+        按匹配优先级排列的字面量元组；规则含真正的正则语义时返回 None
+    """
+    if "\\" in replacement:
+        # 替换模板含转义或分组引用，需要 re 处理
+        return None
+
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, TypeError):
+        return None
+
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+
+    items = list(parsed)
+    # 删除型规则 (a|b)+ 与逐个删除 a、b 的结果相同
+    if replacement == "" and _is_run(items):
+        items = list(items[0][1][2])
+
+    literals = _expand(items)
+    if not literals or "" in literals:
+        return None
+
+    # 去重并保持优先级
+    return tuple(dict.fromkeys(literals))
+
+
+def _is_prefix_free(literals: Iterable[str]) -> bool:
+    """检查字面量集合中是否没有任何一个是另一个的前缀"""
+    ordered = sorted(literals)
+    return not any(b.startswith(a) for a, b in zip(ordered, ordered[1:]))
+
+
+def _trie_regex(literals: List[str]) -> str:
+    """将无前缀关系的字面量集合编译为字典树结构的正则"""
+    trie: Dict = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict) -> str:
+        branches = []
+        single_chars = []
+        for char, child in node.items():
+            if char == "":
+                continue
+            if list(child) == [""]:
+                single_chars.append(char)
+            else:
+                branches.append(re.escape(char) + render(child))
+        if len(single_chars) == 1:
+            branches.append(re.escape(single_chars[0]))
+        elif single_chars:
+            branches.append("[" + "".join(re.escape(c) for c in single_chars) + "]")
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return render(trie)
+
+
+def build_literal_pattern(literals: List[str]) -> str:
+    """
+    构建匹配一组字面量的正则
+
+    字面量集合无前缀关系时任意位置至多一个字面量能匹配，可以使用字典树
+    结构；否则保留原有顺序的平铺选择，以保持 re 的最左优先语义。
+    """
+    if _is_prefix_free(literals):
+        return _trie_regex(literals)
+    return "|".join(re.escape(literal) for literal in literals)
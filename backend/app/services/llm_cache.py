@@ -0,0 +1,231 @@
+"""
+LLM 调用结果缓存 - 以请求内容指纹为键的磁盘缓存
+
+相同的模型、采样参数和完整消息必然对应同一条缓存项，键为这些内容的
+SHA-256 摘要。结果保存在独立的 SQLite 文件中，服务重启后仍然有效；
+过期项在写入时清理，条目数超过上限时按最近访问时间淘汰。
+同一请求在前一次调用完成前再次到达时，等待前一次的结果而不重复调用。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+from app.core.config import settings
+
+
+# 不影响生成内容的请求字段，不计入指纹
+_IGNORED_FIELDS = ("stream",)
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    """计算请求指纹：模型、采样参数与完整消息的 SHA-256"""
+    content = {key: value for key, value in payload.items() if key not in _IGNORED_FIELDS}
+    encoded = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite 持久化的 LLM 响应缓存"""
+
+    def __init__(self, path: str, ttl: int = 7 * 24 * 3600, max_entries: int = 10000, enabled: bool = True):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # 多个服务进程可共用同一缓存文件
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get_sync(self, key: str) -> Optional[str]:
+        """读取未过期的缓存项，命中时更新访问时间"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE llm_cache SET accessed_at = ?, hits = hits + 1 WHERE key = ?",
+                (now, key)
+            )
+            conn.commit()
+            return row[0]
+
+    def set_sync(self, key: str, response: str, model: Optional[str] = None) -> None:
+        """写入缓存项，并清理过期项和超出上限的最久未访问项"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, accessed_at, hits)
+                VALUES (?, ?, ?, ?, ?, 0)
+                """,
+                (key, model, response, now, now)
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl,))
+            conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+            conn.commit()
+
+    async def get_or_call(
+        self,
+        payload: Dict[str, Any],
+        call: Callable[[], Awaitable[str]]
+    ) -> str:
+        """
+        返回请求的缓存结果，未命中时调用 call 并缓存其结果
+
+        缓存读写失败只记录日志，不影响调用本身；call 抛出的异常不缓存。
+        """
+        if not self.enabled:
+            return await call()
+
+        key = request_fingerprint(payload)
+        waiting = self._inflight.get(key)
+        if waiting is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(waiting)
+            except asyncio.CancelledError:
+                if not waiting.cancelled():
+                    raise
+                # 先到达的调用被取消，由当前调用重新发起
+                return await self.get_or_call(payload, call)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            cached = await self._safe(self.get_sync, key)
+            if cached is not None:
+                self.hits += 1
+                logger.info(f"LLM 缓存命中: {key[:12]}")
+                result = cached
+            else:
+                self.misses += 1
+                result = await call()
+                await self._safe(self.set_sync, key, result, payload.get("model"))
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get(self, payload: Dict[str, Any]) -> Optional[str]:
+        """读取请求的缓存结果（流式请求在开始前查询）"""
+        if not self.enabled:
+            return None
+        cached = await self._safe(self.get_sync, request_fingerprint(payload))
+        if cached is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return cached
+
+    async def set(self, payload: Dict[str, Any], response: str) -> None:
+        """写入请求的结果（流式请求完整结束后写入）"""
+        if self.enabled:
+            await self._safe(self.set_sync, request_fingerprint(payload), response, payload.get("model"))
+
+    async def _safe(self, func: Callable, *args: Any) -> Any:
+        try:
+            return await asyncio.to_thread(func, *args)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"LLM 缓存读写失败: {e}")
+            return None
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute("DELETE FROM llm_cache").rowcount
+            conn.commit()
+            return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        lookups = self.hits + self.misses
+        info: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "ttl": self.ttl,
+            "max_entries": self.max_entries
+        }
+        if self.enabled:
+            try:
+                with self._lock:
+                    info["entries"] = self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"读取 LLM 缓存统计失败: {e}")
+        return info
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 创建全局 LLM 缓存实例
+llm_cache = LLMResponseCache(
+    settings.LLM_CACHE_PATH,
+    ttl=settings.LLM_CACHE_TTL,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    enabled=settings.LLM_CACHE_ENABLED
+)
@@ -0,0 +1,286 @@
+"""
+长笔录分块转换 - 按对话轮次切分、并发转换、衔接处润色
+
+整篇笔录作为一个提示词发送时，输出受 max_tokens 限制会被截断，
+耗时也与全文长度成正比。长笔录在对话轮次边界处切分为若干块，
+各块以有限的并发数分别转换，按原顺序拼接后，再对每个拼接处
+前后的少量文字做一次润色，消除分块带来的重复或断裂。
+切分位置由文本内容决定，笔录局部修改后重新转换时，未变化的块
+命中 LLM 结果缓存，只有变化的块重新发送。
+"""
+
+import asyncio
+import re
+import zlib
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.services.segment_executor import TURN_BOUNDARY
+
+
+# 轮次开头的说话人标记（问：、M：、访谈者： 等）
+_SPEAKER = re.compile(r"[^：\n]{1,6}：")
+
+# 切分位置由轮次边界后的若干字符决定，约 1/4 的边界可作为切分位置
+_CUT_PROBE = 16
+_CUT_MASK = 3
+
+# 句末标点，衔接处的润色范围在句子边界处截取
+_SENTENCE_END = re.compile(r"[。！？!?\n]")
+
+# 润色结果与原衔接文字的长度比例超出该范围时视为改写失败，保留原文
+_STITCH_RATIO = (0.6, 1.4)
+
+STITCH_PROMPT = """下面是一篇第一人称叙述文档中相邻两部分的衔接处。两部分是分别转换的，衔接处可能存在重复、断裂或过渡生硬的问题。
+
+请只改写这段衔接文字，使前后自然连贯：
+- 不增加、不删除任何事实信息
+- 保留原有的段落划分
+- 不要添加任何说明，直接输出改写后的文字
+
+前文结尾：
+{tail}
+
+后文开头：
+{head}
+
+改写后的衔接文字："""
+
+
+def _is_cut_point(text: str, position: int) -> bool:
+    """
+    轮次边界是否可作为切分位置，只取决于边界后的文本内容
+
+    约 1/4 的边界可作为切分位置。转换结果会写入磁盘缓存，
+    使用跨进程稳定的 crc32 而不是 hash()。
+    """
+    probe = text[position + 1:position + 1 + _CUT_PROBE]
+    return zlib.crc32(probe.encode("utf-8")) & _CUT_MASK == 0
+
+
+def split_transcript(text: str, max_size: int) -> List[str]:
+    """
+    在对话轮次边界处将笔录切分为长度不超过 max_size 的块
+
+    切分位置优先选择与全文第一轮相同说话人（通常是提问方）开头的轮次，
+    使问答不被拆开。每块在 [max_size/2, max_size] 范围内选择第一个
+    可作为切分位置（由边界后的文本内容决定，见 _is_cut_point）的边界，
+    而不是按平均长度选择：修改笔录的一处只影响所在的块，其余块的
+    内容和提示词不变，可以直接命中 LLM 结果缓存，只有变化的块重新发送。
+    范围内没有这样的边界时取最后一个边界；单个轮次超过 max_size 时
+    在换行处切分，仍无法切分时按长度截断。拼接后与原文相同。
+    """
+    opener = _SPEAKER.match(text.lstrip())
+    opener_label = opener.group() if opener else None
+
+    chunks = []
+    start = 0
+    length = len(text)
+    while length - start > max_size:
+        limit = start + max_size
+        cut = -1
+        last = {True: -1, False: -1}
+        for match in TURN_BOUNDARY.finditer(text, start + max_size // 2, limit):
+            position = match.start()
+            preferred = opener_label is not None and text.startswith(opener_label, position + 1)
+            if preferred and _is_cut_point(text, position):
+                cut = position
+                break
+            last[preferred] = position
+        if cut < 0:
+            cut = last[True] if last[True] >= 0 else last[False]
+        if cut < 0:
+            cut = text.rfind("\n", start + 1, limit)
+        end = cut + 1 if cut >= 0 else limit
+        chunks.append(text[start:end])
+        start = end
+    chunks.append(text[start:])
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+# 分块转换时附加在提示词前的说明。不含块序号，块数变化时未修改的块提示词不变
+CHUNK_INSTRUCTION = (
+    "注意：这是一篇较长笔录中的一部分，其余部分会单独转换后拼接。"
+    "请只转换本部分内容，不要添加开头引言、总结或结束语。\n\n"
+)
+
+
+def with_chunk_instruction(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """在最后一条（用户）消息前附加分块说明，系统消息保持不变"""
+    last = messages[-1]
+    return messages[:-1] + [{**last, "content": CHUNK_INSTRUCTION + last["content"]}]
+
+
+def _tail_start(text: str, window: int) -> int:
+    """结尾润色范围的起点：距末尾约 window 个字符的句子开头"""
+    if len(text) <= window:
+        return 0
+    match = None
+    for match in _SENTENCE_END.finditer(text, 0, len(text) - window):
+        pass
+    return match.end() if match else 0
+
+
+def _head_end(text: str, window: int) -> int:
+    """开头润色范围的终点：距开头约 window 个字符的句子结尾"""
+    if len(text) <= window:
+        return len(text)
+    match = _SENTENCE_END.search(text, window)
+    return match.end() if match else len(text)
+
+
+class ChunkedConverter:
+    """长笔录的分块并发转换"""
+
+    def __init__(
+        self,
+        threshold: int = 6000,
+        chunk_size: int = 4000,
+        concurrency: int = 4,
+        stitch_window: int = 200
+    ):
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.stitch_window = stitch_window
+
+    def should_chunk(self, text: str) -> bool:
+        return len(text) > self.threshold
+
+    async def convert(
+        self,
+        text: str,
+        convert_chunk: Callable[[str, int, int], Awaitable[str]],
+        complete: Optional[Callable[[str], Awaitable[str]]] = None
+    ) -> str:
+        """
+        分块转换文本
+
+        Args:
+            text: 原始笔录
+            convert_chunk: 转换单块的协程函数，参数为 (块文本, 块序号, 总块数)
+            complete: 执行润色提示词的协程函数，None 时不润色衔接处
+
+        Returns:
+            拼接后的转换结果
+        """
+        chunks = split_transcript(text, self.chunk_size)
+        if len(chunks) <= 1:
+            return await convert_chunk(text, 0, 1)
+
+        logger.info(f"长笔录分为 {len(chunks)} 块并发转换，原文长度: {len(text)}")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        parts = await asyncio.gather(*(
+            self._run_chunk(convert_chunk, chunk, index, len(chunks), semaphore)
+            for index, chunk in enumerate(chunks)
+        ))
+        parts = [part for part in parts if part]
+
+        if complete is not None and len(parts) > 1:
+            return await self._stitch(parts, complete, semaphore)
+        return "\n\n".join(parts)
+
+    async def iter_convert(
+        self,
+        text: str,
+        convert_chunk: Callable[[str, int, int], Awaitable[str]]
+    ) -> AsyncIterator[str]:
+        """
+        分块转换文本，按原顺序逐块产出转换结果（流式输出使用）
+
+        各块仍并发转换，前面的块全部完成后即输出下一块，不必等待整篇完成。
+        衔接处需要前后两块都完成才能润色，这里不做润色，调用方以空行分隔各块。
+        转换结果为空的块不产出。
+        """
+        chunks = split_transcript(text, self.chunk_size)
+        if len(chunks) <= 1:
+            result = (await convert_chunk(text, 0, 1)).strip()
+            if result:
+                yield result
+            return
+
+        logger.info(f"长笔录分为 {len(chunks)} 块并发流式转换，原文长度: {len(text)}")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.create_task(self._run_chunk(convert_chunk, chunk, index, len(chunks), semaphore))
+            for index, chunk in enumerate(chunks)
+        ]
+        try:
+            for task in tasks:
+                part = await task
+                if part:
+                    yield part
+        finally:
+            # 出错或调用方提前停止时取消其余的块
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_chunk(
+        self,
+        convert_chunk: Callable[[str, int, int], Awaitable[str]],
+        chunk: str,
+        index: int,
+        total: int,
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        async with semaphore:
+            result = await convert_chunk(chunk, index, total)
+            return result.strip()
+
+    async def _stitch(
+        self,
+        parts: List[str],
+        complete: Callable[[str], Awaitable[str]],
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        """润色各拼接处后拼接，失败或结果异常的拼接处保留原文并以空行分隔"""
+        # 每块的开头和结尾分别属于前后两个拼接处，范围限制在块长度的一半以内避免重叠
+        spans: List[Tuple[int, int]] = []
+        for part in parts:
+            window = min(self.stitch_window, len(part) // 2)
+            spans.append((_head_end(part, window), _tail_start(part, window)))
+        spans = [(head, max(tail, head)) for head, tail in spans]
+
+        async def stitch(index: int) -> Optional[str]:
+            tail = parts[index][spans[index][1]:]
+            head = parts[index + 1][:spans[index + 1][0]]
+            if not tail.strip() or not head.strip():
+                return None
+            original = len(tail) + len(head)
+            try:
+                async with semaphore:
+                    result = (await complete(STITCH_PROMPT.format(tail=tail, head=head))).strip()
+            except Exception as e:
+                logger.warning(f"第 {index + 1} 处衔接润色失败，保留原文: {e}")
+                return None
+            if not _STITCH_RATIO[0] * original <= len(result) <= _STITCH_RATIO[1] * original:
+                logger.warning(f"第 {index + 1} 处衔接润色结果长度异常，保留原文")
+                return None
+            return result
+
+        stitched = await asyncio.gather(*(stitch(index) for index in range(len(parts) - 1)))
+
+        # 润色结果替换前一块的结尾和后一块的开头
+        output = []
+        head_taken = 0
+        for index, part in enumerate(parts):
+            joined = stitched[index] if index < len(stitched) else None
+            output.append(part[head_taken:spans[index][1] if joined is not None else len(part)])
+            head_taken = 0
+            if joined is not None:
+                output.append(joined)
+                head_taken = spans[index + 1][0]
+            elif index < len(stitched):
+                output.append("\n\n")
+        return "".join(output)
+
+
+# 创建全局分块转换实例
+chunked_converter = ChunkedConverter(
+    threshold=settings.LLM_CHUNK_THRESHOLD,
+    chunk_size=settings.LLM_CHUNK_SIZE,
+    concurrency=settings.LLM_CHUNK_CONCURRENCY,
+    stitch_window=settings.LLM_STITCH_WINDOW
+)
@@ -0,0 +1,171 @@
+"""
+LLM 并发控制 - 自适应并发上限与按优先级排队
+
+同时发往 LLM 服务商的请求数由加性增、乘性减 (AIMD) 的上限控制：
+请求成功时上限缓慢增加（每个上限周期约加 1），遇到 429、5xx 或超时
+时上限减半。超出上限的请求按优先级排队，交互式请求先于后台批量任务，
+同优先级按到达顺序。请求的优先级由调用方通过 llm_priority 上下文设置。
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+
+
+class LLMPriority(IntEnum):
+    """LLM 请求优先级，数值越小越先执行"""
+    INTERACTIVE = 0  # 用户等待结果的请求（流式转换、同步接口）
+    BATCH = 1  # 后台批量转换任务
+
+
+# 当前上下文中 LLM 请求的优先级，asyncio 任务创建时继承
+_current_priority: ContextVar[LLMPriority] = ContextVar("llm_priority", default=LLMPriority.INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: LLMPriority):
+    """在上下文内以指定优先级发起 LLM 请求"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """服务商限流、服务端错误或超时"""
+    if isinstance(error, httpx.TimeoutException):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发上限 + 优先级等待队列"""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 16,
+        backoff: float = 0.5
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+        self.completed = 0
+        self.overloaded = 0
+
+    @property
+    def _capacity(self) -> int:
+        return int(self.limit)
+
+    def has_capacity(self) -> bool:
+        """当前是否有空闲名额且无人排队"""
+        return self.in_flight < self._capacity and not self._waiters
+
+    async def _acquire(self, priority: LLMPriority) -> None:
+        if self.has_capacity():
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 已分配到名额后才被取消时归还名额；仍在排队的项在唤醒时跳过
+            if not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self._capacity:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _on_success(self) -> None:
+        self.completed += 1
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _on_overload(self, started: float) -> None:
+        self.overloaded += 1
+        # 同一次拥塞中已在执行的请求相继失败时只减一次
+        if started < self._last_decrease:
+            return
+        previous = self.limit
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._last_decrease = time.monotonic()
+        logger.warning(f"LLM 服务过载，并发上限 {previous:.1f} -> {self.limit:.1f}")
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[LLMPriority] = None):
+        """
+        占用一个并发名额执行请求
+
+        块内抛出的 429/5xx/超时异常使上限减小，正常结束使上限增加，
+        其他异常不影响上限。
+        """
+        if priority is None:
+            priority = _current_priority.get()
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_overload_error(e):
+                self._on_overload(started)
+            raise
+        else:
+            self._on_success()
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        """当前并发上限与排队情况"""
+        queued: Dict[str, int] = {priority.name.lower(): 0 for priority in LLMPriority}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued[LLMPriority(priority).name.lower()] += 1
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queued": queued,
+            "completed": self.completed,
+            "overloaded": self.overloaded
+        }
+
+
+# 创建全局 LLM 并发控制实例
+llm_limiter = AdaptiveLimiter(
+    initial=settings.LLM_CONCURRENCY_INITIAL,
+    min_limit=settings.LLM_CONCURRENCY_MIN,
+    max_limit=settings.LLM_CONCURRENCY_MAX,
+    backoff=settings.LLM_CONCURRENCY_BACKOFF
+)
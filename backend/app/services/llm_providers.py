@@ -0,0 +1,346 @@
+"""
+LLM 服务商 - 统一不同服务商的补全接口
+
+- OpenAICompatibleProvider: DeepSeek、OpenAI 及其他 OpenAI 兼容接口 (/chat/completions)
+- OllamaProvider: 本地 Ollama 风格的服务 (/api/chat)
+
+每个服务商有独立的并发控制，并记录近期的耗时和错误率供路由选择，
+以及响应中的 token 用量（含命中服务商前缀缓存的提示词 token 数）。
+"""
+
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.services.http_client import http_client
+from app.services.llm_limiter import AdaptiveLimiter
+
+
+# 耗时和错误率的指数移动平均系数
+EWMA_ALPHA = 0.2
+
+
+class ProviderHealth:
+    """服务商的近期耗时、错误率与熔断状态"""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        """是否未处于熔断冷却期"""
+        return time.monotonic() >= self.open_until
+
+    def record_success(self, latency: Optional[float] = None) -> None:
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.error_rate *= 1 - EWMA_ALPHA
+        if latency is not None:
+            self.latency = latency if self.latency is None else (
+                self.latency * (1 - EWMA_ALPHA) + latency * EWMA_ALPHA
+            )
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_rate = self.error_rate * (1 - EWMA_ALPHA) + EWMA_ALPHA
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = time.monotonic() + self.cooldown
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "latency": self.latency,
+            "error_rate": round(self.error_rate, 4),
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class TokenUsage:
+    """服务商返回的 token 用量累计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0  # 命中服务商前缀缓存的提示词 token
+        self.completion_tokens = 0
+
+    def record(self, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> None:
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        self.completion_tokens += completion_tokens
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """提示词 token 中命中前缀缓存的比例"""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_ratio": round(self.cache_hit_ratio, 4)
+        }
+
+
+class LLMProvider:
+    """LLM 服务商基类"""
+
+    def __init__(self, name: str, base_url: str, model: str, limiter: Optional[AdaptiveLimiter] = None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.limiter = limiter or AdaptiveLimiter(
+            initial=settings.LLM_CONCURRENCY_INITIAL,
+            min_limit=settings.LLM_CONCURRENCY_MIN,
+            max_limit=settings.LLM_CONCURRENCY_MAX,
+            backoff=settings.LLM_CONCURRENCY_BACKOFF
+        )
+        self.health = ProviderHealth(
+            failure_threshold=settings.LLM_PROVIDER_FAILURE_THRESHOLD,
+            cooldown=settings.LLM_PROVIDER_COOLDOWN
+        )
+        self.usage = TokenUsage()
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ) -> str:
+        """发送一次补全请求并返回生成的文本"""
+        started = time.monotonic()
+        try:
+            async with self.limiter.slot():
+                response = await http_client.client.post(
+                    self._url(),
+                    headers=self._headers(),
+                    json=self._payload(messages, temperature, max_tokens, stream=False),
+                    timeout=timeout
+                )
+                response.raise_for_status()
+            result = response.json()
+            text = self._parse_response(result)
+        except Exception:
+            self.health.record_failure()
+            raise
+        self.health.record_success(time.monotonic() - started)
+        self._record_usage(self._usage_counts(result))
+        return text
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式补全，逐块产出 {"content": 文本增量, "finish_reason": 结束原因}
+
+        整个流式响应期间占用一个并发名额。
+        """
+        try:
+            async with self.limiter.slot(), http_client.client.stream(
+                "POST",
+                self._url(),
+                headers=self._headers(),
+                json=self._payload(messages, temperature, max_tokens, stream=True),
+                timeout=timeout
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    chunk = self._parse_stream_line(line)
+                    if chunk is None:
+                        continue
+                    self._record_usage(chunk.get("usage"))
+                    if chunk.get("done"):
+                        break
+                    if chunk.get("content"):
+                        yield {"content": chunk["content"], "finish_reason": chunk.get("finish_reason")}
+        except Exception:
+            self.health.record_failure()
+            raise
+        self.health.record_success()
+
+    def _url(self) -> str:
+        raise NotImplementedError
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Content-Type": "application/json"}
+
+    def _payload(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        stream: bool
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def _parse_stream_line(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        解析一行流式响应，无内容的行返回 None
+
+        返回的字典可包含 content/finish_reason（文本增量）、usage（token 用量）
+        和 done（结束标记）。
+        """
+        raise NotImplementedError
+
+    def _usage_counts(self, data: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+        """从响应中读取 (提示词, 命中缓存的提示词, 生成) token 数，没有用量信息时返回 None"""
+        return None
+
+    def _record_usage(self, usage: Optional[Tuple[int, int, int]]) -> None:
+        if usage is None:
+            return
+        self.usage.record(*usage)
+        logger.debug(f"LLM 服务商 {self.name} token 用量: 提示词 {usage[0]}（缓存命中 {usage[1]}），生成 {usage[2]}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model,
+            **self.health.stats(),
+            "concurrency": self.limiter.stats(),
+            "usage": self.usage.stats()
+        }
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """OpenAI 兼容的 /chat/completions 接口（DeepSeek、OpenAI 等）"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        model: str,
+        api_key: str,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        super().__init__(name, base_url, model, limiter)
+        self.api_key = api_key
+
+    def _url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, messages, temperature, max_tokens, stream):
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream
+        }
+        if stream:
+            # 流式响应的最后一块附带 token 用量
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        if "choices" in result and len(result["choices"]) > 0:
+            return result["choices"][0]["message"]["content"].strip()
+        raise ValueError("API 响应格式异常")
+
+    def _parse_stream_line(self, line: str) -> Optional[Dict[str, Any]]:
+        if not line.startswith("data: "):
+            return None
+        data_str = line[6:]  # 移除 "data: " 前缀
+        if data_str.strip() == "[DONE]":
+            return {"done": True}
+        try:
+            data = json.loads(data_str)
+        except json.JSONDecodeError:
+            logger.warning(f"跳过无效的SSE数据: {data_str}")
+            return None
+        chunk: Dict[str, Any] = {}
+        usage = self._usage_counts(data)
+        if usage is not None:
+            chunk["usage"] = usage
+        if data.get("choices"):
+            choice = data["choices"][0]
+            content = choice.get("delta", {}).get("content")
+            if content:
+                chunk.update(content=content, finish_reason=choice.get("finish_reason"))
+        return chunk or None
+
+    def _usage_counts(self, data: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+        usage = data.get("usage")
+        if not usage:
+            return None
+        # DeepSeek 返回 prompt_cache_hit_tokens，OpenAI 返回 prompt_tokens_details.cached_tokens
+        cached = usage.get("prompt_cache_hit_tokens")
+        if cached is None:
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        return usage.get("prompt_tokens", 0), cached or 0, usage.get("completion_tokens", 0)
+
+
+class OllamaProvider(LLMProvider):
+    """Ollama 风格的本地服务 (/api/chat)"""
+
+    def _url(self) -> str:
+        return f"{self.base_url}/api/chat"
+
+    def _payload(self, messages, temperature, max_tokens, stream):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "options": {"temperature": temperature, "num_predict": max_tokens}
+        }
+
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        message = result.get("message")
+        if not message or "content" not in message:
+            raise ValueError("API 响应格式异常")
+        return message["content"].strip()
+
+    def _parse_stream_line(self, line: str) -> Optional[Dict[str, Any]]:
+        # 流式响应为逐行 JSON
+        if not line.strip():
+            return None
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning(f"跳过无效的流式数据: {line}")
+            return None
+        chunk: Dict[str, Any] = {}
+        content = data.get("message", {}).get("content")
+        if content:
+            chunk.update(content=content, finish_reason="stop" if data.get("done") else None)
+        if data.get("done"):
+            chunk["usage"] = self._usage_counts(data)
+            if not content:
+                chunk["done"] = True
+        return chunk or None
+
+    def _usage_counts(self, data: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+        # Ollama 在本地复用 KV 缓存，但不报告命中的 token 数
+        if "prompt_eval_count" not in data and "eval_count" not in data:
+            return None
+        return data.get("prompt_eval_count", 0), 0, data.get("eval_count", 0)
@@ -0,0 +1,219 @@
+"""
+LLM 调用重试 - 指数退避重试、单次尝试时限与对冲请求
+
+- 限流 (429)、服务端错误 (5xx)、超时和连接错误按指数退避加随机抖动重试，
+  429 响应带 Retry-After 时至少等待该时长；其他错误不重试。
+- 每次尝试有独立的时限（包括排队等待并发名额的时间），所有尝试共享总时限，
+  超时的尝试被取消后按超时错误重试，剩余时间不足时不再重试。
+- 启用对冲请求时，尝试超过近期成功请求耗时的 p95 仍未返回，且调用方
+  确认还有空闲并发名额时，再发起一个相同的请求，取先成功的结果并取消另一个。
+  对冲会增加少量 token 消耗，默认关闭。
+"""
+
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+from app.services.llm_limiter import is_overload_error
+
+
+T = TypeVar("T")
+
+# 计算对冲延迟所需的最少样本数
+MIN_HEDGE_SAMPLES = 20
+
+
+class AttemptTimeoutError(httpx.TimeoutException):
+    """单次尝试（含排队等待并发名额）超过时限，按超时处理"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """可重试的错误：过载、超时或网络连接错误"""
+    return is_overload_error(error) or isinstance(error, httpx.TransportError)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """429 响应中 Retry-After 指定的等待秒数"""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+    value = error.response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RetryingCaller:
+    """带重试和对冲的异步调用"""
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        attempt_timeout: float = 120.0,
+        total_timeout: float = 300.0,
+        hedge_enabled: bool = False,
+        hedge_min_delay: float = 5.0,
+        hedge_quantile: float = 0.95,
+        window: int = 200
+    ):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.total_timeout = total_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_quantile = hedge_quantile
+        self._latencies: deque = deque(maxlen=window)
+        self.calls = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def backoff_delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """第 attempt 次失败后的等待时间：指数上界内的均匀随机值（full jitter）"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def latency_quantile(self, quantile: float) -> Optional[float]:
+        """近期成功请求耗时的分位数，样本不足时返回 None"""
+        if len(self._latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(quantile * len(ordered)) - 1)]
+
+    def hedge_delay(self) -> Optional[float]:
+        """发起对冲请求前的等待时间，不对冲时返回 None"""
+        if not self.hedge_enabled:
+            return None
+        quantile = self.latency_quantile(self.hedge_quantile)
+        if quantile is None:
+            return None
+        return max(quantile, self.hedge_min_delay)
+
+    async def call(
+        self,
+        attempt: Callable[[float], Awaitable[T]],
+        attempt_timeout: Optional[float] = None,
+        has_capacity: Optional[Callable[[], bool]] = None
+    ) -> T:
+        """
+        执行调用，失败时按策略重试
+
+        Args:
+            attempt: 单次尝试的协程函数，参数为本次尝试的时限(秒)
+            attempt_timeout: 单次尝试的时限，默认使用配置值
+            has_capacity: 返回能否再发起一个请求，为 False 时不发起对冲请求
+
+        Returns:
+            第一次成功尝试的结果；重试用尽时抛出最后一次的异常
+        """
+        self.calls += 1
+        attempt_timeout = attempt_timeout or self.attempt_timeout
+        deadline = time.monotonic() + self.total_timeout
+
+        for number in range(1, self.attempts + 1):
+            timeout = min(attempt_timeout, deadline - time.monotonic())
+            try:
+                return await self._bounded_attempt(attempt, timeout, has_capacity)
+            except Exception as e:
+                if number == self.attempts or not is_retryable_error(e):
+                    raise
+                delay = self.backoff_delay(number, e)
+                if time.monotonic() + delay + 1.0 >= deadline:
+                    raise
+                self.retries += 1
+                logger.warning(f"LLM 调用失败（第 {number} 次）: {type(e).__name__}，{delay:.1f} 秒后重试")
+                await asyncio.sleep(delay)
+
+    async def _bounded_attempt(
+        self,
+        attempt: Callable[[float], Awaitable[T]],
+        timeout: float,
+        has_capacity: Optional[Callable[[], bool]] = None
+    ) -> T:
+        """
+        执行一次尝试，整体不超过 timeout 秒
+
+        httpx 的 timeout 只限制单次连接、读取等操作，持续缓慢返回数据的
+        请求以及排队等待并发名额的时间都不受其限制；这里对整个尝试计时，
+        超时时取消尝试并抛出 AttemptTimeoutError。
+        """
+        try:
+            return await asyncio.wait_for(self._attempt(attempt, timeout, has_capacity), timeout)
+        except asyncio.TimeoutError:
+            raise AttemptTimeoutError(f"LLM 请求超过 {timeout:.1f} 秒未完成") from None
+
+    async def _attempt(
+        self,
+        attempt: Callable[[float], Awaitable[T]],
+        timeout: float,
+        has_capacity: Optional[Callable[[], bool]] = None
+    ) -> T:
+        """执行一次尝试，超过对冲延迟仍未完成时发起对冲请求"""
+        started = time.monotonic()
+        delay = self.hedge_delay()
+        if delay is None or delay >= timeout:
+            result = await attempt(timeout)
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(attempt(timeout))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and (has_capacity is None or has_capacity()):
+                self.hedged += 1
+                logger.info(f"LLM 请求超过 {delay:.1f} 秒未返回，发起对冲请求")
+                pending.add(asyncio.ensure_future(attempt(max(timeout - delay, 1.0))))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        self._latencies.append(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """重试与对冲统计"""
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_enabled": self.hedge_enabled,
+            "latency_p50": self.latency_quantile(0.5),
+            "latency_p95": self.latency_quantile(0.95)
+        }
+
+
+# 创建全局 LLM 重试调用实例
+llm_retry = RetryingCaller(
+    attempts=settings.LLM_RETRY_ATTEMPTS,
+    base_delay=settings.LLM_RETRY_BASE_DELAY,
+    max_delay=settings.LLM_RETRY_MAX_DELAY,
+    attempt_timeout=settings.LLM_ATTEMPT_TIMEOUT,
+    total_timeout=settings.DEFAULT_TIMEOUT,
+    hedge_enabled=settings.LLM_HEDGE_ENABLED,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    hedge_quantile=settings.LLM_HEDGE_QUANTILE
+)
@@ -0,0 +1,207 @@
+"""
+LLM 路由 - 在多个服务商之间按近期表现选择并自动故障转移
+
+LLM_PROVIDERS 按偏好顺序列出启用的服务商（deepseek、openai、ollama），
+缺少必要配置的服务商不会启用。每次请求按以下顺序尝试各服务商：
+未熔断的优先，其次按近期耗时乘以错误率惩罚排序，尚无耗时记录的服务商
+按配置顺序排在已知耗时相近的服务商之前。请求失败时转到下一个服务商，
+全部失败时抛出最后一个错误，由重试策略决定是否整体重试。
+
+补全请求依次经过：结果缓存 -> 重试 -> 路由/故障转移 -> 服务商并发控制。
+"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from loguru import logger
+
+from app.core.config import settings
+from app.services.llm_cache import llm_cache
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_providers import LLMProvider, OllamaProvider, OpenAICompatibleProvider
+from app.services.llm_retry import llm_retry
+
+
+# 错误率对排序得分的放大系数
+ERROR_PENALTY = 4.0
+
+
+class NoProviderError(ValueError):
+    """没有可用的 LLM 服务商"""
+
+
+def build_providers(names: List[str]) -> List[LLMProvider]:
+    """按配置创建服务商，跳过缺少必要配置的服务商"""
+    providers: List[LLMProvider] = []
+    for name in names:
+        name = name.strip().lower()
+        if name == "deepseek":
+            if not settings.DEEPSEEK_API_KEY:
+                logger.warning("未配置 DEEPSEEK_API_KEY，跳过 deepseek")
+                continue
+            # DeepSeek 使用全局并发控制实例
+            providers.append(OpenAICompatibleProvider(
+                "deepseek", settings.DEEPSEEK_BASE_URL, settings.DEEPSEEK_MODEL,
+                settings.DEEPSEEK_API_KEY, limiter=llm_limiter
+            ))
+        elif name == "openai":
+            if not settings.OPENAI_API_KEY:
+                logger.warning("未配置 OPENAI_API_KEY，跳过 openai")
+                continue
+            providers.append(OpenAICompatibleProvider(
+                "openai", settings.OPENAI_BASE_URL, settings.OPENAI_MODEL, settings.OPENAI_API_KEY
+            ))
+        elif name == "ollama":
+            providers.append(OllamaProvider("ollama", settings.OLLAMA_BASE_URL, settings.OLLAMA_MODEL))
+        else:
+            logger.warning(f"未知的 LLM 服务商: {name}")
+    return providers
+
+
+class LLMRouter:
+    """多服务商路由"""
+
+    def __init__(self, providers: List[LLMProvider]):
+        self.providers = providers
+        self.failovers = 0
+
+    @property
+    def available(self) -> bool:
+        return bool(self.providers)
+
+    def cache_scope(self) -> str:
+        """参与缓存键的服务商与模型，服务商配置变化后旧缓存不再命中"""
+        return ",".join(f"{provider.name}:{provider.model}" for provider in self.providers)
+
+    def ranked(self) -> List[LLMProvider]:
+        """按尝试顺序排列的服务商"""
+        known = [p.health.latency for p in self.providers if p.health.latency is not None]
+        # 尚无耗时记录的服务商按已知最小耗时估计，配置顺序靠前者优先
+        prior = min(known) if known else 0.0
+
+        def score(item):
+            index, provider = item
+            latency = provider.health.latency if provider.health.latency is not None else prior
+            return (
+                not provider.health.available,
+                latency * (1 + ERROR_PENALTY * provider.health.error_rate),
+                index
+            )
+
+        return [provider for _, provider in sorted(enumerate(self.providers), key=score)]
+
+    def has_capacity(self) -> bool:
+        """首选服务商是否有空闲并发名额（决定是否发起对冲请求）"""
+        ranked = self.ranked()
+        return bool(ranked) and ranked[0].limiter.has_capacity()
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: int = 4000,
+        attempt_timeout: Optional[float] = None
+    ) -> str:
+        """
+        补全请求：先查结果缓存，未命中时按重试策略在各服务商间路由
+
+        Raises:
+            NoProviderError: 没有启用任何服务商
+            httpx.HTTPError: 重试用尽后最后一次的错误
+        """
+        if not self.providers:
+            raise NoProviderError("未配置可用的 LLM 服务")
+
+        return await llm_cache.get_or_call(
+            self._cache_key(messages, temperature, max_tokens),
+            lambda: llm_retry.call(
+                lambda timeout: self._complete_once(messages, temperature, max_tokens, timeout),
+                attempt_timeout=attempt_timeout,
+                has_capacity=self.has_capacity
+            )
+        )
+
+    def _cache_key(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        """结果缓存的键，流式与非流式请求共用"""
+        return {
+            "model": self.cache_scope(),
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+    async def _complete_once(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        timeout: float
+    ) -> str:
+        """按排序依次尝试各服务商，返回第一个成功的结果"""
+        last_error: Optional[Exception] = None
+        for provider in self.ranked():
+            if last_error is not None:
+                self.failovers += 1
+                logger.warning(f"LLM 服务商故障转移 -> {provider.name}")
+            try:
+                return await provider.complete(messages, temperature, max_tokens, timeout)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"LLM 服务商 {provider.name} 调用失败: {type(e).__name__}: {e}")
+                last_error = e
+        raise last_error
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.2,
+        max_tokens: int = 4000,
+        timeout: float = 60.0
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式补全，逐块产出 {"content", "finish_reason", "provider"}
+
+        只在收到第一块内容之前故障转移，之后的错误直接抛出。
+        与非流式请求共用结果缓存：命中时一次产出缓存结果（provider 为 "cache"），
+        完整结束的流式结果写入缓存。
+        """
+        if not self.providers:
+            raise NoProviderError("未配置可用的 LLM 服务")
+
+        key = self._cache_key(messages, temperature, max_tokens)
+        cached = await llm_cache.get(key)
+        if cached is not None:
+            yield {"content": cached, "finish_reason": "stop", "provider": "cache"}
+            return
+
+        last_error: Optional[Exception] = None
+        for provider in self.ranked():
+            if last_error is not None:
+                self.failovers += 1
+                logger.warning(f"LLM 服务商故障转移 -> {provider.name}")
+            started = False
+            parts: List[str] = []
+            try:
+                async for chunk in provider.stream(messages, temperature, max_tokens, timeout):
+                    started = True
+                    parts.append(chunk["content"])
+                    yield {**chunk, "provider": provider.name}
+                # 与非流式结果一致，缓存去除首尾空白的文本
+                text = "".join(parts).strip()
+                if text:
+                    await llm_cache.set(key, text)
+                return
+            except (httpx.HTTPError, ValueError) as e:
+                if started:
+                    raise
+                logger.warning(f"LLM 服务商 {provider.name} 流式调用失败: {type(e).__name__}: {e}")
+                last_error = e
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": [provider.stats() for provider in self.ranked()],
+            "failovers": self.failovers
+        }
+
+
+# 创建全局 LLM 路由实例
+llm_router = LLMRouter(build_providers(settings.LLM_PROVIDERS))
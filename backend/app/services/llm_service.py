@@ -2,13 +2,17 @@
 LLM 服务 - 集成 Deepseek API 进行文本转换
 """
 
-import asyncio
-from typing import Optional, Dict, Any, Tuple
+import json
+import time
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 import httpx
 from loguru import logger
 
 from app.core.config import settings
+from app.services.llm_chunking import chunked_converter, with_chunk_instruction
+from app.services.llm_router import llm_router
 from app.services.rule_engine import rule_engine
+from app.services.rule_stream import StreamingRuleApplier
 from app.services.quality_service import quality_service
 
 
@@ -64,32 +68,10 @@ class LLMService:
             )
             
             # 组装最终结果
-            result = {
-                "success": True,
-                "original_text": original_text,
-                "converted_text": final_text,
-                "processing_stages": {
-                    "rule_preprocessing": {
-                        "text": rule_processed_text,
-                        "applied_rules": rule_info.get("applied_rules", [])
-                    },
-                    "llm_conversion": {
-                        "text": llm_result,
-                        "model_used": self.deepseek_model
-                    },
-                    "rule_postprocessing": {
-                        "text": final_text,
-                        "applied_rules": post_rule_info.get("applied_rules", [])
-                    }
-                },
-                "quality_metrics": quality_metrics,
-                "conversion_summary": {
-                    "original_length": len(original_text),
-                    "final_length": len(final_text),
-                    "compression_ratio": 1 - (len(final_text) / len(original_text)) if len(original_text) > 0 else 0,
-                    "quality_score": quality_metrics.get("overall_score", 0)
-                }
-            }
+            result = self._build_result(
+                original_text, rule_processed_text, rule_info,
+                llm_result, final_text, post_rule_info, quality_metrics
+            )
             
             logger.info(f"转换完成，质量评分: {quality_metrics.get('overall_score', 0):.2f}")
             return result
@@ -104,6 +86,171 @@ class LLMService:
                 "quality_metrics": {"overall_score": 0.0}
             }
     
+    async def stream_convert_transcription(
+        self, 
+        original_text: str, 
+        rule_config: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式转换：与 convert_transcription 相同的处理流程，LLM 输出边生成边后处理
+        
+        后处理规则由流式规则执行器作用于 LLM 输出，只暂缓尚未确定的少量文本。
+        各 chunk 事件的 content 依次拼接即为最终文本，complete 事件的数据与
+        convert_transcription 的返回值相同。长笔录分块转换时整体转换后一次输出。
+        
+        Args:
+            original_text: 原始对话式笔录
+            rule_config: 转换规则配置
+            
+        Yields:
+            SSE格式的事件数据
+        """
+        try:
+            logger.info(f"开始流式转换，原文长度: {len(original_text)}")
+            yield self._format_sse_event("start", {"original_length": len(original_text)})
+            
+            # 阶段1: 规则引擎预处理
+            rule_processed_text, rule_info = await self._apply_rule_preprocessing(
+                original_text, rule_config
+            )
+            yield self._format_sse_event("progress", {
+                "stage": "rule_preprocessing",
+                "applied_rules": rule_info.get("applied_rules", [])
+            })
+            
+            # 阶段2+3: LLM 流式转换，同时应用后处理规则
+            try:
+                applier = rule_engine.create_stream(
+                    None, self._postprocessing_rules(rule_config), window=settings.LLM_STREAM_RULE_WINDOW,
+                    low_latency=True
+                )
+                post_error = None
+            except Exception as e:
+                logger.error(f"后处理失败: {e}")
+                applier = StreamingRuleApplier(None)
+                post_error = str(e)
+            
+            llm_parts: List[str] = []
+            final_parts: List[str] = []
+            async for piece in applier.apply(self._stream_llm_conversion(rule_processed_text, rule_config, llm_parts)):
+                final_parts.append(piece)
+                yield self._format_sse_event("chunk", {"content": piece})
+            
+            llm_result = "".join(llm_parts)
+            final_text = "".join(final_parts)
+            post_rule_info = {"error": post_error, "applied_rules": []} if post_error else applier.info()
+            
+            # 阶段4: 质量检验
+            quality_metrics = await quality_service.calculate_quality_metrics(
+                original_text, 
+                final_text,
+                {
+                    "preprocessing_rules": rule_info,
+                    "postprocessing_rules": post_rule_info
+                }
+            )
+            
+            yield self._format_sse_event("complete", self._build_result(
+                original_text, rule_processed_text, rule_info,
+                llm_result, final_text, post_rule_info, quality_metrics
+            ))
+            logger.info(f"流式转换完成，质量评分: {quality_metrics.get('overall_score', 0):.2f}")
+            
+        except Exception as e:
+            logger.error(f"流式转换失败: {str(e)}")
+            yield self._format_sse_event("error", {
+                "success": False,
+                "error": str(e),
+                "message": "转换过程出现错误"
+            })
+    
+    async def _stream_llm_conversion(
+        self, 
+        text: str, 
+        rule_config: Optional[Dict[str, Any]],
+        collected: List[str]
+    ) -> AsyncIterator[str]:
+        """
+        流式 LLM 转换，产出的文本同时追加到 collected
+        
+        与非流式结果一致去除首尾空白：开头的空白丢弃，每块末尾的空白
+        暂缓到后续出现非空白内容时再输出。
+        """
+        if chunked_converter.should_chunk(text):
+            result = await self._llm_conversion(text, rule_config)
+            collected.append(result)
+            yield result
+            return
+        
+        messages = self._build_conversion_messages(text, rule_config)
+        pending = ""
+        try:
+            async for chunk in llm_router.stream(
+                messages,
+                temperature=0.2,
+                max_tokens=4000,
+                timeout=settings.LLM_ATTEMPT_TIMEOUT
+            ):
+                content = chunk["content"] if collected else chunk["content"].lstrip()
+                body = content.rstrip()
+                if not body:
+                    if collected:
+                        pending += content
+                    continue
+                piece = pending + body
+                pending = content[len(body):]
+                collected.append(piece)
+                yield piece
+        except httpx.HTTPStatusError as e:
+            logger.error(f"LLM API HTTP 错误: {e.response.status_code} - {e.response.text}")
+            raise ValueError(f"API 调用失败: {e.response.status_code}")
+        except httpx.TimeoutException:
+            logger.error("LLM API 调用超时")
+            raise ValueError("API 调用超时")
+    
+    def _format_sse_event(self, event_type: str, data: Dict[str, Any]) -> str:
+        """格式化SSE事件"""
+        data["timestamp"] = time.time()
+        return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def _build_result(
+        self,
+        original_text: str,
+        rule_processed_text: str,
+        rule_info: Dict[str, Any],
+        llm_result: str,
+        final_text: str,
+        post_rule_info: Dict[str, Any],
+        quality_metrics: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """组装转换结果"""
+        return {
+            "success": True,
+            "original_text": original_text,
+            "converted_text": final_text,
+            "processing_stages": {
+                "rule_preprocessing": {
+                    "text": rule_processed_text,
+                    "applied_rules": rule_info.get("applied_rules", [])
+                },
+                "llm_conversion": {
+                    "text": llm_result,
+                    "model_used": self.deepseek_model
+                },
+                "rule_postprocessing": {
+                    "text": final_text,
+                    "applied_rules": post_rule_info.get("applied_rules", [])
+                }
+            },
+            "quality_metrics": quality_metrics,
+            "conversion_summary": {
+                "original_length": len(original_text),
+                "final_length": len(final_text),
+                "compression_ratio": 1 - (len(final_text) / len(original_text)) if len(original_text) > 0 else 0,
+                "quality_score": quality_metrics.get("overall_score", 0)
+            }
+        }
+    
     async def _apply_rule_preprocessing(
         self, 
         text: str, 
@@ -114,14 +261,17 @@ class LLMService:
             # 提取预处理规则配置
             rule_set_id = None
             custom_rules = []
+            incremental = False
             
             if rule_config:
                 rule_set_id = rule_config.get("rule_set_id")
                 custom_rules = rule_config.get("preprocessing_rules", [])
+                # 反复转换修改过的笔录时可开启，复用未变化部分的结果
+                incremental = bool(rule_config.get("incremental", False))
             
             # 应用规则
             processed_text, rule_info = await rule_engine.apply_rules(
-                text, rule_set_id, custom_rules
+                text, rule_set_id, custom_rules, collect_transformations=False, incremental=incremental
             )
             
             logger.debug(f"预处理完成，应用了 {len(rule_info.get('applied_rules', []))} 个规则")
@@ -138,37 +288,9 @@ class LLMService:
     ) -> Tuple[str, Dict[str, Any]]:
         """应用后处理规则"""
         try:
-            # 后处理规则（主要用于格式化和优化）
-            post_rules = []
-            
-            if rule_config:
-                post_rules = rule_config.get("postprocessing_rules", [])
-            
-            # 默认后处理规则
-            default_post_rules = [
-                {
-                    "id": "post_1",
-                    "name": "去除多余换行",
-                    "rule_type": "postprocessing",
-                    "priority": 10,
-                    "pattern": r"\n\s*\n",
-                    "replacement": "\n\n"
-                },
-                {
-                    "id": "post_2",
-                    "name": "标点符号优化",
-                    "rule_type": "postprocessing", 
-                    "priority": 9,
-                    "pattern": r"([，。！？])\s+",
-                    "replacement": r"\1"
-                }
-            ]
-            
-            all_post_rules = default_post_rules + post_rules
-            
             # 应用后处理规则
             processed_text, rule_info = await rule_engine.apply_rules(
-                text, None, all_post_rules
+                text, None, self._postprocessing_rules(rule_config), collect_transformations=False
             )
             
             logger.debug(f"后处理完成，应用了 {len(rule_info.get('applied_rules', []))} 个规则")
@@ -178,6 +300,35 @@ class LLMService:
             logger.error(f"后处理失败: {e}")
             return text, {"error": str(e), "applied_rules": []}
     
+    def _postprocessing_rules(self, rule_config: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """后处理规则（主要用于格式化和优化）：默认规则 + 配置的规则"""
+        post_rules = []
+        
+        if rule_config:
+            post_rules = rule_config.get("postprocessing_rules", [])
+        
+        # 默认后处理规则
+        default_post_rules = [
+            {
+                "id": "post_1",
+                "name": "去除多余换行",
+                "rule_type": "postprocessing",
+                "priority": 10,
+                "pattern": r"\n\s*\n",
+                "replacement": "\n\n"
+            },
+            {
+                "id": "post_2",
+                "name": "标点符号优化",
+                "rule_type": "postprocessing", 
+                "priority": 9,
+                "pattern": r"([，。！？])\s+",
+                "replacement": r"\1"
+            }
+        ]
+        
+        return default_post_rules + post_rules
+    
     async def _llm_conversion(
         self, 
         text: str, 
@@ -185,11 +336,19 @@ class LLMService:
     ) -> str:
         """LLM 转换处理"""
         try:
+            # 长笔录分块并发转换，避免输出被 max_tokens 截断
+            if chunked_converter.should_chunk(text):
+                async def convert_chunk(chunk: str, index: int, total: int) -> str:
+                    messages = self._build_conversion_messages(chunk, rule_config)
+                    return await self._complete(with_chunk_instruction(messages))
+                
+                return await chunked_converter.convert(text, convert_chunk, self._call_deepseek_api)
+            
             # 构建增强的转换提示词
-            prompt = self._build_enhanced_conversion_prompt(text, rule_config)
+            messages = self._build_conversion_messages(text, rule_config)
             
-            # 调用 Deepseek API
-            converted_text = await self._call_deepseek_api(prompt)
+            # 调用 LLM
+            converted_text = await self._complete(messages)
             
             return converted_text
             
@@ -197,12 +356,44 @@ class LLMService:
             logger.error(f"LLM 转换失败: {e}")
             raise
     
+    def _build_conversion_messages(
+        self, 
+        text: str, 
+        rule_config: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, str]]:
+        """按 LLM_PROMPT_LAYOUT 构建转换请求的消息列表"""
+        if settings.LLM_PROMPT_LAYOUT == "inline":
+            return [{"role": "user", "content": self._build_enhanced_conversion_prompt(text, rule_config)}]
+        
+        # 指令和示例作为系统消息，内容只取决于规则配置，各次请求逐字节相同，
+        # 服务商可以缓存这部分前缀；笔录作为最后的用户消息
+        return [
+            {"role": "system", "content": self._build_conversion_instructions(rule_config)},
+            {"role": "user", "content": f"现在请转换以下笔录：\n\n{text}\n\n转换后的文本："}
+        ]
+    
     def _build_enhanced_conversion_prompt(
         self, 
         text: str, 
         rule_config: Optional[Dict[str, Any]] = None
     ) -> str:
-        """构建增强的转换提示词"""
+        """构建增强的转换提示词（指令、示例与笔录合为一条消息）"""
+        
+        instructions = self._build_conversion_instructions(rule_config)
+        
+        # 构建完整提示词
+        prompt = f"""{instructions}
+
+现在请转换以下笔录：
+
+{text}
+
+转换后的文本："""
+        
+        return prompt
+    
+    def _build_conversion_instructions(self, rule_config: Optional[Dict[str, Any]] = None) -> str:
+        """构建转换指令和示例（不含笔录）"""
         
         # 基础转换指令
         base_instruction = """
@@ -267,68 +458,31 @@ class LLMService:
 当时我正在公司加班，突然接到妈妈的电话，说家里出了点事情，让我赶紧回去。我立马放下手头的工作，开车回家了。
 """
         
-        # 构建完整提示词
-        prompt = f"""{base_instruction}
+        return f"""{base_instruction}
 
-{examples}
-
-现在请转换以下笔录：
-
-{text}
-
-转换后的文本："""
-        
-        return prompt
+{examples}"""
     
     async def _call_deepseek_api(self, prompt: str) -> str:
-        """调用 Deepseek API"""
-        
-        if not self.deepseek_api_key:
-            raise ValueError("Deepseek API 密钥未配置")
-        
-        headers = {
-            "Authorization": f"Bearer {self.deepseek_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": self.deepseek_model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.2,  # 降低温度确保输出稳定
-            "max_tokens": 4000,
-            "stream": False
-        }
-        
-        async with httpx.AsyncClient(timeout=settings.DEFAULT_TIMEOUT) as client:
-            try:
-                response = await client.post(
-                    f"{self.deepseek_base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                
-                result = response.json()
-                
-                if "choices" in result and len(result["choices"]) > 0:
-                    return result["choices"][0]["message"]["content"].strip()
-                else:
-                    raise ValueError("API 响应格式异常")
-                    
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Deepseek API HTTP 错误: {e.response.status_code} - {e.response.text}")
-                raise ValueError(f"API 调用失败: {e.response.status_code}")
-            except httpx.TimeoutException:
-                logger.error("Deepseek API 调用超时")
-                raise ValueError("API 调用超时")
-            except Exception as e:
-                logger.error(f"Deepseek API 调用异常: {str(e)}")
-                raise
+        """以单条用户消息调用 LLM 补全接口"""
+        return await self._complete([{"role": "user", "content": prompt}])
+    
+    async def _complete(self, messages: List[Dict[str, str]]) -> str:
+        """调用 LLM 补全接口（按 LLM_PROVIDERS 配置在各服务商间路由）"""
+        try:
+            return await llm_router.complete(
+                messages,
+                temperature=0.2,  # 降低温度确保输出稳定
+                max_tokens=4000
+            )
+        except httpx.HTTPStatusError as e:
+            logger.error(f"LLM API HTTP 错误: {e.response.status_code} - {e.response.text}")
+            raise ValueError(f"API 调用失败: {e.response.status_code}")
+        except httpx.TimeoutException:
+            logger.error("LLM API 调用超时")
+            raise ValueError("API 调用超时")
+        except Exception as e:
+            logger.error(f"LLM API 调用异常: {str(e)}")
+            raise
     
     async def test_connection(self) -> bool:
         """测试 LLM 服务连接"""
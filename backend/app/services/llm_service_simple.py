@@ -5,11 +5,14 @@
 
 import asyncio
 import json
-from typing import Optional, Dict, Any, AsyncGenerator
+import time
+from typing import Optional, Dict, Any, AsyncGenerator, Awaitable, Callable, List, Tuple
 import httpx
 from loguru import logger
 
 from app.core.config import settings
+from app.services.llm_chunking import chunked_converter, with_chunk_instruction
+from app.services.llm_router import llm_router
 from app.services.prompt_templates import prompt_manager, ConversationType
 
 
@@ -88,11 +91,21 @@ class SimpleLLMService:
     ) -> str:
         """LLM 转换处理"""
         try:
+            # 长笔录分块并发转换，避免输出被 max_tokens 截断
+            if chunked_converter.should_chunk(text):
+                # 对话类型按全文检测，各块使用相同的模板
+                conversation_type = prompt_manager.detect_conversation_type(text)
+                logger.info(f"检测到对话类型: {conversation_type.value}")
+                
+                return await chunked_converter.convert(
+                    text, self._chunk_converter(rule_config, conversation_type), self._call_deepseek_api
+                )
+            
             # 构建转换提示词
-            prompt = self._build_conversion_prompt(text, rule_config)
+            messages = self._build_conversion_messages(text, rule_config)
             
-            # 调用 Deepseek API
-            converted_text = await self._call_deepseek_api(prompt)
+            # 调用 LLM
+            converted_text = await self._complete(messages)
             
             return converted_text
             
@@ -100,71 +113,69 @@ class SimpleLLMService:
             logger.error(f"LLM 转换失败: {e}")
             raise
     
-    def _build_conversion_prompt(
-        self, 
-        text: str, 
-        rule_config: Optional[Dict[str, Any]] = None
-    ) -> str:
-        """构建优化的转换提示词"""
+    def _chunk_converter(
+        self,
+        rule_config: Optional[Dict[str, Any]],
+        conversation_type: ConversationType
+    ) -> Callable[[str, int, int], Awaitable[str]]:
+        """分块转换时转换单块的协程函数，各块使用按全文检测的对话类型"""
+        async def convert_chunk(chunk: str, index: int, total: int) -> str:
+            messages = self._build_conversion_messages(chunk, rule_config, conversation_type)
+            return await self._complete(with_chunk_instruction(messages))
         
-        # 使用高级prompt管理器构建prompt
-        prompt = prompt_manager.build_prompt(
-            text=text, 
-            rule_config=rule_config
-        )
+        return convert_chunk
+    
+    def _build_conversion_messages(
+        self,
+        text: str,
+        rule_config: Optional[Dict[str, Any]] = None,
+        conversation_type: Optional[ConversationType] = None
+    ) -> List[Dict[str, str]]:
+        """按 LLM_PROMPT_LAYOUT 构建转换请求的消息列表"""
+        if conversation_type is None:
+            conversation_type = prompt_manager.detect_conversation_type(text)
+            logger.info(f"检测到对话类型: {conversation_type.value}")
         
-        # 记录检测到的对话类型
-        detected_type = prompt_manager.detect_conversation_type(text)
-        logger.info(f"检测到对话类型: {detected_type.value}")
+        if settings.LLM_PROMPT_LAYOUT == "inline":
+            prompt = prompt_manager.build_prompt(
+                text=text,
+                conversation_type=conversation_type,
+                rule_config=rule_config
+            )
+            return [{"role": "user", "content": prompt}]
         
-        return prompt
+        # 系统消息在相同对话类型和规则配置下不变，可命中服务商的前缀缓存
+        return prompt_manager.build_messages(
+            text=text,
+            conversation_type=conversation_type,
+            rule_config=rule_config
+        )
     
     async def _call_deepseek_api(self, prompt: str) -> str:
-        """调用 Deepseek API"""
-        
-        if not self.deepseek_api_key:
-            raise ValueError("Deepseek API 密钥未配置")
-        
-        headers = {
-            "Authorization": f"Bearer {self.deepseek_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": self.deepseek_model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "max_tokens": 4000,
-            "temperature": 0.7
-        }
-        
+        """以单条用户消息调用 LLM 补全接口"""
+        return await self._complete([{"role": "user", "content": prompt}])
+    
+    async def _complete(self, messages: List[Dict[str, str]]) -> str:
+        """调用 LLM 补全接口（按 LLM_PROVIDERS 配置在各服务商间路由）"""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.deepseek_base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                
-                result = response.json()
-                converted_text = result["choices"][0]["message"]["content"].strip()
-                
-                logger.info(f"Deepseek API 调用成功，返回文本长度: {len(converted_text)}")
-                return converted_text
-                
+            converted_text = await llm_router.complete(
+                messages,
+                temperature=0.7,
+                max_tokens=4000,
+                attempt_timeout=30.0
+            )
+            
+            logger.info(f"LLM API 调用成功，返回文本长度: {len(converted_text)}")
+            return converted_text
+            
         except httpx.HTTPStatusError as e:
-            logger.error(f"Deepseek API HTTP 错误: {e.response.status_code} - {e.response.text}")
+            logger.error(f"LLM API HTTP 错误: {e.response.status_code} - {e.response.text}")
             raise
         except httpx.TimeoutException:
-            logger.error("Deepseek API 调用超时")
+            logger.error("LLM API 调用超时")
             raise
         except Exception as e:
-            logger.error(f"Deepseek API 调用异常: {str(e)}")
+            logger.error(f"LLM API 调用异常: {str(e)}")
             raise
     
     def _simple_quality_assessment(self, original: str, converted: str) -> float:
@@ -213,7 +224,7 @@ class SimpleLLMService:
         rule_config: Optional[Dict[str, Any]] = None
     ) -> AsyncGenerator[str, None]:
         """
-        流式转换：实时返回转换进度和结果
+        流式转换：实时返回转换进度和结果（v1 协议）
         
         Args:
             original_text: 原始对话式笔录
@@ -222,79 +233,118 @@ class SimpleLLMService:
         Yields:
             SSE格式的事件数据
         """
+        async for event_type, data in self.stream_conversion_events(original_text, rule_config):
+            yield self._format_sse_event(event_type, data)
+    
+    async def stream_conversion_events(
+        self, 
+        original_text: str, 
+        rule_config: Optional[Dict[str, Any]] = None,
+        protocol: int = 1
+    ) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+        """
+        流式转换事件，产出 (事件类型, 数据)
+        
+        - v1: chunk 事件附带截至当前的全部文本 (partial_content)，complete 事件附带最终文本
+        - v2: delta 事件只含文本增量，每输出 LLM_SSE_CHECKPOINT_CHARS 个字符发送一次
+          checkpoint 事件（截至当前的文本长度和块数），complete 事件不再重复最终文本
+        
+        两种协议的进度事件都按时间节流，间隔不小于 LLM_SSE_PROGRESS_INTERVAL 秒。
+        超过 LLM_CHUNK_THRESHOLD 的长笔录与非流式转换一样分块并发转换，
+        按原顺序逐块输出（块之间以空行分隔，衔接处不润色）。
+        """
         try:
             logger.info(f"开始流式转换，原文长度: {len(original_text)}")
             
             # 发送开始事件
             detected_type = prompt_manager.detect_conversation_type(original_text)
-            yield self._format_sse_event("start", {
+            yield "start", {
                 "message": "开始分析对话内容",
                 "conversation_type": detected_type.value,
-                "original_length": len(original_text)
-            })
+                "original_length": len(original_text),
+                "protocol": protocol
+            }
             
             # 发送分析进度
-            yield self._format_sse_event("progress", {
+            yield "progress", {
                 "percentage": 20,
                 "stage": "分析对话类型",
                 "message": f"检测到{detected_type.value}类型对话"
-            })
+            }
             
-            # 构建转换提示词
-            prompt = self._build_conversion_prompt(original_text, rule_config)
+            # 构建转换提示词；长笔录分块转换，避免单次请求的输出被 max_tokens 截断
+            if chunked_converter.should_chunk(original_text):
+                content_stream = self._stream_chunked_conversion(original_text, rule_config, detected_type)
+            else:
+                messages = self._build_conversion_messages(original_text, rule_config, detected_type)
+                content_stream = self._stream_call_deepseek_api(messages)
             
-            yield self._format_sse_event("progress", {
+            yield "progress", {
                 "percentage": 40,
                 "stage": "构建转换策略",
                 "message": "准备开始智能转换"
-            })
+            }
             
             # 流式调用LLM
-            converted_text = ""
+            parts: List[str] = []
+            length = 0
             chunk_count = 0
+            next_checkpoint = settings.LLM_SSE_CHECKPOINT_CHARS
+            last_progress = time.monotonic()
             
-            async for chunk_data in self._stream_call_deepseek_api(prompt):
+            async for chunk_data in content_stream:
+                content = chunk_data["content"]
                 chunk_count += 1
-                converted_text += chunk_data["content"]
+                parts.append(content)
+                length += len(content)
                 
                 # 发送内容块
-                yield self._format_sse_event("chunk", {
-                    "content": chunk_data["content"],
-                    "partial_content": converted_text,
-                    "is_partial": True,
-                    "chunk_index": chunk_count
-                })
+                if protocol >= 2:
+                    yield "delta", {"content": content}
+                    if length >= next_checkpoint:
+                        next_checkpoint = length + settings.LLM_SSE_CHECKPOINT_CHARS
+                        yield "checkpoint", {"length": length, "chunks": chunk_count}
+                else:
+                    yield "chunk", {
+                        "content": content,
+                        "partial_content": "".join(parts),
+                        "is_partial": True,
+                        "chunk_index": chunk_count
+                    }
                 
-                # 更新进度
-                progress = min(40 + (chunk_count * 8), 85)
-                yield self._format_sse_event("progress", {
-                    "percentage": progress,
-                    "stage": "智能转换中",
-                    "message": f"已生成{len(converted_text)}字符"
-                })
+                # 更新进度（按时间节流）
+                now = time.monotonic()
+                if now - last_progress >= settings.LLM_SSE_PROGRESS_INTERVAL:
+                    last_progress = now
+                    yield "progress", {
+                        "percentage": min(40 + (chunk_count * 8), 85),
+                        "stage": "智能转换中",
+                        "message": f"已生成{length}字符"
+                    }
+            
+            converted_text = "".join(parts)
             
             # 发送质量评估进度
-            yield self._format_sse_event("progress", {
+            yield "progress", {
                 "percentage": 90,
                 "stage": "质量分析",
                 "message": "评估转换质量"
-            })
+            }
             
             # 计算质量评分
             quality_score = self._simple_quality_assessment(original_text, converted_text)
             
-            yield self._format_sse_event("quality", {
+            yield "quality", {
                 "score": quality_score,
                 "metrics": {
                     "word_count_retention": len(converted_text.split()) / len(original_text.split()) if original_text.split() else 0,
                     "length_ratio": len(converted_text) / len(original_text) if len(original_text) > 0 else 0
                 }
-            })
+            }
             
             # 发送完成事件
-            yield self._format_sse_event("complete", {
+            complete = {
                 "success": True,
-                "final_content": converted_text,
                 "quality_score": quality_score,
                 "original_length": len(original_text),
                 "final_length": len(converted_text),
@@ -305,135 +355,104 @@ class SimpleLLMService:
                     "compression_ratio": 1 - (len(converted_text) / len(original_text)) if len(original_text) > 0 else 0,
                     "quality_score": quality_score
                 }
-            })
+            }
+            if protocol >= 2:
+                complete["chunks"] = chunk_count
+            else:
+                complete["final_content"] = converted_text
+            yield "complete", complete
             
             logger.info(f"流式转换完成，质量评分: {quality_score:.2f}")
             
         except Exception as e:
             logger.error(f"流式转换失败: {str(e)}")
-            yield self._format_sse_event("error", {
+            yield "error", {
                 "success": False,
                 "error": str(e),
                 "message": "转换过程出现错误"
-            })
+            }
     
     def _format_sse_event(self, event_type: str, data: Dict[str, Any]) -> str:
         """格式化SSE事件"""
-        import time
         data["timestamp"] = time.time()
         return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
     
-    async def _stream_call_deepseek_api(self, prompt: str) -> AsyncGenerator[Dict[str, Any], None]:
-        """流式调用Deepseek API"""
-        
-        if not self.deepseek_api_key:
-            raise ValueError("Deepseek API 密钥未配置")
-        
-        headers = {
-            "Authorization": f"Bearer {self.deepseek_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "model": self.deepseek_model,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "max_tokens": 4000,
-            "temperature": 0.7,
-            "stream": True  # 启用流式响应
-        }
-        
+    async def _stream_chunked_conversion(
+        self,
+        text: str,
+        rule_config: Optional[Dict[str, Any]],
+        conversation_type: ConversationType
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """长笔录分块并发转换，按原顺序逐块产出，格式同 _stream_call_deepseek_api"""
+        chunk_index = 0
+        async for part in chunked_converter.iter_convert(text, self._chunk_converter(rule_config, conversation_type)):
+            chunk_index += 1
+            yield {
+                "content": part if chunk_index == 1 else "\n\n" + part,
+                "finish_reason": None,
+                "chunk_index": chunk_index
+            }
+    
+    async def _stream_call_deepseek_api(self, messages: List[Dict[str, str]]) -> AsyncGenerator[Dict[str, Any], None]:
+        """流式调用 LLM 补全接口（按 LLM_PROVIDERS 配置在各服务商间路由）"""
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                async with client.stream(
-                    "POST",
-                    f"{self.deepseek_base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    response.raise_for_status()
-                    
-                    # 收集完整响应用于非流式降级
-                    full_content = ""
-                    chunk_count = 0
+            chunk_count = 0
+            
+            async for chunk in llm_router.stream(messages, temperature=0.7, max_tokens=4000, timeout=60.0):
+                content = chunk["content"]
+                # 确保内容不为空且有效
+                if content and content.strip():
+                    chunk_count += 1
                     
-                    async for line in response.aiter_lines():
-                        if line.startswith("data: "):
-                            data_str = line[6:]  # 移除 "data: " 前缀
-                            
-                            if data_str.strip() == "[DONE]":
-                                break
-                                
-                            try:
-                                data = json.loads(data_str)
-                                if "choices" in data and len(data["choices"]) > 0:
-                                    delta = data["choices"][0].get("delta", {})
-                                    if "content" in delta:
-                                        content = delta["content"]
-                                        # 确保内容不为空且有效
-                                        if content and content.strip():
-                                            full_content += content
-                                            chunk_count += 1
-                                            
-                                            yield {
-                                                "content": content,
-                                                "finish_reason": data["choices"][0].get("finish_reason"),
-                                                "chunk_index": chunk_count,
-                                                "total_content": full_content
-                                            }
-                            except json.JSONDecodeError as e:
-                                logger.warning(f"跳过无效的SSE数据: {data_str}")
-                                continue
+                    yield {
+                        "content": content,
+                        "finish_reason": chunk.get("finish_reason"),
+                        "chunk_index": chunk_count
+                    }
+            
+            # 如果没有收到任何有效内容，降级为普通API调用
+            if chunk_count == 0:
+                logger.warning("流式API没有返回有效内容，降级为普通API调用")
+                fallback_content = await self._complete(messages)
+                if fallback_content and fallback_content.strip():
+                    # 将完整内容分成小块进行模拟流式输出
+                    words = fallback_content.split()
+                    chunk_size = max(1, len(words) // 10)  # 分成10个左右的块
                     
-                    # 如果没有收到任何有效内容，降级为普通API调用
-                    if chunk_count == 0:
-                        logger.warning("流式API没有返回有效内容，降级为普通API调用")
-                        fallback_content = await self._call_deepseek_api(prompt)
-                        if fallback_content and fallback_content.strip():
-                            # 将完整内容分成小块进行模拟流式输出
-                            words = fallback_content.split()
-                            chunk_size = max(1, len(words) // 10)  # 分成10个左右的块
-                            
-                            for i in range(0, len(words), chunk_size):
-                                chunk_words = words[i:i + chunk_size]
-                                chunk_content = " ".join(chunk_words)
-                                if i > 0:  # 从第二个chunk开始添加空格
-                                    chunk_content = " " + chunk_content
-                                
-                                yield {
-                                    "content": chunk_content,
-                                    "finish_reason": None if i + chunk_size < len(words) else "stop",
-                                    "chunk_index": (i // chunk_size) + 1,
-                                    "total_content": " ".join(words[:i + chunk_size])
-                                }
-                                
-                                # 模拟流式延迟
-                                await asyncio.sleep(0.3)
-                                
+                    for i in range(0, len(words), chunk_size):
+                        chunk_words = words[i:i + chunk_size]
+                        chunk_content = " ".join(chunk_words)
+                        if i > 0:  # 从第二个chunk开始添加空格
+                            chunk_content = " " + chunk_content
+                        
+                        yield {
+                            "content": chunk_content,
+                            "finish_reason": None if i + chunk_size < len(words) else "stop",
+                            "chunk_index": (i // chunk_size) + 1
+                        }
+                        
+                        # 模拟流式延迟
+                        await asyncio.sleep(0.3)
+                        
         except httpx.HTTPStatusError as e:
-            logger.error(f"Deepseek API HTTP 错误: {e.response.status_code} - {e.response.text}")
+            logger.error(f"LLM API HTTP 错误: {e.response.status_code} - {e.response.text}")
             # 降级为普通API调用
             try:
-                fallback_content = await self._call_deepseek_api(prompt)
+                fallback_content = await self._complete(messages)
                 if fallback_content and fallback_content.strip():
                     yield {
                         "content": fallback_content,
                         "finish_reason": "stop",
-                        "chunk_index": 1,
-                        "total_content": fallback_content
+                        "chunk_index": 1
                     }
             except Exception as fallback_error:
                 logger.error(f"降级API调用也失败: {fallback_error}")
                 raise e
         except httpx.TimeoutException:
-            logger.error("Deepseek API 调用超时")
+            logger.error("LLM API 调用超时")
             raise
         except Exception as e:
-            logger.error(f"Deepseek API 流式调用异常: {str(e)}")
+            logger.error(f"LLM API 流式调用异常: {str(e)}")
             raise
 
 
@@ -0,0 +1,392 @@
+"""
+正则静态分析 - 分析规则正则的字符集、匹配宽度和上下文依赖
+
+用于判断规则能否合并执行、能否按片段独立执行等优化前提。
+"""
+
+import re
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+    from re import _compiler as sre_compile
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+    import sre_compile
+
+
+# 字符范围超过该大小时不再枚举，视为字符集未知
+MAX_ENUMERATED_RANGE = 512
+
+# 只依赖所在行内容的断言：单词边界，以及多行模式下的 ^、$
+_LINE_ANCHORS = {sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY}
+_MULTILINE_ANCHORS = {sre_constants.AT_BEGINNING, sre_constants.AT_END}
+
+# 可枚举的字符类别
+_ENUMERABLE_CATEGORIES = {
+    sre_constants.CATEGORY_SPACE: r"\s",
+    sre_constants.CATEGORY_DIGIT: r"\d",
+}
+
+
+@lru_cache(maxsize=None)
+def _category_chars(category, ascii_only: bool) -> FrozenSet[str]:
+    """枚举字符类别（\\s、\\d）包含的全部字符"""
+    flags = re.ASCII if ascii_only else re.UNICODE
+    all_chars = "".join(map(chr, range(sys.maxunicode + 1)))
+    return frozenset(re.findall(_ENUMERABLE_CATEGORIES[category], all_chars, flags))
+
+
+@dataclass(frozen=True)
+class PatternProfile:
+    """正则的静态特征"""
+    # 匹配内容可能包含的全部字符，无法确定时为 None
+    chars: Optional[FrozenSet[str]]
+    min_width: int
+    # 最大匹配宽度，无上界时为 None
+    max_width: Optional[int]
+    # 是否含锚点/单词边界（^、$、\b 等）
+    has_anchors: bool
+    # 是否含整段文本级别的锚点（\A、\Z 及非多行模式的 ^、$）
+    has_text_anchors: bool
+    # 是否含前后查看断言
+    has_lookaround: bool
+    # 是否含反向引用或条件分组
+    has_backrefs: bool
+    # 后向断言需要回看的最大字符数
+    lookbehind_width: int
+    # 前后查看断言只检查所在行内的字符（断言内容不含换行、无全文锚点）
+    lookaround_in_line: bool = False
+
+    @property
+    def context_free(self) -> bool:
+        """匹配结果只取决于被匹配的内容本身，与周围文本无关"""
+        return not (self.has_anchors or self.has_lookaround or self.has_backrefs)
+
+    @property
+    def line_local(self) -> bool:
+        """匹配不跨行且只依赖所在行，按行切分文本后分段执行结果不变"""
+        return (
+            self.chars is not None
+            and "\n" not in self.chars
+            and self.min_width > 0
+            and (not self.has_lookaround or self.lookaround_in_line)
+            and not self.has_text_anchors
+        )
+
+
+class _Analyzer:
+    """遍历 sre 语法树收集特征"""
+
+    def __init__(self, flags: int):
+        self.ignore_case = bool(flags & re.IGNORECASE)
+        self.ascii_only = bool(flags & re.ASCII)
+        self.multiline = bool(flags & re.MULTILINE)
+        self.chars = set()
+        self.chars_known = True
+        self.has_anchors = False
+        self.has_text_anchors = False
+        self.has_lookaround = False
+        self.has_backrefs = False
+        self.lookbehind_width = 0
+        self.lookaround_in_line = True
+
+    def add_char(self, code: int):
+        char = chr(code)
+        if self.ignore_case and char.lower() != char.upper():
+            # 忽略大小写时存在特殊的大小写折叠，无法精确枚举
+            self.chars_known = False
+        self.chars.add(char)
+
+    def visit(self, items):
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                self.add_char(av)
+            elif op is sre_constants.IN:
+                self.visit_in(av)
+            elif op in (sre_constants.NOT_LITERAL, sre_constants.ANY):
+                self.chars_known = False
+            elif op is sre_constants.BRANCH:
+                for branch in av[1]:
+                    self.visit(branch)
+            elif op is sre_constants.SUBPATTERN:
+                _, add_flags, del_flags, sub = av
+                multiline, ignore_case = self.multiline, self.ignore_case
+                if add_flags & re.MULTILINE:
+                    self.multiline = True
+                if del_flags & re.MULTILINE:
+                    self.multiline = False
+                if add_flags & re.IGNORECASE:
+                    self.ignore_case = True
+                if del_flags & re.IGNORECASE:
+                    self.ignore_case = False
+                self.visit(sub)
+                self.multiline, self.ignore_case = multiline, ignore_case
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+                        getattr(sre_constants, "POSSESSIVE_REPEAT", None)):
+                self.visit(av[2])
+            elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+                self.visit(av)
+            elif op is sre_constants.AT:
+                self.has_anchors = True
+                if not (av in _LINE_ANCHORS or (self.multiline and av in _MULTILINE_ANCHORS)):
+                    self.has_text_anchors = True
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                self.has_lookaround = True
+                direction, sub = av
+                if direction < 0:
+                    self.lookbehind_width = max(self.lookbehind_width, sub.getwidth()[1])
+                self.visit_lookaround(sub)
+            elif op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+                self.has_backrefs = True
+                self.chars_known = False
+            else:
+                self.chars_known = False
+
+    def visit_lookaround(self, items):
+        """
+        分析断言内容
+
+        断言内容不可能匹配换行时，在行边界处整段文本看到的是无法匹配的换行、
+        分段文本看到的是文本边界，断言结果相同，不影响按行切分执行。
+        """
+        sub = _Analyzer(0)
+        sub.ignore_case, sub.ascii_only, sub.multiline = self.ignore_case, self.ascii_only, self.multiline
+        sub.visit(items)
+        self.has_anchors = self.has_anchors or sub.has_anchors
+        self.has_text_anchors = self.has_text_anchors or sub.has_text_anchors
+        self.has_backrefs = self.has_backrefs or sub.has_backrefs
+        if not (sub.chars_known and "\n" not in sub.chars and sub.lookaround_in_line):
+            self.lookaround_in_line = False
+
+    def visit_in(self, items):
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                self.add_char(av)
+            elif op is sre_constants.RANGE:
+                low, high = av
+                if high - low > MAX_ENUMERATED_RANGE:
+                    self.chars_known = False
+                    return
+                for code in range(low, high + 1):
+                    self.add_char(code)
+            elif op is sre_constants.CATEGORY and av in _ENUMERABLE_CATEGORIES:
+                self.chars.update(_category_chars(av, self.ascii_only))
+            else:
+                # NEGATE、\w 等无法（或不值得）枚举
+                self.chars_known = False
+                return
+
+
+@lru_cache(maxsize=1024)
+def analyze_pattern(pattern: str, flags: int = 0) -> Optional[PatternProfile]:
+    """
+    分析正则的静态特征
+
+    Args:
+        pattern: 正则表达式
+        flags: 编译标志
+
+    Returns:
+        PatternProfile，正则无法解析时返回 None
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, TypeError, OverflowError):
+        return None
+
+    analyzer = _Analyzer(parsed.state.flags)
+    analyzer.visit(parsed)
+
+    min_width, max_width = parsed.getwidth()
+    return PatternProfile(
+        chars=frozenset(analyzer.chars) if analyzer.chars_known else None,
+        min_width=min_width,
+        max_width=None if max_width >= sre_constants.MAXREPEAT else max_width,
+        has_anchors=analyzer.has_anchors,
+        has_text_anchors=analyzer.has_text_anchors,
+        has_lookaround=analyzer.has_lookaround,
+        has_backrefs=analyzer.has_backrefs,
+        lookbehind_width=analyzer.lookbehind_width,
+        lookaround_in_line=analyzer.has_lookaround and analyzer.lookaround_in_line
+    )
+
+
+# 分组引用 \1、\g<name>（三位八进制转义 \101 不是分组引用）
+_GROUP_REFERENCE = re.compile(r"\\(?:g<[^>]*>|(?![0-7]{3})[1-9][0-9]?)")
+
+
+def template_literal(replacement: str) -> Optional[str]:
+    """替换模板中除分组引用外的字面输出，模板无效时返回 None"""
+    stripped = _GROUP_REFERENCE.sub("", replacement)
+    if "\\" not in stripped:
+        return stripped
+    try:
+        return re.sub("x", stripped, "x")
+    except re.error:
+        return None
+
+
+def template_has_group_refs(replacement: str) -> bool:
+    """替换模板是否引用了分组"""
+    return _GROUP_REFERENCE.search(replacement) is not None
+
+
+# 回溯风险类型
+RISK_NESTED_QUANTIFIER = "nested_quantifier"
+RISK_OVERLAPPING_ALTERNATION = "overlapping_alternation"
+
+# 上限不小于该值的重复视为无界重复
+_LARGE_REPEAT = 16
+
+_REPEAT_OPS = tuple(
+    op for op in (
+        sre_constants.MAX_REPEAT,
+        sre_constants.MIN_REPEAT,
+        getattr(sre_constants, "POSSESSIVE_REPEAT", None),
+    ) if op is not None
+)
+
+
+def _is_unbounded(av) -> bool:
+    min_count, max_count, _ = av
+    return max_count > min_count and max_count >= _LARGE_REPEAT
+
+
+def _unwrap(items) -> list:
+    """去掉只包含一个分组的外层"""
+    items = list(items)
+    while len(items) == 1 and items[0][0] is sre_constants.SUBPATTERN:
+        items = list(items[0][1][3])
+    return items
+
+
+def _variable_repeats(items) -> list:
+    """子模式中所有次数可变的重复（不深入前后查看断言）"""
+    found = []
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            if av[1] > av[0]:
+                found.append(av[2])
+            found.extend(_variable_repeats(av[2]))
+        elif op is sre_constants.SUBPATTERN:
+            found.extend(_variable_repeats(av[3]))
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                found.extend(_variable_repeats(branch))
+    return found
+
+
+def _item_chars(state, items, flags: int) -> Optional[FrozenSet[str]]:
+    analyzer = _Analyzer(flags)
+    analyzer.visit(items)
+    return frozenset(analyzer.chars) if analyzer.chars_known else None
+
+
+def _can_consume(state, body, chars: FrozenSet[str], flags: int) -> bool:
+    """重复体能否匹配给定字符中的任意一个"""
+    try:
+        compiled = sre_compile.compile(sre_parse.SubPattern(state, list(body)), flags)
+    except Exception:
+        return True
+    return any(compiled.search(char) for char in chars)
+
+
+def _has_separator(state, body, inner_repeats, flags: int) -> bool:
+    """
+    外层重复体中是否存在必须匹配、且内层重复无法匹配的内容
+
+    如 (\\d+,)* 中的逗号将每次重复分隔开，匹配方式唯一，不会回溯爆炸。
+    """
+    for op, av in _unwrap(body):
+        if op in _REPEAT_OPS or op is sre_constants.BRANCH:
+            continue
+        item = [(op, av)]
+        if sre_parse.SubPattern(state, item).getwidth()[0] < 1:
+            continue
+        chars = _item_chars(state, item, flags)
+        if chars and not any(_can_consume(state, inner, chars, flags) for inner in inner_repeats):
+            return True
+    return False
+
+
+def _find_risks(state, items, flags: int, risks: List[Tuple[str, str]]) -> None:
+    for op, av in items:
+        if op in _REPEAT_OPS:
+            body = av[2]
+            if _is_unbounded(av):
+                inner_repeats = _variable_repeats(body)
+                if inner_repeats and not _has_separator(state, body, inner_repeats, flags):
+                    risks.append((
+                        RISK_NESTED_QUANTIFIER,
+                        "正则包含嵌套量词（如 (a+)+），可能导致灾难性回溯"
+                    ))
+                unwrapped = _unwrap(body)
+                if len(unwrapped) == 1 and unwrapped[0][0] is sre_constants.BRANCH:
+                    branch_chars = [_item_chars(state, branch, flags) for branch in unwrapped[0][1][1]]
+                    known = [chars for chars in branch_chars if chars is not None]
+                    if any(a & b for i, a in enumerate(known) for b in known[i + 1:]):
+                        risks.append((
+                            RISK_OVERLAPPING_ALTERNATION,
+                            "量词作用的分支选择中存在可匹配相同字符的分支（如 (a|ab)*），可能导致大量回溯"
+                        ))
+            _find_risks(state, body, flags, risks)
+        elif op is sre_constants.SUBPATTERN:
+            _find_risks(state, av[3], flags, risks)
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                _find_risks(state, branch, flags, risks)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _find_risks(state, av[1], flags, risks)
+        elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+            _find_risks(state, av, flags, risks)
+
+
+@lru_cache(maxsize=1024)
+def backtracking_risks(pattern: str, flags: int = 0) -> Tuple[Tuple[str, str], ...]:
+    """
+    静态检查正则的回溯风险
+
+    Returns:
+        (风险类型, 说明) 元组，去重后按出现顺序排列；无法解析时为空
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, TypeError, OverflowError):
+        return ()
+
+    risks: List[Tuple[str, str]] = []
+    _find_risks(parsed.state, parsed, parsed.state.flags, risks)
+    return tuple(dict.fromkeys(risks))
+
+
+def adversarial_inputs(pattern: str, flags: int = 0, lengths: Tuple[int, ...] = (32, 4096)) -> List[str]:
+    """
+    构造针对正则的对抗性输入
+
+    用正则中出现的字符及常见字符（字母、数字、空白、汉字）构造长重复串，
+    末尾追加无法匹配的字符迫使引擎回溯。
+    """
+    seeds = []
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+        analyzer = _Analyzer(0)
+        analyzer.visit(parsed)
+        seeds.extend(sorted(analyzer.chars)[:8])
+    except (re.error, TypeError, OverflowError):
+        pass
+    seeds.extend(char for char in ("a", "0", " ", "中") if char not in seeds)
+
+    mixed = "".join(seeds)
+    inputs = []
+    for length in lengths:
+        for char in seeds:
+            inputs.append(char * length + "\x00")
+            inputs.append(char * length + "\n")
+        inputs.append(mixed * (length // len(mixed) + 1) + "\x00")
+    return inputs
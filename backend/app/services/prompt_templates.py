@@ -3,11 +3,22 @@
 支持多种转换场景和动态规则应用
 """
 
-from typing import Dict, List, Optional, Any
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 from dataclasses import dataclass
 
 
+# 最多缓存的预编译模板数（不同的规则组合）
+MAX_COMPILED_PROMPTS = 256
+
+# 最多缓存的对话类型检测结果数
+MAX_CLASSIFIED_TEXTS = 1024
+
+
 class ConversationType(Enum):
     """对话类型枚举"""
     GENERAL = "general"  # 通用对话
@@ -27,14 +38,110 @@ class PromptRule:
     priority: int = 1  # 优先级 1-5，数字越大优先级越高
 
 
+class ConversationClassifier:
+    """
+    基于关键词的对话类型分类器
+
+    所有类型的关键词编译为一个正则，一次扫描找出文本中出现的关键词，
+    再按类型累加权重（同一关键词无论出现几次只计一次）。得分最高的类型
+    胜出，同分时按关键词表中类型的顺序，没有命中时为通用对话。
+    结果按文本摘要缓存。
+    """
+
+    def __init__(
+        self,
+        detectors: Dict[ConversationType, List[str]],
+        weights: Optional[Dict[ConversationType, Dict[str, int]]] = None
+    ):
+        weights = weights or {}
+        self.types = list(detectors)
+        # 关键词 -> [(类型, 权重)]，同一类型中重复列出的关键词重复计分
+        self._keyword_scores: Dict[str, List[Tuple[ConversationType, int]]] = {}
+        for conv_type, keywords in detectors.items():
+            for keyword in keywords:
+                weight = weights.get(conv_type, {}).get(keyword, 1)
+                self._keyword_scores.setdefault(keyword.lower(), []).append((conv_type, weight))
+
+        keywords = sorted(self._keyword_scores, key=len, reverse=True)
+        # 每个位置只匹配最长的关键词，被包含的较短关键词随之计入
+        self._contained = {
+            keyword: [other for other in keywords if other in keyword]
+            for keyword in keywords
+        }
+        self._pattern = re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE)
+        self._cache: "OrderedDict[bytes, ConversationType]" = OrderedDict()
+
+    def scores(self, text: str) -> Dict[ConversationType, int]:
+        """各类型的加权得分，只包含得分大于0的类型"""
+        found = set()
+        # 从每个匹配的下一个字符继续查找，与之重叠的关键词不会漏掉
+        match = self._pattern.search(text)
+        while match is not None and len(found) < len(self._keyword_scores):
+            found.update(self._contained[match.group().lower()])
+            match = self._pattern.search(text, match.start() + 1)
+
+        totals: Dict[ConversationType, int] = {}
+        for keyword in found:
+            for conv_type, weight in self._keyword_scores[keyword]:
+                totals[conv_type] = totals.get(conv_type, 0) + weight
+        return {conv_type: totals[conv_type] for conv_type in self.types if conv_type in totals}
+
+    def classify(self, text: str) -> ConversationType:
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        type_scores = self.scores(text)
+        # max 取第一个最高分，即同分时按关键词表中类型的顺序
+        result = max(type_scores.items(), key=lambda x: x[1])[0] if type_scores else ConversationType.GENERAL
+
+        self._cache[key] = result
+        if len(self._cache) > MAX_CLASSIFIED_TEXTS:
+            self._cache.popitem(last=False)
+        return result
+
+    def classify_many(self, texts: List[str]) -> List[ConversationType]:
+        """批量分类，重复的文本只计算一次"""
+        results: Dict[str, ConversationType] = {}
+        for text in texts:
+            if text not in results:
+                results[text] = self.classify(text)
+        return [results[text] for text in texts]
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """预编译的prompt模板，组装时笔录只拼接一次，不经过格式化"""
+    prefix: str  # 单条消息形式中笔录之前的部分
+    suffix: str  # 单条消息形式中笔录之后的部分
+    system: str  # 系统消息：指令、附加要求和示例
+    label: str  # 用户消息中笔录之前的标签
+    tail: str  # 用户消息中笔录之后的结尾提示
+
+    def render(self, text: str) -> str:
+        """单条消息形式的prompt"""
+        return "".join((self.prefix, text, self.suffix))
+
+    def messages(self, text: str) -> List[Dict[str, str]]:
+        """系统消息 + 用户消息形式的prompt"""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": "".join((self.label, text, self.tail))}
+        ]
+
+
 class PromptTemplateManager:
     """Prompt模板管理器"""
     
     def __init__(self):
         self.conversation_detectors = self._init_conversation_detectors()
+        self.classifier = ConversationClassifier(self.conversation_detectors, self._init_keyword_weights())
         self.base_templates = self._init_base_templates()
         self.rules_library = self._init_rules_library()
         self.examples = self._init_examples()
+        self._compiled: "OrderedDict[Tuple[ConversationType, Tuple[str, ...], str], CompiledPrompt]" = OrderedDict()
     
     def _init_conversation_detectors(self) -> Dict[ConversationType, List[str]]:
         """初始化对话类型检测关键词"""
@@ -233,34 +340,21 @@ class PromptTemplateManager:
             ]
         }
     
+    def _init_keyword_weights(self) -> Dict[ConversationType, Dict[str, int]]:
+        """初始化高优先级关键词的权重，未列出的关键词权重为1"""
+        return {
+            ConversationType.EMOTIONAL: {kw: 2 for kw in ['感受', '情绪', '心情', '影响', '变化']},  # 情感关键词加权
+            ConversationType.CONSULTATION: {kw: 2 for kw in ['建议', '帮助', '指导', '解决']},  # 咨询关键词加权
+            ConversationType.CASUAL: {kw: 2 for kw in ['昨天', '今天', '电影', '朋友']}  # 日常关键词加权
+        }
+    
     def detect_conversation_type(self, text: str) -> ConversationType:
         """检测对话类型"""
-        text_lower = text.lower()
-        type_scores = {}
-        
-        # 加权计算分数
-        for conv_type, keywords in self.conversation_detectors.items():
-            score = 0
-            for keyword in keywords:
-                if keyword in text_lower:
-                    # 给高优先级关键词更高权重
-                    if conv_type == ConversationType.EMOTIONAL and keyword in ['感受', '情绪', '心情', '影响', '变化']:
-                        score += 2  # 情感关键词加权
-                    elif conv_type == ConversationType.CONSULTATION and keyword in ['建议', '帮助', '指导', '解决']:
-                        score += 2  # 咨询关键词加权
-                    elif conv_type == ConversationType.CASUAL and keyword in ['昨天', '今天', '电影', '朋友']:
-                        score += 2  # 日常关键词加权
-                    else:
-                        score += 1
-            
-            if score > 0:
-                type_scores[conv_type] = score
-        
-        if not type_scores:
-            return ConversationType.GENERAL
-        
-        # 返回得分最高的类型
-        return max(type_scores.items(), key=lambda x: x[1])[0]
+        return self.classifier.classify(text)
+    
+    def detect_conversation_types(self, texts: List[str]) -> List[ConversationType]:
+        """批量检测对话类型"""
+        return self.classifier.classify_many(texts)
     
     def get_recommended_rules(self, conversation_type: ConversationType) -> List[str]:
         """根据对话类型推荐最佳规则组合"""
@@ -276,6 +370,87 @@ class PromptTemplateManager:
         
         return recommendations.get(conversation_type, [])
     
+    def compile(
+        self,
+        conversation_type: ConversationType,
+        rule_config: Optional[Dict[str, Any]] = None
+    ) -> CompiledPrompt:
+        """
+        获取对话类型和规则配置对应的预编译模板
+
+        按 (对话类型, 排序后的规则名, 自定义指令摘要) 缓存，相同配置只编译一次。
+        """
+        rule_names = tuple(sorted((rule_config or {}).get("rules", [])))
+        custom_instructions = tuple((rule_config or {}).get("custom_instructions", []))
+        custom_digest = hashlib.sha1(
+            json.dumps(custom_instructions, ensure_ascii=False).encode("utf-8")
+        ).hexdigest() if custom_instructions else ""
+        key = (conversation_type, rule_names, custom_digest)
+
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            self._compiled.move_to_end(key)
+            return compiled
+
+        compiled = self._compile(conversation_type, rule_names, custom_instructions)
+        self._compiled[key] = compiled
+        if len(self._compiled) > MAX_COMPILED_PROMPTS:
+            self._compiled.popitem(last=False)
+        return compiled
+
+    def _compile(
+        self,
+        conversation_type: ConversationType,
+        rule_names: Tuple[str, ...],
+        custom_instructions: Tuple[str, ...]
+    ) -> CompiledPrompt:
+        """编译模板：在笔录处拆分，规则和示例提前拼接好"""
+        base_template = self.base_templates.get(
+            conversation_type,
+            self.base_templates[ConversationType.GENERAL]
+        )
+        additional_rules = self._apply_rule_config({
+            "rules": list(rule_names),
+            "custom_instructions": list(custom_instructions)
+        })
+
+        # 模板在笔录处分为指令、笔录标签（如"原始笔录："）和结尾提示三部分
+        head, tail = base_template.split("{text}", 1)
+        instructions, _, label = head.rstrip("\n").rpartition("\n")
+
+        # 单条消息形式：附加要求插在结尾提示前
+        suffix = tail
+        if additional_rules:
+            suffix = tail.replace(
+                "请转换为第一人称叙述：",
+                f"""
+                    
+附加要求：
+{additional_rules}
+
+请转换为第一人称叙述："""
+            )
+
+        # 系统消息形式：指令、附加要求和示例
+        system_prompt = instructions.strip()
+        if additional_rules:
+            system_prompt += f"\n\n附加要求：\n{additional_rules}"
+
+        # 添加示例（如果有，模板中已内置示例的不再重复）
+        examples = self.examples.get(conversation_type, [])
+        if examples and "转换示例" not in instructions:
+            system_prompt += "\n\n转换示例：\n"
+            for i, example in enumerate(examples[:2], 1):  # 最多使用2个示例
+                system_prompt += f"\n示例{i}：\n原文：{example['input']}\n转换：{example['output']}\n"
+
+        return CompiledPrompt(
+            prefix=head,
+            suffix=suffix,
+            system=system_prompt.rstrip(),
+            label=f"{label}\n",
+            tail=tail
+        )
+
     def build_prompt(
         self, 
         text: str, 
@@ -288,40 +463,27 @@ class PromptTemplateManager:
         if conversation_type is None:
             conversation_type = self.detect_conversation_type(text)
         
-        # 获取基础模板
-        base_template = self.base_templates.get(
-            conversation_type, 
-            self.base_templates[ConversationType.GENERAL]
-        )
-        
-        # 应用规则配置
-        if rule_config:
-            additional_rules = self._apply_rule_config(rule_config)
-            if additional_rules:
-                base_template = base_template.replace(
-                    "请转换为第一人称叙述：",
-                    f"""
-                    
-附加要求：
-{additional_rules}
+        return self.compile(conversation_type, rule_config).render(text)
+
+    def build_messages(
+        self,
+        text: str,
+        conversation_type: Optional[ConversationType] = None,
+        rule_config: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        构建系统消息 + 用户消息形式的prompt
+
+        系统消息包含转换指令、附加要求和示例，只取决于对话类型和规则配置，
+        相同配置下逐字节相同，可命中服务商的前缀缓存；笔录放在最后的用户消息中。
+        """
+
+        # 自动检测对话类型
+        if conversation_type is None:
+            conversation_type = self.detect_conversation_type(text)
+
+        return self.compile(conversation_type, rule_config).messages(text)
 
-请转换为第一人称叙述："""
-                )
-        
-        # 添加示例（如果有）
-        examples = self.examples.get(conversation_type, [])
-        if examples:
-            example_text = "\n\n转换示例：\n"
-            for i, example in enumerate(examples[:2], 1):  # 最多使用2个示例
-                example_text += f"\n示例{i}：\n原文：{example['input']}\n转换：{example['output']}\n"
-            
-            base_template = base_template.replace(
-                f"原始笔录：\n{text}",
-                f"{example_text}\n现在请转换以下内容：\n原始笔录：\n{text}"
-            )
-        
-        return base_template.format(text=text)
-    
     def _apply_rule_config(self, rule_config: Dict[str, Any]) -> str:
         """应用规则配置"""
         if not rule_config:
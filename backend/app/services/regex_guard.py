@@ -0,0 +1,206 @@
+"""
+正则执行保护 - 在独立子进程中执行有回溯风险的正则，超时即终止
+
+Python 的 re 在匹配过程中不响应信号，也无法从线程中中断，
+灾难性回溯的正则会一直占用所在进程的 CPU。这里把有风险的规则
+交给常驻的子进程执行，超过时限时直接结束该子进程并补充新的进程。
+
+子进程在服务启动时预先创建（start），被结束的子进程在后台线程中
+补充，调用方只等待正则执行本身，不等待子进程启动。只有
+pattern_analysis 判定有回溯风险的规则才经由这里执行。
+"""
+
+import multiprocessing
+import re
+import threading
+import time
+from dataclasses import replace
+from typing import Any, List, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.services.rule_plan import CompiledRule, RuleMatch
+
+
+class RuleTimeoutError(Exception):
+    """规则执行超过时限"""
+
+
+def _worker_main(conn) -> None:
+    """子进程主循环：接收任务并返回 (是否成功, 结果)"""
+    conn.send("ready")
+    while True:
+        try:
+            kind, args = conn.recv()
+        except EOFError:
+            break
+
+        try:
+            if kind == "substitute":
+                rule, text, track_spans, report_unchanged = args
+                result = rule.substitute(text, track_spans, report_unchanged)
+            elif kind == "subn":
+                pattern, flags, replacement, text = args
+                result = re.compile(pattern, flags).subn(replacement, text)
+            elif kind == "benchmark":
+                pattern, flags, inputs = args
+                compiled = re.compile(pattern, flags)
+                started = time.perf_counter()
+                for item in inputs:
+                    compiled.search(item)
+                result = time.perf_counter() - started
+            else:
+                raise ValueError(f"未知任务类型: {kind}")
+            conn.send((True, result))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _GuardWorker:
+    """常驻的正则执行子进程"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        # 等待子进程完成导入，避免启动耗时计入执行时限
+        self.conn.recv()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class RegexGuard:
+    """在子进程中带时限地执行正则"""
+
+    def __init__(self, max_workers: int = 2):
+        # 服务进程中有多个线程，使用 spawn 避免 fork 带来的锁状态问题
+        self._context = multiprocessing.get_context("spawn")
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._idle: List[_GuardWorker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self) -> None:
+        """预先创建全部子进程（服务启动时调用）"""
+        self._closed = False
+        with self._lock:
+            missing = self.max_workers - len(self._idle)
+        for _ in range(missing):
+            self._add_worker()
+
+    def _add_worker(self) -> None:
+        worker = _GuardWorker(self._context)
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_workers:
+                self._idle.append(worker)
+                return
+        worker.kill()
+
+    def _replace_worker(self, worker: _GuardWorker) -> None:
+        """结束子进程，并在后台线程中补充新的子进程"""
+        worker.kill()
+        if not self._closed:
+            threading.Thread(target=self._replenish, name="regex-guard-spawn", daemon=True).start()
+
+    def _replenish(self) -> None:
+        try:
+            self._add_worker()
+        except Exception as e:
+            # 补充失败时由下一次调用按需创建；关闭过程中的失败无需记录
+            if not self._closed:
+                logger.warning(f"补充正则执行子进程失败: {type(e).__name__}: {e}")
+
+    def _run(self, kind: str, args: Tuple, timeout: float) -> Any:
+        """
+        执行任务，超时时结束子进程并抛出 RuleTimeoutError
+
+        所有子进程都在执行时，等待空闲子进程的时间同样计入时限。
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            raise RuleTimeoutError(f"等待正则执行子进程超过 {timeout} 秒")
+        remaining = max(0.0, timeout - (time.monotonic() - started))
+        try:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                # 补充中的子进程尚未就绪（或未调用 start），在当前线程中创建
+                worker = _GuardWorker(self._context)
+
+            try:
+                worker.conn.send((kind, args))
+                finished = worker.conn.poll(remaining)
+                if finished:
+                    ok, result = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                self._replace_worker(worker)
+                raise RuntimeError(f"正则执行子进程异常退出: {e}")
+
+            if not finished:
+                self._replace_worker(worker)
+                raise RuleTimeoutError(f"正则执行超过 {timeout} 秒，已终止")
+
+            with self._lock:
+                self._idle.append(worker)
+        finally:
+            self._slots.release()
+
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def substitute(
+        self,
+        rule: CompiledRule,
+        text: str,
+        track_spans: bool = False,
+        report_unchanged: bool = False,
+        timeout: Optional[float] = None
+    ) -> Tuple[str, Tuple[RuleMatch, ...]]:
+        """在子进程中执行 rule.substitute，参数与返回值同 CompiledRule.substitute"""
+        timeout = timeout or settings.RULE_EXECUTION_TIMEOUT
+        result, matches = self._run("substitute", (rule, text, track_spans, report_unchanged), timeout)
+        # 子进程返回的是规则副本，换回原对象以便调用方按对象识别规则
+        return result, tuple(replace(match, rule=rule) for match in matches)
+
+    def subn(
+        self,
+        pattern: str,
+        flags: int,
+        replacement: str,
+        text: str,
+        timeout: Optional[float] = None
+    ) -> Tuple[str, int]:
+        """在子进程中执行 re.subn"""
+        timeout = timeout or settings.RULE_EXECUTION_TIMEOUT
+        return self._run("subn", (pattern, flags, replacement, text), timeout)
+
+    def benchmark(self, pattern: str, flags: int, inputs: List[str], timeout: float) -> Optional[float]:
+        """
+        测量正则在一组输入上的搜索耗时
+
+        Returns:
+            耗时(秒)，超时时返回 None
+        """
+        try:
+            return self._run("benchmark", (pattern, flags, inputs), timeout)
+        except RuleTimeoutError:
+            logger.warning(f"正则 {pattern!r} 在对抗性输入上超时")
+            return None
+
+    def shutdown(self) -> None:
+        """结束所有空闲子进程，之后需要时再按需创建"""
+        with self._lock:
+            self._closed = True
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.kill()
+
+
+# 创建全局正则执行保护实例
+regex_guard = RegexGuard(settings.RULE_GUARD_WORKERS)
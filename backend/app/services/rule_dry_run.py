@@ -0,0 +1,242 @@
+"""
+规则试运行 - 在全部已存储笔录上评估候选规则的影响范围
+
+笔录按主键分页从数据库读取，每页交给分段执行进程池评估，
+进程池只返回每篇笔录的匹配统计和少量示例，由调用方汇总为
+匹配次数分布、改动规模分布和示例差异。试运行不修改任何数据。
+"""
+
+import time
+from bisect import bisect_right
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+from sqlmodel import Session, select
+
+from app.core.database import engine
+from app.models.transcription import Transcription
+from app.services.regex_guard import RuleTimeoutError, regex_guard
+from app.services.rule_plan import CompiledRule
+from app.services.segment_executor import segment_executor
+
+
+# 每页读取的笔录数
+PAGE_SIZE = 200
+
+# 示例差异两侧保留的字符数
+SAMPLE_CONTEXT = 30
+
+# 单篇笔录最多提供的示例数
+SAMPLES_PER_DOCUMENT = 3
+
+# 分布统计的区间下界
+MATCH_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+CHANGE_SIZE_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000)
+
+# 每篇笔录的统计：(笔录ID, 匹配次数, 是否改变文本, 长度变化, 被匹配的字符数)；条件不满足时匹配次数为 None
+DocumentStats = Tuple[int, Optional[int], bool, int, int]
+
+
+def _document_samples(rule: CompiledRule, doc_id: int, text: str) -> List[Dict[str, Any]]:
+    """截取文本中前几处匹配替换前后的上下文"""
+    samples = []
+    template = rule.replacement
+    literal_template = "\\" not in template
+    for match in rule.pattern.finditer(text):
+        start, end = match.span()
+        replaced = template if literal_template else match.expand(template)
+        if replaced == match.group():
+            continue
+        prefix = text[max(0, start - SAMPLE_CONTEXT):start]
+        suffix = text[end:end + SAMPLE_CONTEXT]
+        samples.append({
+            "transcription_id": doc_id,
+            "position": start,
+            "before": prefix + match.group() + suffix,
+            "after": prefix + replaced + suffix
+        })
+        if len(samples) >= SAMPLES_PER_DOCUMENT:
+            break
+    return samples
+
+
+def _evaluate_document(rule: CompiledRule, text: str) -> Tuple[Optional[int], bool, int, int]:
+    if rule.conditions is not None and not rule.conditions.check(text):
+        return None, False, 0, 0
+    if rule.guarded:
+        _, matches = regex_guard.substitute(rule, text, track_spans=True, report_unchanged=True)
+    else:
+        _, matches = rule.substitute(text, track_spans=True, report_unchanged=True)
+    if not matches:
+        return 0, False, 0, 0
+    match = matches[0]
+    touched = sum(end - start for start, end in match.spans)
+    return match.count, match.changed, match.length_delta, touched
+
+
+def evaluate_page(
+    rule: CompiledRule,
+    documents: Sequence[Tuple[int, str]],
+    max_samples: int
+) -> Tuple[List[DocumentStats], List[Dict[str, Any]]]:
+    """
+    评估一页笔录（在进程池中执行）
+
+    Returns:
+        (每篇笔录的统计, 至多 max_samples 个示例差异)
+    """
+    stats = []
+    samples: List[Dict[str, Any]] = []
+    for doc_id, text in documents:
+        count, changed, delta, touched = _evaluate_document(rule, text)
+        stats.append((doc_id, count, changed, delta, touched))
+        if changed and len(samples) < max_samples:
+            samples.extend(_document_samples(rule, doc_id, text)[:max_samples - len(samples)])
+    return stats, samples
+
+
+def _histogram(values: Sequence[int], bounds: Sequence[int]) -> List[Dict[str, Any]]:
+    """按区间下界统计分布"""
+    counts = [0] * len(bounds)
+    for value in values:
+        counts[bisect_right(bounds, value) - 1] += 1
+
+    histogram = []
+    for index, low in enumerate(bounds):
+        high = bounds[index + 1] - 1 if index + 1 < len(bounds) else None
+        if high is None:
+            label = f"{low}+"
+        elif high == low:
+            label = str(low)
+        else:
+            label = f"{low}-{high}"
+        histogram.append({"range": label, "documents": counts[index]})
+    return histogram
+
+
+def _iter_pages(limit: Optional[int], page_size: int):
+    """按主键分页读取笔录原文，每页使用独立会话，不在内存中保留已处理的页"""
+    last_id = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        with Session(engine) as session:
+            statement = (
+                select(Transcription.id, Transcription.original_text)
+                .where(Transcription.id > last_id)
+                .order_by(Transcription.id)
+                .limit(size)
+            )
+            page = [(doc_id, text or "") for doc_id, text in session.exec(statement).all()]
+        if not page:
+            return
+        yield page
+        last_id = page[-1][0]
+        if remaining is not None:
+            remaining -= len(page)
+
+
+def dry_run_rule(
+    rule: CompiledRule,
+    limit: Optional[int] = None,
+    max_samples: int = 10,
+    page_size: int = PAGE_SIZE
+) -> Dict[str, Any]:
+    """
+    在已存储的笔录上试运行规则
+
+    Args:
+        rule: 编译后的候选规则
+        limit: 最多评估的笔录数，None 表示全部
+        max_samples: 返回的示例差异数量
+        page_size: 每页读取的笔录数
+
+    Returns:
+        汇总统计
+    """
+    started = time.perf_counter()
+    # 有回溯风险的规则在本进程中通过 regex_guard 带时限执行
+    use_pool = segment_executor.enabled and not rule.guarded
+    pending: Deque = deque()
+    max_pending = segment_executor.workers * 2
+
+    stats: List[DocumentStats] = []
+    samples: List[Dict[str, Any]] = []
+    timeouts = 0
+
+    def collect(result: Tuple[List[DocumentStats], List[Dict[str, Any]]]) -> None:
+        page_stats, page_samples = result
+        stats.extend(page_stats)
+        samples.extend(page_samples[:max_samples - len(samples)])
+
+    def evaluate_inline(page: List[Tuple[int, str]]) -> None:
+        nonlocal timeouts
+        # 逐篇评估，执行超时只跳过超时的笔录
+        for document in page:
+            try:
+                collect(evaluate_page(rule, [document], max_samples - len(samples)))
+            except RuleTimeoutError:
+                timeouts += 1
+
+    for page in _iter_pages(limit, page_size):
+        if not use_pool:
+            evaluate_inline(page)
+            continue
+        try:
+            pending.append((page, segment_executor.submit(evaluate_page, rule, page, max_samples)))
+            # 限制同时在途的页数，避免读取速度超过评估速度时占用大量内存
+            while len(pending) >= max_pending:
+                collect(pending.popleft()[1].result())
+        except Exception as e:
+            logger.warning(f"进程池评估失败，改为在当前进程中评估: {e}")
+            segment_executor.shutdown()
+            use_pool = False
+            for waiting_page, _ in pending:
+                evaluate_inline(waiting_page)
+            pending.clear()
+            evaluate_inline(page)
+
+    while pending:
+        waiting_page, future = pending.popleft()
+        try:
+            collect(future.result())
+        except Exception as e:
+            logger.warning(f"进程池评估失败，改为在当前进程中评估: {e}")
+            evaluate_inline(waiting_page)
+
+    return _summarize(rule, stats, samples, timeouts, time.perf_counter() - started)
+
+
+def _summarize(
+    rule: CompiledRule,
+    stats: List[DocumentStats],
+    samples: List[Dict[str, Any]],
+    timeouts: int,
+    elapsed: float
+) -> Dict[str, Any]:
+    evaluated = [item for item in stats if item[1] is not None]
+    matched = [item for item in evaluated if item[1]]
+    changed = [item for item in matched if item[2]]
+    top = sorted(matched, key=lambda item: item[1], reverse=True)[:10]
+
+    return {
+        "rule_name": rule.name,
+        "pattern": rule.pattern.pattern,
+        "documents": len(stats) + timeouts,
+        "skipped_by_conditions": len(stats) - len(evaluated),
+        "timeouts": timeouts,
+        "matched_documents": len(matched),
+        "changed_documents": len(changed),
+        "total_matches": sum(item[1] for item in matched),
+        "total_length_delta": sum(item[3] for item in changed),
+        "match_count_histogram": _histogram([item[1] for item in evaluated], MATCH_COUNT_BUCKETS),
+        "change_size_histogram": _histogram(
+            [item[4] if item[2] else 0 for item in evaluated], CHANGE_SIZE_BUCKETS
+        ),
+        "top_documents": [
+            {"transcription_id": item[0], "match_count": item[1], "length_delta": item[3]}
+            for item in top
+        ],
+        "samples": samples,
+        "elapsed_ms": elapsed * 1000
+    }
@@ -3,26 +3,125 @@
 """
 
 import re
+import time
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple, FrozenSet
 from loguru import logger
-from sqlmodel import Session, select
+from sqlmodel import Session, func, select
 
+from app.core.config import settings
 from app.core.database import engine
+from app.core.lru_cache import LRUCache
 from app.models.rule import Rule, RuleSet, RuleType, RuleScope
+from app.services.pattern_analysis import (
+    RISK_NESTED_QUANTIFIER, adversarial_inputs, backtracking_risks
+)
+from app.services.incremental_rules import incremental_cache
+from app.services.regex_guard import RuleTimeoutError, regex_guard
+from app.services.rule_plan import (
+    RULE_PATTERN_FLAGS, CompiledRule, RuleMatch, RulePlan, build_rule_plan, check_conditions,
+    compile_pattern, pattern_cache, rules_fingerprint, sort_rules, text_changed
+)
+from app.services.rule_profiler import rule_profiler
+from app.services.rule_stream import StreamingRuleApplier
+from app.services.segment_executor import segment_executor
+
+
+# 执行计划缓存容量
+PLAN_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True)
+class CachedRuleSet:
+    """缓存的数据库规则集"""
+    rule_set_id: int
+    version: str
+    updated_at: Optional[datetime]
+    rules_updated_at: Optional[datetime]
+    rule_ids: FrozenSet[int]
+    rules: Tuple[Dict[str, Any], ...]
+    fingerprint: str
+    loaded_at: float
+
+    @property
+    def stamp(self) -> str:
+        """规则集版本标识"""
+        updated = self.updated_at.isoformat() if self.updated_at else ""
+        return f"rule_set:{self.rule_set_id}:{self.version}:{updated}"
+
+    def matches(
+        self,
+        version: str,
+        updated_at: Optional[datetime],
+        rule_count: int,
+        rules_updated_at: Optional[datetime]
+    ) -> bool:
+        """与数据库当前的版本标识比较，判断缓存是否仍然有效"""
+        return (
+            self.version == version
+            and self.updated_at == updated_at
+            and len(self.rules) == rule_count
+            and self.rules_updated_at == rules_updated_at
+        )
 
 
 class RuleEngine:
     """规则引擎核心类"""
     
     def __init__(self):
-        self.compiled_patterns = {}  # 缓存编译的正则表达式
+        self._plan_cache = LRUCache(PLAN_CACHE_SIZE)  # 缓存规则执行计划
+        self._rule_set_cache = LRUCache(settings.RULE_SET_CACHE_SIZE)  # 缓存数据库规则集
+        self._executor: Optional[ThreadPoolExecutor] = None  # 长文本规则执行线程池
         
     async def apply_rules(
         self, 
         text: str, 
         rule_set_id: Optional[int] = None,
-        custom_rules: Optional[List[Dict[str, Any]]] = None
+        custom_rules: Optional[List[Dict[str, Any]]] = None,
+        collect_transformations: bool = True,
+        incremental: bool = False
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        应用规则集转换文本（异步接口）
+        
+        规则执行是纯 CPU 计算，短文本直接同步执行；超过
+        RULE_ENGINE_OFFLOAD_THRESHOLD 的长文本，以及包含需带时限执行
+        规则的计划，交给线程池执行，避免长时间占用事件循环。
+        参数与返回值同 apply_rules_sync。
+        """
+        try:
+            plan = self._prepare_plan(rule_set_id, custom_rules)
+        except Exception as e:
+            logger.error(f"规则应用失败: {str(e)}")
+            return text, {"error": str(e), "applied_rules": []}
+        
+        if plan is None:
+            return text, {"applied_rules": [], "transformations": []}
+        
+        try:
+            if len(text) < settings.RULE_ENGINE_OFFLOAD_THRESHOLD and not plan.guarded:
+                return self._execute_plan(text, plan, collect_transformations, incremental)
+            
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(),
+                partial(self._execute_plan, text, plan, collect_transformations, incremental)
+            )
+        except Exception as e:
+            logger.error(f"规则应用失败: {str(e)}")
+            return text, {"error": str(e), "applied_rules": []}
+    
+    def apply_rules_sync(
+        self, 
+        text: str, 
+        rule_set_id: Optional[int] = None,
+        custom_rules: Optional[List[Dict[str, Any]]] = None,
+        collect_transformations: bool = True,
+        incremental: bool = False
     ) -> Tuple[str, Dict[str, Any]]:
         """
         应用规则集转换文本
@@ -31,67 +130,247 @@ class RuleEngine:
             text: 待处理的文本
             rule_set_id: 规则集ID
             custom_rules: 自定义规则列表
+            collect_transformations: 是否收集每个规则的转换记录（批量处理时关闭）
+            incremental: 是否复用未修改部分之前的执行结果（反复修改同一笔录时开启）
             
         Returns:
             (转换后的文本, 应用信息)
         """
         try:
-            # 获取规则列表
-            rules = await self._get_rules(rule_set_id, custom_rules)
+            plan = self._prepare_plan(rule_set_id, custom_rules)
             
-            if not rules:
-                logger.warning("没有可用的规则")
+            if plan is None:
                 return text, {"applied_rules": [], "transformations": []}
             
-            # 按优先级和类型排序规则
-            sorted_rules = self._sort_rules(rules)
+            return self._execute_plan(text, plan, collect_transformations, incremental)
             
-            # 应用规则
-            result_text = text
-            applied_rules = []
-            transformations = []
+        except Exception as e:
+            logger.error(f"规则应用失败: {str(e)}")
+            return text, {"error": str(e), "applied_rules": []}
+    
+    def create_stream(
+        self,
+        rule_set_id: Optional[int] = None,
+        custom_rules: Optional[List[Dict[str, Any]]] = None,
+        window: Optional[int] = None,
+        low_latency: bool = False
+    ) -> StreamingRuleApplier:
+        """
+        创建流式规则执行器，规则选择同 apply_rules_sync
+        
+        没有可用规则时返回的执行器原样输出文本。window 为回看窗口，
+        默认 RULE_STREAM_WINDOW；low_latency 时行内规则也逐条流式执行，
+        不等待整行，适合逐词到达的 LLM 输出。
+        """
+        return StreamingRuleApplier(self._prepare_plan(rule_set_id, custom_rules), window, low_latency)
+    
+    async def apply_rules_stream(
+        self,
+        chunks: AsyncIterator[str],
+        rule_set_id: Optional[int] = None,
+        custom_rules: Optional[List[Dict[str, Any]]] = None
+    ) -> AsyncIterator[str]:
+        """
+        对分块到达的文本流式应用规则集，逐块产出转换后的文本
+        
+        需要应用信息时使用 create_stream 创建执行器，
+        消费完成后调用其 info()。
+        """
+        applier = self.create_stream(rule_set_id, custom_rules)
+        async for piece in applier.apply(chunks):
+            yield piece
+    
+    def _prepare_plan(
+        self,
+        rule_set_id: Optional[int] = None,
+        custom_rules: Optional[List[Dict[str, Any]]] = None
+    ) -> Optional[RulePlan]:
+        """获取规则列表对应的执行计划，没有可用规则时返回 None"""
+        rules, fingerprint = self._collect_rules(rule_set_id, custom_rules)
+        
+        if not rules:
+            logger.warning("没有可用的规则")
+            return None
+        
+        return self.get_plan(rules, fingerprint)
+    
+    def get_plan(
+        self,
+        rules: List[Dict[str, Any]],
+        fingerprint: Optional[str] = None
+    ) -> RulePlan:
+        """获取规则列表对应的执行计划，相同内容的规则复用已构建的计划"""
+        fingerprint = fingerprint or rules_fingerprint(rules)
+        plan = self._plan_cache.get(fingerprint)
+        if plan is None:
+            plan = build_rule_plan(rules, fingerprint)
+            self._plan_cache.set(fingerprint, plan)
+            logger.debug(f"已构建执行计划 {fingerprint[:8]}，包含 {len(plan)} 个规则")
+        return plan
+    
+    def _execute_plan(
+        self,
+        text: str,
+        plan: RulePlan,
+        collect_transformations: bool = True,
+        incremental: bool = False
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        按执行计划依次应用规则
+        
+        合并执行的字面量规则组、融合执行的正则规则组只有一次扫描，
+        组内规则的转换记录共用整个规则组的前后文本。
+        
+        不收集转换记录且文本超过 RULE_ENGINE_PARALLEL_THRESHOLD 时，
+        连续的行内步骤按行切分后在进程池中分段并行执行。
+        
+        增量执行时，连续的行内步骤按文本块执行并复用 incremental_cache
+        中未变化文本块的结果；这些步骤的转换记录共用整段步骤的前后文本，
+        不含匹配区间。应用信息的 incremental.changed_ranges 为原文中
+        此前未处理过的文本块区间。
+        
+        有回溯风险的规则在 regex_guard 子进程中执行，超过
+        RULE_EXECUTION_TIMEOUT 时跳过该规则，不影响其余规则。
+        
+        每个步骤的执行结果都会记录到 rule_profiler（使用统计始终记录，
+        耗时等执行指标仅在开启统计时记录）。
+        """
+        result_text = text
+        applied_rules = []
+        transformations = []
+        changed_ranges = incremental_cache.changed_ranges(text, plan) if incremental else []
+        word_counts: Dict[str, int] = {}
+        segment_counts: Dict[str, int] = {}
+        profiling = rule_profiler.enabled
+        parallel = (
+            not incremental
+            and not collect_transformations
+            and len(text) >= settings.RULE_ENGINE_PARALLEL_THRESHOLD
+            and segment_executor.enabled
+        )
+        
+        def record(before: str, after: str, matches: List[RuleMatch]) -> None:
+            nonlocal word_counts
+            changes = None
+            if collect_transformations:
+                changes = self._calculate_changes(before, after, word_counts)
+                # 只保留当前文本的词数，供下一步复用
+                word_counts = {after: word_counts[after]}
             
-            for rule in sorted_rules:
-                if not rule.get("is_active", True):
-                    continue
-                    
-                original_text = result_text
-                result_text, rule_applied = await self._apply_single_rule(
-                    result_text, rule
-                )
-                
-                if rule_applied:
-                    applied_rules.append({
-                        "rule_id": rule.get("id"),
-                        "rule_name": rule.get("name"),
-                        "rule_type": rule.get("rule_type")
+            for match in matches:
+                rule = match.rule
+                logger.debug(f"规则 '{rule.name}' 已应用")
+                applied_rules.append({**rule.applied_info(), "match_count": match.count})
+                if collect_transformations:
+                    transformations.append({
+                        "rule_name": rule.name,
+                        "before": before[:100] + "..." if len(before) > 100 else before,
+                        "after": after[:100] + "..." if len(after) > 100 else after,
+                        "match_count": match.count,
+                        "spans": [list(span) for span in match.spans or ()],
+                        "changes": changes
                     })
-                    
-                    if original_text != result_text:
-                        transformations.append({
-                            "rule_name": rule.get("name"),
-                            "before": original_text[:100] + "..." if len(original_text) > 100 else original_text,
-                            "after": result_text[:100] + "..." if len(result_text) > 100 else result_text,
-                            "changes": self._calculate_changes(original_text, result_text)
-                        })
+        
+        index = 0
+        while index < len(plan.steps):
+            if (incremental or parallel) and plan.line_local[index]:
+                end = segment_executor.local_run_end(plan, index)
+                started = time.perf_counter()
+                original_text = result_text
+                if incremental:
+                    run_result = incremental_cache.apply_steps(result_text, plan, index, end, segment_counts)
+                else:
+                    run_result = segment_executor.apply_steps(result_text, plan, index, end)
+                if run_result is not None:
+                    result_text, matches = run_result
+                    # 分段执行只有整体耗时，平均分摊到各步骤
+                    elapsed = (time.perf_counter() - started) / (end - index)
+                    for step in plan.steps[index:end]:
+                        rule_profiler.record_step(step, matches, elapsed)
+                    if matches:
+                        record(original_text, result_text, matches)
+                    index = end
+                    continue
+                # 文本无法切分，后续步骤不再尝试
+                parallel = False
             
-            return result_text, {
-                "applied_rules": applied_rules,
-                "transformations": transformations,
-                "total_rules_applied": len(applied_rules)
-            }
+            step = plan.steps[index]
+            index += 1
+            original_text = result_text
             
-        except Exception as e:
-            logger.error(f"规则应用失败: {str(e)}")
-            return text, {"error": str(e), "applied_rules": []}
+            run_step = step.apply
+            if isinstance(step, CompiledRule):
+                if step.conditions is not None:
+                    if not step.conditions.check(result_text):
+                        rule_profiler.record_skip(step)
+                        continue
+                    run_step = step.substitute
+                if step.guarded:
+                    run_step = partial(regex_guard.substitute, step)
+            
+            started = time.perf_counter() if profiling else None
+            try:
+                # 统计时也记录未改变文本的匹配次数
+                result_text, matches = run_step(result_text, collect_transformations, profiling)
+            except Exception as e:
+                logger.error(f"应用规则 '{step.name}' 时出错: {e}")
+                continue
+            rule_profiler.record_step(
+                step, matches, time.perf_counter() - started if profiling else None
+            )
+            
+            if profiling:
+                matches = [match for match in matches if match.changed]
+            if matches:
+                record(original_text, result_text, matches)
+        
+        info = {
+            "applied_rules": applied_rules,
+            "transformations": transformations,
+            "total_rules_applied": len(applied_rules)
+        }
+        if incremental:
+            info["incremental"] = {
+                "segments": segment_counts.get("segments", 0),
+                "recomputed_segments": segment_counts.get("recomputed", 0),
+                "changed_ranges": [list(span) for span in changed_ranges]
+            }
+        return result_text, info
     
-    async def _get_rules(
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取（必要时创建）规则执行线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.RULE_ENGINE_WORKERS,
+                thread_name_prefix="rule-engine"
+            )
+        return self._executor
+    
+    def shutdown(self) -> None:
+        """关闭规则执行线程池、分段执行进程池和正则执行保护子进程"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        segment_executor.shutdown()
+        regex_guard.shutdown()
+    
+    def _get_rules(
         self, 
         rule_set_id: Optional[int] = None,
         custom_rules: Optional[List[Dict[str, Any]]] = None
     ) -> List[Dict[str, Any]]:
         """获取规则列表"""
+        rules, _ = self._collect_rules(rule_set_id, custom_rules)
+        return rules
+    
+    def _collect_rules(
+        self,
+        rule_set_id: Optional[int] = None,
+        custom_rules: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """获取规则列表及其指纹（指纹未知时为 None）"""
         rules = []
+        fingerprint = None
         
         # 添加自定义规则
         if custom_rules:
@@ -99,34 +378,108 @@ class RuleEngine:
         
         # 从数据库获取规则集
         if rule_set_id:
-            with Session(engine) as session:
-                rule_set = session.get(RuleSet, rule_set_id)
-                if rule_set and rule_set.rules:
-                    # 获取规则集中的规则
-                    statement = select(Rule).where(Rule.id.in_(rule_set.rules))
-                    db_rules = session.exec(statement).all()
-                    
-                    for rule in db_rules:
-                        rules.append({
-                            "id": rule.id,
-                            "name": rule.name,
-                            "description": rule.description,
-                            "rule_type": rule.rule_type,
-                            "scope": rule.scope,
-                            "priority": rule.priority,
-                            "is_active": rule.is_active,
-                            "pattern": rule.pattern,
-                            "replacement": rule.replacement,
-                            "conditions": rule.conditions,
-                            "parameters": rule.parameters
-                        })
+            cached = self._load_rule_set(rule_set_id)
+            if cached:
+                rules.extend(cached.rules)
+                fingerprint = cached.fingerprint
+                if custom_rules:
+                    fingerprint = f"{rules_fingerprint(custom_rules)}:{fingerprint}"
         else:
             # 使用默认规则集
-            rules.extend(await self._get_default_rules())
+            rules.extend(self._get_default_rules())
         
-        return rules
+        return rules, fingerprint
+    
+    def _load_rule_set(self, rule_set_id: int) -> Optional[CachedRuleSet]:
+        """读取规则集，缓存按数据库中的 version/updated_at 校验后使用"""
+        with Session(engine) as session:
+            stamp = session.exec(
+                select(RuleSet.version, RuleSet.updated_at, RuleSet.rules)
+                .where(RuleSet.id == rule_set_id)
+            ).first()
+            if not stamp:
+                self._rule_set_cache.pop(rule_set_id)
+                return None
+            version, updated_at, rule_ids = stamp
+            rule_count, rules_updated_at = self._rules_stamp(session, rule_ids)
+            
+            cached = self._rule_set_cache.get(rule_set_id)
+            if cached is not None:
+                if (
+                    time.monotonic() - cached.loaded_at < settings.RULE_SET_CACHE_TTL
+                    and cached.matches(version, updated_at, rule_count, rules_updated_at)
+                ):
+                    return cached
+                self._rule_set_cache.pop(rule_set_id)
+            
+            rules = []
+            if rule_ids:
+                # 获取规则集中的规则
+                statement = select(Rule).where(Rule.id.in_(rule_ids))
+                db_rules = session.exec(statement).all()
+                
+                for rule in db_rules:
+                    rules.append({
+                        "id": rule.id,
+                        "name": rule.name,
+                        "description": rule.description,
+                        "rule_type": rule.rule_type,
+                        "scope": rule.scope,
+                        "priority": rule.priority,
+                        "is_active": rule.is_active,
+                        "pattern": rule.pattern,
+                        "replacement": rule.replacement,
+                        "conditions": rule.conditions,
+                        "parameters": rule.parameters
+                    })
+            
+            cached = CachedRuleSet(
+                rule_set_id=rule_set_id,
+                version=version,
+                updated_at=updated_at,
+                rules_updated_at=rules_updated_at,
+                rule_ids=frozenset(rule_ids or []),
+                rules=tuple(rules),
+                fingerprint=rules_fingerprint(rules),
+                loaded_at=time.monotonic()
+            )
+        
+        self._rule_set_cache.set(rule_set_id, cached)
+        logger.debug(f"已加载规则集 {cached.stamp}，包含 {len(cached.rules)} 个规则")
+        return cached
+    
+    def _rules_stamp(
+        self, session: Session, rule_ids: Optional[List[int]]
+    ) -> Tuple[int, Optional[datetime]]:
+        """规则集中现存规则的数量及最近更新时间，用于发现其他进程对规则的修改"""
+        if not rule_ids:
+            return 0, None
+        statement = select(func.count(Rule.id), func.max(Rule.updated_at)).where(
+            Rule.id.in_(rule_ids)
+        )
+        rule_count, rules_updated_at = session.exec(statement).one()
+        return rule_count, rules_updated_at
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """规则引擎各级缓存的统计信息"""
+        return {
+            "pattern_cache": pattern_cache.stats(),
+            "plan_cache": self._plan_cache.stats(),
+            "rule_set_cache": self._rule_set_cache.stats(),
+            "incremental_cache": incremental_cache.stats()
+        }
+    
+    def invalidate_rule_set(self, rule_set_id: int) -> None:
+        """规则集变更后使其缓存失效"""
+        self._rule_set_cache.pop(rule_set_id)
     
-    async def _get_default_rules(self) -> List[Dict[str, Any]]:
+    def invalidate_rule(self, rule_id: int) -> None:
+        """规则变更后使包含该规则的规则集缓存失效"""
+        for rule_set_id, cached in self._rule_set_cache.items():
+            if rule_id in cached.rule_ids:
+                self._rule_set_cache.pop(rule_set_id)
+    
+    def _get_default_rules(self) -> List[Dict[str, Any]]:
         """获取默认规则"""
         return [
             {
@@ -178,24 +531,9 @@ class RuleEngine:
     
     def _sort_rules(self, rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """按优先级和类型排序规则"""
-        # 规则类型优先级映射
-        type_priority = {
-            RuleType.PREPROCESSING: 1,
-            RuleType.DIALOGUE_STRUCTURE: 2,
-            RuleType.LANGUAGE_STYLE: 3,
-            RuleType.CONTENT_FILTER: 4,
-            RuleType.POSTPROCESSING: 5
-        }
-        
-        return sorted(
-            rules,
-            key=lambda x: (
-                type_priority.get(x.get("rule_type"), 99),
-                -x.get("priority", 0)  # 优先级高的排前面
-            )
-        )
+        return sort_rules(rules)
     
-    async def _apply_single_rule(
+    def _apply_single_rule(
         self, 
         text: str, 
         rule: Dict[str, Any]
@@ -213,88 +551,67 @@ class RuleEngine:
             if not self._check_conditions(text, conditions):
                 return text, False
             
-            # 编译和缓存正则表达式
-            rule_id = rule.get("id", "unknown")
-            if rule_id not in self.compiled_patterns:
-                try:
-                    self.compiled_patterns[rule_id] = re.compile(pattern, re.MULTILINE | re.UNICODE)
-                except re.error as e:
-                    logger.warning(f"规则 {rule.get('name')} 的正则表达式无效: {e}")
-                    return text, False
-            
-            compiled_pattern = self.compiled_patterns[rule_id]
-            
-            # 应用替换
-            original_text = text
-            result_text = compiled_pattern.sub(replacement, text)
+            # 编译正则表达式（按 pattern 缓存）
+            try:
+                compiled_pattern = compile_pattern(pattern)
+            except re.error as e:
+                logger.warning(f"规则 {rule.get('name')} 的正则表达式无效: {e}")
+                return text, False
             
-            # 检查是否有变化
-            rule_applied = original_text != result_text
+            # 应用替换，没有匹配时无需比较文本；有回溯风险的正则带时限执行
+            if backtracking_risks(pattern, RULE_PATTERN_FLAGS):
+                result_text, match_count = regex_guard.subn(
+                    pattern, compiled_pattern.flags, replacement, text
+                )
+            else:
+                result_text, match_count = compiled_pattern.subn(replacement, text)
+            rule_applied = match_count > 0 and text_changed(text, result_text)
             
             if rule_applied:
                 logger.debug(f"规则 '{rule.get('name')}' 已应用")
             
             return result_text, rule_applied
             
+        except RuleTimeoutError:
+            # 超时需要让调用方知道，不能当作规则未匹配
+            raise
         except Exception as e:
             logger.error(f"应用规则 '{rule.get('name')}' 时出错: {e}")
             return text, False
     
     def _check_conditions(self, text: str, conditions: Dict[str, Any]) -> bool:
         """检查规则执行条件"""
-        if not conditions:
-            return True
-        
-        try:
-            # 检查文本长度条件
-            if "min_length" in conditions:
-                if len(text) < conditions["min_length"]:
-                    return False
-            
-            if "max_length" in conditions:
-                if len(text) > conditions["max_length"]:
-                    return False
-            
-            # 检查包含关键词条件
-            if "contains" in conditions:
-                keywords = conditions["contains"]
-                if isinstance(keywords, str):
-                    keywords = [keywords]
-                if not any(keyword in text for keyword in keywords):
-                    return False
-            
-            # 检查排除关键词条件
-            if "excludes" in conditions:
-                keywords = conditions["excludes"]
-                if isinstance(keywords, str):
-                    keywords = [keywords]
-                if any(keyword in text for keyword in keywords):
-                    return False
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"检查条件时出错: {e}")
-            return False
+        return check_conditions(text, conditions)
     
-    def _calculate_changes(self, before: str, after: str) -> Dict[str, Any]:
-        """计算文本变化统计"""
+    def _calculate_changes(
+        self,
+        before: str,
+        after: str,
+        word_counts: Optional[Dict[str, int]] = None
+    ) -> Dict[str, Any]:
+        """计算文本变化统计，word_counts 用于在连续调用间复用已统计的词数"""
+        if word_counts is None:
+            word_counts = {}
+        for item in (before, after):
+            if item not in word_counts:
+                word_counts[item] = len(item.split())
+        
         return {
             "length_before": len(before),
             "length_after": len(after),
             "length_change": len(after) - len(before),
-            "word_count_before": len(before.split()),
-            "word_count_after": len(after.split()),
+            "word_count_before": word_counts[before],
+            "word_count_after": word_counts[after],
         }
     
-    async def test_rule(
+    def test_rule(
         self, 
         text: str, 
         rule: Dict[str, Any]
     ) -> Dict[str, Any]:
         """测试单个规则"""
         try:
-            result_text, applied = await self._apply_single_rule(text, rule)
+            result_text, applied = self._apply_single_rule(text, rule)
             
             return {
                 "success": True,
@@ -310,9 +627,16 @@ class RuleEngine:
                 "original_text": text
             }
     
-    async def validate_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
-        """验证规则有效性"""
+    def validate_rule(self, rule: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        验证规则有效性
+        
+        除字段检查外，还会静态检查正则的回溯风险，并在
+        RULE_VALIDATION_BUDGET 时限内用对抗性输入实际执行一次：
+        嵌套量词或对抗性输入超时视为无效，其余风险作为警告返回。
+        """
         issues = []
+        warnings = []
         
         # 检查必需字段
         if not rule.get("name"):
@@ -328,6 +652,8 @@ class RuleEngine:
                 re.compile(pattern)
             except re.error as e:
                 issues.append(f"正则表达式无效: {e}")
+            else:
+                self._check_backtracking(pattern, issues, warnings)
         
         # 检查优先级
         priority = rule.get("priority", 5)
@@ -336,8 +662,29 @@ class RuleEngine:
         
         return {
             "valid": len(issues) == 0,
-            "issues": issues
+            "issues": issues,
+            "warnings": warnings
         }
+    
+    def _check_backtracking(self, pattern: str, issues: List[str], warnings: List[str]) -> None:
+        """检查正则的回溯风险，结果追加到 issues / warnings"""
+        for kind, message in backtracking_risks(pattern, RULE_PATTERN_FLAGS):
+            if kind == RISK_NESTED_QUANTIFIER:
+                issues.append(message)
+            else:
+                warnings.append(message)
+        
+        budget = settings.RULE_VALIDATION_BUDGET
+        try:
+            elapsed = regex_guard.benchmark(
+                pattern, RULE_PATTERN_FLAGS, adversarial_inputs(pattern, RULE_PATTERN_FLAGS), budget
+            )
+        except Exception as e:
+            warnings.append(f"无法完成对抗性输入测试: {e}")
+            return
+        
+        if elapsed is None:
+            issues.append(f"正则在对抗性输入上执行超过 {budget} 秒，存在灾难性回溯")
 
 
 # 创建全局规则引擎实例
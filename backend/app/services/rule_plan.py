@@ -0,0 +1,645 @@
+"""
+规则执行计划 - 将规则列表预编译为可复用的不可变执行计划
+
+执行计划在构建时完成排序、正则编译、条件解析等准备工作，
+同一规则集的后续请求可直接复用，避免每次调用重复这些开销。
+"""
+
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Pattern, Tuple, Union
+from loguru import logger
+
+from app.core.config import settings
+from app.core.lru_cache import LRUCache
+from app.models.rule import RuleType
+from app.services.literal_matcher import build_literal_pattern, extract_literals, is_run_pattern
+from app.services.pattern_analysis import (
+    PatternProfile, analyze_pattern, backtracking_risks, template_literal
+)
+
+
+# 规则类型执行顺序
+RULE_TYPE_ORDER = {
+    RuleType.PREPROCESSING: 1,
+    RuleType.DIALOGUE_STRUCTURE: 2,
+    RuleType.LANGUAGE_STYLE: 3,
+    RuleType.CONTENT_FILTER: 4,
+    RuleType.POSTPROCESSING: 5
+}
+
+# 规则正则统一使用的编译标志
+RULE_PATTERN_FLAGS = re.MULTILINE | re.UNICODE
+
+# 编译后的正则缓存，以 (pattern, flags) 为键，规则修改 pattern 后自然失效
+pattern_cache = LRUCache(settings.PATTERN_CACHE_SIZE)
+
+
+def compile_pattern(pattern: str, flags: int = RULE_PATTERN_FLAGS) -> Pattern:
+    """编译正则表达式并缓存，无效时抛出 re.error"""
+    key = (pattern, flags)
+    compiled = pattern_cache.get(key)
+    if compiled is None:
+        compiled = re.compile(pattern, flags)
+        pattern_cache.set(key, compiled)
+    return compiled
+
+
+def sort_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按规则类型和优先级排序规则"""
+    return sorted(
+        rules,
+        key=lambda x: (
+            RULE_TYPE_ORDER.get(x.get("rule_type"), 99),
+            -x.get("priority", 0)  # 优先级高的排前面
+        )
+    )
+
+
+def check_conditions(text: str, conditions: Dict[str, Any]) -> bool:
+    """检查规则执行条件（未预解析的原始条件）"""
+    if not conditions:
+        return True
+
+    try:
+        # 检查文本长度条件
+        if "min_length" in conditions:
+            if len(text) < conditions["min_length"]:
+                return False
+
+        if "max_length" in conditions:
+            if len(text) > conditions["max_length"]:
+                return False
+
+        # 检查包含关键词条件
+        if "contains" in conditions:
+            keywords = conditions["contains"]
+            if isinstance(keywords, str):
+                keywords = [keywords]
+            if not any(keyword in text for keyword in keywords):
+                return False
+
+        # 检查排除关键词条件
+        if "excludes" in conditions:
+            keywords = conditions["excludes"]
+            if isinstance(keywords, str):
+                keywords = [keywords]
+            if any(keyword in text for keyword in keywords):
+                return False
+
+        return True
+
+    except Exception as e:
+        logger.error(f"检查条件时出错: {e}")
+        return False
+
+
+def _parse_keywords(value: Any) -> Optional[Tuple[str, ...]]:
+    """将关键词条件解析为字符串元组，格式不合法时返回 None"""
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, (list, tuple)) and all(isinstance(k, str) for k in value):
+        return tuple(value)
+    return None
+
+
+@dataclass(frozen=True)
+class CompiledConditions:
+    """预解析的规则执行条件"""
+    min_length: Optional[float] = None
+    max_length: Optional[float] = None
+    contains: Optional[Tuple[str, ...]] = None
+    excludes: Optional[Tuple[str, ...]] = None
+    # 无法预解析的原始条件，执行时回退到 check_conditions
+    raw: Optional[Any] = None
+
+    @classmethod
+    def parse(cls, conditions: Any) -> Optional["CompiledConditions"]:
+        """解析条件，没有条件时返回 None"""
+        if not conditions:
+            return None
+
+        if not isinstance(conditions, dict):
+            return cls(raw=conditions)
+
+        fields: Dict[str, Any] = {}
+        for key in ("min_length", "max_length"):
+            if key in conditions:
+                value = conditions[key]
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    return cls(raw=conditions)
+                fields[key] = value
+
+        for key in ("contains", "excludes"):
+            if key in conditions:
+                keywords = _parse_keywords(conditions[key])
+                if keywords is None:
+                    return cls(raw=conditions)
+                fields[key] = keywords
+
+        if not fields:
+            # 只包含引擎不识别的条件键，与原逻辑一致视为无条件
+            return None
+
+        return cls(**fields)
+
+    def check(self, text: str) -> bool:
+        """检查文本是否满足条件"""
+        if self.raw is not None:
+            return check_conditions(text, self.raw)
+
+        if self.min_length is not None and len(text) < self.min_length:
+            return False
+        if self.max_length is not None and len(text) > self.max_length:
+            return False
+        if self.contains is not None and not any(k in text for k in self.contains):
+            return False
+        if self.excludes is not None and any(k in text for k in self.excludes):
+            return False
+        return True
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """预编译的单条规则"""
+    rule_id: Any
+    name: Optional[str]
+    rule_type: Any
+    pattern: Pattern
+    replacement: str
+    conditions: Optional[CompiledConditions] = None
+    # 纯字面量规则展开后的字面量，可与相邻字面量规则合并执行
+    literals: Optional[Tuple[str, ...]] = None
+    # 正则静态特征，用于判断能否与相邻规则融合执行
+    profile: Optional[PatternProfile] = None
+    # 正则存在灾难性回溯风险，需在子进程中带时限执行
+    guarded: bool = False
+
+    def applied_info(self) -> Dict[str, Any]:
+        """规则应用记录"""
+        return {
+            "rule_id": self.rule_id,
+            "rule_name": self.name,
+            "rule_type": self.rule_type
+        }
+
+    def apply(
+        self,
+        text: str,
+        track_spans: bool = False,
+        report_unchanged: bool = False
+    ) -> Tuple[str, Tuple["RuleMatch", ...]]:
+        """
+        应用规则，返回新文本及产生了变化的规则的匹配结果
+
+        report_unchanged 为 True 时，有匹配但未改变文本的规则也会返回，
+        其 changed 为 False。
+        """
+        if self.conditions is not None and not self.conditions.check(text):
+            return text, ()
+        return self.substitute(text, track_spans, report_unchanged)
+
+    def substitute(
+        self,
+        text: str,
+        track_spans: bool = False,
+        report_unchanged: bool = False
+    ) -> Tuple[str, Tuple["RuleMatch", ...]]:
+        """不检查执行条件直接替换，参数与返回值同 apply"""
+        spans = [] if track_spans else None
+        if track_spans:
+            template = self.replacement
+            literal_template = "\\" not in template
+
+            def replace(match) -> str:
+                spans.append(match.span())
+                return template if literal_template else match.expand(template)
+
+            result, count = self.pattern.subn(replace, text)
+        else:
+            result, count = self.pattern.subn(self.replacement, text)
+
+        if not count:
+            return text, ()
+        if not text_changed(text, result):
+            if report_unchanged:
+                return text, (RuleMatch(self, count, _freeze_spans(spans), changed=False),)
+            return text, ()
+        return result, (RuleMatch(self, count, _freeze_spans(spans), length_delta=len(result) - len(text)),)
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    """规则在一个执行步骤中的匹配结果"""
+    rule: CompiledRule
+    # 匹配次数
+    count: int
+    # 各匹配在该步骤输入文本中的字符区间，未收集时为 None
+    spans: Optional[Tuple[Tuple[int, int], ...]] = None
+    # 是否改变了文本
+    changed: bool = True
+    # 规则造成的文本长度变化
+    length_delta: int = 0
+
+
+def text_changed(before: str, after: str) -> bool:
+    """判断替换是否改变了文本，长度不同时无需逐字比较"""
+    return len(before) != len(after) or before != after
+
+
+def _freeze_spans(spans: Optional[List[Tuple[int, int]]]) -> Optional[Tuple[Tuple[int, int], ...]]:
+    return tuple(spans) if spans is not None else None
+
+
+def _group_matches(
+    rules: Tuple[CompiledRule, ...],
+    changed: List[bool],
+    counts: List[int],
+    deltas: List[int],
+    spans: Optional[List[List[Tuple[int, int]]]],
+    report_unchanged: bool = False
+) -> Tuple[RuleMatch, ...]:
+    """汇总规则组内产生了变化（或 report_unchanged 时有匹配）的规则的匹配结果"""
+    return tuple(
+        RuleMatch(
+            rule,
+            counts[index],
+            _freeze_spans(spans[index]) if spans is not None else None,
+            changed=changed[index],
+            length_delta=deltas[index]
+        )
+        for index, rule in enumerate(rules)
+        if changed[index] or (report_unchanged and counts[index])
+    )
+
+
+@dataclass(frozen=True)
+class LiteralGroup:
+    """合并执行的一组相邻字面量规则，一次扫描完成全部替换"""
+    rules: Tuple[CompiledRule, ...]
+    pattern: Pattern
+    # 字面量 -> (规则下标, 替换文本)
+    table: Dict[str, Tuple[int, str]]
+    # 各规则是否由 (a|b)+ 形式展开，其相邻的字面量匹配计为原规则的一次匹配
+    runs: Tuple[bool, ...] = ()
+
+    @property
+    def name(self) -> str:
+        return "、".join(str(rule.name) for rule in self.rules)
+
+    def apply(
+        self,
+        text: str,
+        track_spans: bool = False,
+        report_unchanged: bool = False
+    ) -> Tuple[str, Tuple[RuleMatch, ...]]:
+        """应用规则组，参数与返回值同 CompiledRule.apply"""
+        table = self.table
+        runs = self.runs
+        track_runs = any(runs)
+        changed = [False] * len(self.rules)
+        counts = [0] * len(self.rules)
+        spans = [[] for _ in self.rules] if track_spans else None
+        # 各规则累计造成的长度变化，以及 (a|b)+ 规则上次匹配在其所见文本中的结束位置
+        deltas = [0] * len(self.rules)
+        run_ends: List[Optional[int]] = [None] * len(self.rules)
+
+        def replace(match) -> str:
+            literal = match.group()
+            index, replacement = table[literal]
+            continues_run = False
+            if track_runs and runs[index]:
+                # 换算到逐条执行时该规则看到的文本中的位置
+                start = match.start() + sum(deltas[:index])
+                continues_run = run_ends[index] == start
+                run_ends[index] = start + len(literal)
+            deltas[index] += len(replacement) - len(literal)
+            if continues_run:
+                if spans is not None:
+                    spans[index][-1] = (spans[index][-1][0], match.end())
+            else:
+                counts[index] += 1
+                if spans is not None:
+                    spans[index].append(match.span())
+            if replacement != literal:
+                changed[index] = True
+            return replacement
+
+        result, count = self.pattern.subn(replace, text)
+        if not count:
+            return text, ()
+        return result, _group_matches(self.rules, changed, counts, deltas, spans, report_unchanged)
+
+
+@dataclass(frozen=True)
+class FusedGroup:
+    """融合为一个命名分组选择的同类型相邻正则规则，一次扫描完成全部替换"""
+    rules: Tuple[CompiledRule, ...]
+    pattern: Pattern
+    # 命名分组 -> 规则下标
+    group_index: Dict[str, int]
+
+    @property
+    def name(self) -> str:
+        return "、".join(str(rule.name) for rule in self.rules)
+
+    def apply(
+        self,
+        text: str,
+        track_spans: bool = False,
+        report_unchanged: bool = False
+    ) -> Tuple[str, Tuple[RuleMatch, ...]]:
+        """应用融合规则，参数与返回值同 CompiledRule.apply"""
+        rules = self.rules
+        group_index = self.group_index
+        changed = [False] * len(rules)
+        counts = [0] * len(rules)
+        deltas = [0] * len(rules)
+        spans = [[] for _ in rules] if track_spans else None
+
+        def replace(match) -> str:
+            index = group_index[match.lastgroup]
+            rule = rules[index]
+            matched = match.group()
+            counts[index] += 1
+            if spans is not None:
+                spans[index].append(match.span())
+            if "\\" in rule.replacement:
+                # 模板含分组引用，用规则自身的正则重新匹配以展开模板
+                replacement = rule.pattern.fullmatch(matched).expand(rule.replacement)
+            else:
+                replacement = rule.replacement
+            deltas[index] += len(replacement) - len(matched)
+            if replacement != matched:
+                changed[index] = True
+            return replacement
+
+        result, count = self.pattern.subn(replace, text)
+        if not count:
+            return text, ()
+        return result, _group_matches(rules, changed, counts, deltas, spans, report_unchanged)
+
+
+PlanStep = Union[CompiledRule, LiteralGroup, FusedGroup]
+
+
+@dataclass(frozen=True)
+class RulePlan:
+    """不可变的规则执行计划"""
+    fingerprint: str
+    rules: Tuple[CompiledRule, ...]
+    # 实际执行步骤，相邻的字面量规则被合并为 LiteralGroup，
+    # 相邻的同类型正则规则被融合为 FusedGroup
+    steps: Tuple[PlanStep, ...] = ()
+    # 各执行步骤是否只作用于行内，可按行切分后分段执行
+    line_local: Tuple[bool, ...] = ()
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    @property
+    def guarded(self) -> bool:
+        """计划中是否有需要带时限执行的规则"""
+        return any(rule.guarded for rule in self.rules)
+
+
+def step_rules(step: PlanStep) -> Tuple[CompiledRule, ...]:
+    """执行步骤包含的规则"""
+    if isinstance(step, CompiledRule):
+        return (step,)
+    return step.rules
+
+
+def is_line_local(step: PlanStep) -> bool:
+    """执行步骤的每条规则都无执行条件、无需带时限执行且匹配只依赖所在行"""
+    return all(
+        rule.conditions is None and not rule.guarded
+        and rule.profile is not None and rule.profile.line_local
+        for rule in step_rules(step)
+    )
+
+
+def rules_fingerprint(rules: List[Dict[str, Any]]) -> str:
+    """计算规则列表的内容指纹，用于复用执行计划"""
+    payload = json.dumps(rules, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def compile_rule(rule: Dict[str, Any]) -> Optional[CompiledRule]:
+    """编译单条规则，规则无效时返回 None"""
+    pattern = rule.get("pattern")
+    if not pattern:
+        return None
+
+    replacement = rule.get("replacement", "")
+    if not isinstance(replacement, str):
+        logger.warning(f"规则 {rule.get('name')} 的替换模板无效，已跳过")
+        return None
+
+    try:
+        compiled_pattern = compile_pattern(pattern)
+        # 提前解析替换模板，无效的分组引用在构建阶段即可发现
+        compiled_pattern.sub(replacement, "")
+    except (re.error, TypeError) as e:
+        logger.warning(f"规则 {rule.get('name')} 的正则表达式无效: {e}")
+        return None
+
+    return CompiledRule(
+        rule_id=rule.get("id"),
+        name=rule.get("name"),
+        rule_type=rule.get("rule_type"),
+        pattern=compiled_pattern,
+        replacement=replacement,
+        conditions=CompiledConditions.parse(rule.get("conditions", {})),
+        literals=extract_literals(pattern, replacement, RULE_PATTERN_FLAGS),
+        profile=analyze_pattern(pattern, RULE_PATTERN_FLAGS),
+        guarded=bool(backtracking_risks(pattern, RULE_PATTERN_FLAGS))
+    )
+
+
+def _chars(strings: Iterable[str]) -> FrozenSet[str]:
+    return frozenset("".join(strings))
+
+
+def _can_merge_literal(group: List[CompiledRule], rule: CompiledRule) -> bool:
+    """
+    判断字面量规则能否并入当前规则组而不改变逐条执行的结果
+
+    要求：各规则字面量的字符集互不相交（匹配不会重叠），
+    前序规则的替换文本不含后续规则的字符（替换不会产生新匹配），
+    前序规则为删除时后续字面量只能是单字符（删除不会拼接出新匹配）。
+    """
+    if rule.literals is None or rule.conditions is not None:
+        return False
+
+    rule_chars = _chars(rule.literals)
+    for member in group:
+        if _chars(member.literals) & rule_chars:
+            return False
+        if _chars([member.replacement]) & rule_chars:
+            return False
+        if member.replacement == "" and any(len(lit) > 1 for lit in rule.literals):
+            return False
+    return True
+
+
+def _build_literal_group(group: List[CompiledRule]) -> LiteralGroup:
+    """将多条字面量规则编译为一次扫描的规则组"""
+    table: Dict[str, Tuple[int, str]] = {}
+    ordered_literals = []
+    for index, rule in enumerate(group):
+        for literal in rule.literals:
+            if literal not in table:
+                table[literal] = (index, rule.replacement)
+                ordered_literals.append(literal)
+
+    return LiteralGroup(
+        rules=tuple(group),
+        pattern=re.compile(build_literal_pattern(ordered_literals), RULE_PATTERN_FLAGS),
+        table=table,
+        runs=tuple(is_run_pattern(rule.pattern.pattern, RULE_PATTERN_FLAGS) for rule in group)
+    )
+
+
+def _fusable(rule: CompiledRule) -> bool:
+    """规则本身是否满足融合前提：无条件、无回溯风险、匹配与上下文无关、不匹配空串、字符集可知"""
+    profile = rule.profile
+    return (
+        rule.conditions is None
+        and not rule.guarded
+        and profile is not None
+        and profile.context_free
+        and profile.min_width > 0
+        and profile.chars is not None
+        and template_literal(rule.replacement) is not None
+    )
+
+
+def _can_fuse(group: List[CompiledRule], rule: CompiledRule) -> bool:
+    """
+    判断正则规则能否融合进当前规则组而不改变逐条执行的结果
+
+    与字面量合并的条件相同：规则类型一致，各规则可匹配的字符集互不相交，
+    前序规则的输出不含后续规则的字符，前序规则输出可能为空时
+    后续规则只能匹配单个字符。
+    """
+    if not _fusable(rule) or group[0].rule_type != rule.rule_type:
+        return False
+
+    rule_chars = rule.profile.chars
+    for member in group:
+        if member.profile.chars & rule_chars:
+            return False
+        literal_output = template_literal(member.replacement)
+        if _chars([literal_output]) & rule_chars:
+            return False
+        if literal_output == "" and rule.profile.max_width != 1:
+            return False
+    return True
+
+
+def _build_fused_group(group: List[CompiledRule]) -> Optional[FusedGroup]:
+    """将多条正则规则融合为一个命名分组选择，无法编译时返回 None"""
+    group_index = {}
+    alternatives = []
+    for index, rule in enumerate(group):
+        group_name = f"_fused_{index}"
+        group_index[group_name] = index
+        alternatives.append(f"(?P<{group_name}>{rule.pattern.pattern})")
+
+    try:
+        pattern = re.compile("|".join(alternatives), RULE_PATTERN_FLAGS)
+    except re.error:
+        # 规则间命名分组重名、内联全局标志等情况
+        return None
+
+    return FusedGroup(rules=tuple(group), pattern=pattern, group_index=group_index)
+
+
+def _fuse_steps(steps: Tuple[PlanStep, ...]) -> Tuple[PlanStep, ...]:
+    """将相邻的同类型正则规则融合为 FusedGroup"""
+    fused: List[PlanStep] = []
+    group: List[CompiledRule] = []
+
+    def close_group():
+        fused_group = _build_fused_group(group) if len(group) > 1 else None
+        if fused_group is not None:
+            fused.append(fused_group)
+        else:
+            fused.extend(group)
+        group.clear()
+
+    for step in steps:
+        if isinstance(step, CompiledRule):
+            if group and _can_fuse(group, step):
+                group.append(step)
+                continue
+            close_group()
+            if _fusable(step):
+                group.append(step)
+                continue
+        else:
+            close_group()
+        fused.append(step)
+    close_group()
+
+    return tuple(fused)
+
+
+def plan_steps(rules: List[CompiledRule]) -> Tuple[PlanStep, ...]:
+    """将排好序的规则合并为执行步骤"""
+    steps: List[PlanStep] = []
+    group: List[CompiledRule] = []
+
+    def close_group():
+        if len(group) > 1:
+            steps.append(_build_literal_group(group))
+        else:
+            steps.extend(group)
+        group.clear()
+
+    for rule in rules:
+        if group and _can_merge_literal(group, rule):
+            group.append(rule)
+            continue
+        close_group()
+        if rule.literals is not None and rule.conditions is None:
+            group.append(rule)
+        else:
+            steps.append(rule)
+    close_group()
+
+    return _fuse_steps(tuple(steps))
+
+
+def build_rule_plan(
+    rules: List[Dict[str, Any]],
+    fingerprint: Optional[str] = None
+) -> RulePlan:
+    """
+    构建规则执行计划
+
+    Args:
+        rules: 规则字典列表
+        fingerprint: 已知的规则指纹，为空时根据内容计算
+
+    Returns:
+        排序、编译完成的执行计划
+    """
+    compiled_rules = []
+    for rule in sort_rules(rules):
+        if not rule.get("is_active", True):
+            continue
+        compiled = compile_rule(rule)
+        if compiled is not None:
+            compiled_rules.append(compiled)
+
+    steps = plan_steps(compiled_rules)
+    return RulePlan(
+        fingerprint=fingerprint or rules_fingerprint(rules),
+        rules=tuple(compiled_rules),
+        steps=steps,
+        line_local=tuple(is_line_local(step) for step in steps)
+    )
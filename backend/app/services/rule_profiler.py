@@ -0,0 +1,231 @@
+"""
+规则执行统计 - 记录每条规则的耗时、匹配次数、条件跳过次数等指标
+
+执行指标按时间桶聚合，只保留最近 RULE_PROFILE_WINDOW 秒的数据，
+用于定位耗时异常的规则。规则使用次数与命中率在内存中累积，
+定期批量写回 Rule.usage_count / Rule.success_rate。
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.database import engine
+from app.models.rule import Rule
+from app.services.rule_plan import CompiledRule, PlanStep, RuleMatch, step_rules
+
+
+# 时间桶长度(秒)
+BUCKET_SECONDS = 10
+
+# 报告支持的排序字段
+SORT_FIELDS = ("total_time", "max_time", "calls", "applied", "skipped", "matches", "chars_changed")
+
+
+@dataclass
+class RuleStats:
+    """单条规则在一个时间桶内的执行统计"""
+    calls: int = 0  # 执行次数（不含条件跳过）
+    applied: int = 0  # 改变了文本的次数
+    skipped: int = 0  # 因执行条件不满足而跳过的次数
+    matches: int = 0  # 匹配次数
+    chars_changed: int = 0  # 文本长度变化的绝对值之和
+    total_time: float = 0.0  # 累计耗时(秒)
+    max_time: float = 0.0  # 单次最大耗时(秒)
+
+    def merge(self, other: "RuleStats") -> None:
+        self.calls += other.calls
+        self.applied += other.applied
+        self.skipped += other.skipped
+        self.matches += other.matches
+        self.chars_changed += other.chars_changed
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+
+
+class RuleProfiler:
+    """规则执行统计收集器"""
+
+    def __init__(self, enabled: bool = False, window_seconds: int = 600):
+        self.enabled = enabled
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        # 规则ID -> {时间桶: 统计}
+        self._buckets: Dict[Any, "OrderedDict[int, RuleStats]"] = {}
+        self._names: Dict[Any, Optional[str]] = {}
+        # 待写回数据库的使用统计：规则ID -> [执行次数, 命中次数]
+        self._pending_usage: Dict[int, List[int]] = {}
+
+    def record_step(
+        self,
+        step: PlanStep,
+        matches: Iterable[RuleMatch],
+        elapsed: Optional[float] = None
+    ) -> None:
+        """
+        记录一个执行步骤中各规则的执行结果
+
+        合并执行的规则组只有整体耗时，平均分摊到组内各规则。
+        """
+        rules = step_rules(step)
+        by_rule = {id(match.rule): match for match in matches}
+        share = elapsed / len(rules) if elapsed is not None else None
+
+        with self._lock:
+            for rule in rules:
+                match = by_rule.get(id(rule))
+                applied = match is not None and match.changed
+                self._add_usage(rule, applied)
+                if self.enabled:
+                    stats = self._current_stats(rule)
+                    stats.calls += 1
+                    stats.applied += applied
+                    if match is not None:
+                        stats.matches += match.count
+                        stats.chars_changed += abs(match.length_delta)
+                    if share is not None:
+                        stats.total_time += share
+                        stats.max_time = max(stats.max_time, share)
+
+    def record_skip(self, rule: CompiledRule) -> None:
+        """记录规则因执行条件不满足被跳过"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._current_stats(rule).skipped += 1
+
+    def _add_usage(self, rule: CompiledRule, applied: bool) -> None:
+        # 只有数据库中的规则（整数ID）需要写回
+        if isinstance(rule.rule_id, int) and not isinstance(rule.rule_id, bool):
+            usage = self._pending_usage.setdefault(rule.rule_id, [0, 0])
+            usage[0] += 1
+            usage[1] += applied
+
+    def _current_stats(self, rule: CompiledRule) -> RuleStats:
+        bucket = int(time.time() // BUCKET_SECONDS)
+        buckets = self._buckets.setdefault(rule.rule_id, OrderedDict())
+        self._names[rule.rule_id] = rule.name
+        self._prune(buckets, bucket)
+        stats = buckets.get(bucket)
+        if stats is None:
+            stats = buckets[bucket] = RuleStats()
+        return stats
+
+    def _prune(self, buckets: "OrderedDict[int, RuleStats]", current: int) -> None:
+        oldest = current - self.window_seconds // BUCKET_SECONDS
+        while buckets and next(iter(buckets)) < oldest:
+            buckets.popitem(last=False)
+
+    def report(self, top: Optional[int] = None, sort_by: str = "total_time") -> Dict[str, Any]:
+        """
+        汇总时间窗口内的规则执行统计
+
+        Args:
+            top: 只返回排序靠前的规则数量
+            sort_by: 排序字段，见 SORT_FIELDS
+        """
+        if sort_by not in SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort_by}")
+
+        current = int(time.time() // BUCKET_SECONDS)
+        rows = []
+        with self._lock:
+            for rule_id in list(self._buckets):
+                buckets = self._buckets[rule_id]
+                self._prune(buckets, current)
+                if not buckets:
+                    del self._buckets[rule_id]
+                    self._names.pop(rule_id, None)
+                    continue
+
+                total = RuleStats()
+                for stats in buckets.values():
+                    total.merge(stats)
+                rows.append((rule_id, self._names.get(rule_id), total))
+
+        rows.sort(key=lambda row: getattr(row[2], sort_by), reverse=True)
+        if top is not None:
+            rows = rows[:top]
+
+        return {
+            "enabled": self.enabled,
+            "window_seconds": self.window_seconds,
+            "rules": [self._format_row(rule_id, name, stats) for rule_id, name, stats in rows]
+        }
+
+    def _format_row(self, rule_id: Any, name: Optional[str], stats: RuleStats) -> Dict[str, Any]:
+        row = {"rule_id": rule_id, "rule_name": name}
+        row.update(asdict(stats))
+        row["total_time_ms"] = row.pop("total_time") * 1000
+        row["max_time_ms"] = row.pop("max_time") * 1000
+        row["avg_time_ms"] = row["total_time_ms"] / stats.calls if stats.calls else 0.0
+        return row
+
+    def pending_usage(self) -> Dict[int, Tuple[int, int]]:
+        """尚未写回数据库的使用统计"""
+        with self._lock:
+            return {rule_id: tuple(usage) for rule_id, usage in self._pending_usage.items()}
+
+    def flush_usage(self) -> int:
+        """
+        将累积的规则使用统计批量写回数据库
+
+        Returns:
+            更新的规则数量
+        """
+        with self._lock:
+            pending, self._pending_usage = self._pending_usage, {}
+        if not pending:
+            return 0
+
+        try:
+            with Session(engine) as session:
+                statement = select(Rule).where(Rule.id.in_(list(pending)))
+                db_rules = session.exec(statement).all()
+                for rule in db_rules:
+                    calls, applied = pending[rule.id]
+                    previous = rule.usage_count or 0
+                    if rule.success_rate is None or not previous:
+                        rule.success_rate = applied / calls
+                    else:
+                        rule.success_rate = (rule.success_rate * previous + applied) / (previous + calls)
+                    rule.usage_count = previous + calls
+                    session.add(rule)
+                session.commit()
+        except Exception as e:
+            logger.error(f"写回规则使用统计失败: {e}")
+            # 写入失败时放回，下次重试
+            with self._lock:
+                for rule_id, (calls, applied) in pending.items():
+                    usage = self._pending_usage.setdefault(rule_id, [0, 0])
+                    usage[0] += calls
+                    usage[1] += applied
+            return 0
+
+        logger.debug(f"已写回 {len(db_rules)} 条规则的使用统计")
+        return len(db_rules)
+
+    async def run_periodic_flush(self, interval: int) -> None:
+        """定期写回使用统计，随应用生命周期运行"""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.flush_usage)
+
+    def reset(self) -> None:
+        """清空执行统计（不影响待写回的使用统计）"""
+        with self._lock:
+            self._buckets.clear()
+            self._names.clear()
+
+
+# 创建全局规则执行统计实例
+rule_profiler = RuleProfiler(
+    enabled=settings.RULE_PROFILING_ENABLED,
+    window_seconds=settings.RULE_PROFILE_WINDOW
+)
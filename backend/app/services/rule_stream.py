@@ -0,0 +1,294 @@
+"""
+流式规则执行 - 对分块到达的文本逐块应用规则
+
+执行计划被拆成若干串联的阶段，每个阶段只保留有限的未处理文本：
+- 连续的行内步骤组成一个阶段，在完整的行上执行（与分段并行执行相同）；
+  低延迟模式下，规则都能流式执行的行内步骤改为逐条流式替换，不等待整行；
+- 其余规则逐条流式替换，保留足以覆盖一次匹配的回看窗口，
+  只输出结果已经确定的部分；
+- 有执行条件（依赖全文）、有回溯风险、含前后查看或全文锚点、
+  可匹配空串的规则无法流式执行，该阶段缓存全部输入，结束时整体执行。
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+from loguru import logger
+
+from app.core.config import settings
+from app.services.regex_guard import RuleTimeoutError, regex_guard
+from app.services.rule_plan import CompiledRule, PlanStep, RuleMatch, RulePlan, step_rules
+from app.services.rule_profiler import rule_profiler
+
+
+def is_streamable(rule: CompiledRule) -> bool:
+    """规则能否在有限回看窗口内流式执行"""
+    profile = rule.profile
+    return (
+        rule.conditions is None
+        and not rule.guarded
+        and profile is not None
+        and profile.min_width > 0
+        and not profile.has_lookaround
+        and not profile.has_text_anchors
+    )
+
+
+class _MatchStats:
+    """规则在各分块上的匹配结果汇总"""
+
+    def __init__(self):
+        self.count = 0
+        self.changed = False
+        self.length_delta = 0
+
+    def add(self, count: int, changed: bool, length_delta: int) -> None:
+        self.count += count
+        self.changed = self.changed or changed
+        self.length_delta += length_delta
+
+
+class _LineStage:
+    """连续的行内步骤：在完整的行上执行"""
+
+    def __init__(self, steps: Sequence[PlanStep], min_size: int):
+        self.steps = tuple(steps)
+        self.min_size = min_size
+        self.buffer = ""
+        self.stats: Dict[int, _MatchStats] = {}
+
+    def feed(self, text: str, final: bool = False) -> str:
+        self.buffer += text
+        if final:
+            cut = len(self.buffer)
+        elif len(self.buffer) < self.min_size:
+            return ""
+        else:
+            cut = self.buffer.rfind("\n") + 1
+
+        segment, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        if not segment:
+            return ""
+        for step in self.steps:
+            # 未改变本块的匹配也要计数，汇总后才与整段执行的匹配次数一致
+            segment, matches = step.apply(segment, report_unchanged=True)
+            for match in matches:
+                stats = self.stats.setdefault(id(match.rule), _MatchStats())
+                stats.add(match.count, match.changed, match.length_delta)
+        return segment
+
+
+class _RuleStage:
+    """
+    单条规则的流式替换
+
+    匹配宽度不超过 holdback - 1 时，起点距缓冲区末尾至少 holdback 的匹配
+    不会因后续文本而改变，可以确定输出；无宽度上界的规则按窗口大小近似。
+    缓冲区保留一个已处理字符，供 ^、\\b 等锚点判断前一字符。
+    """
+
+    def __init__(self, rule: CompiledRule, window: int):
+        max_width = rule.profile.max_width
+        self.rule = rule
+        self.window = window
+        self.holdback = min(max_width if max_width is not None else window, window) + 1
+        self.template = rule.replacement
+        self.literal_template = "\\" not in rule.replacement
+        self.buffer = ""
+        self.pos = 0
+        self.stats = _MatchStats()
+
+    def feed(self, text: str, final: bool = False) -> str:
+        buffer = self.buffer + text
+        end = len(buffer)
+        limit = end - self.holdback
+        pos = self.pos
+        output = []
+        safe = end if final else limit
+
+        for match in self.rule.pattern.finditer(buffer, pos):
+            start, stop = match.span()
+            # 匹配可能随后续文本延伸（结束于缓冲区末尾）时等待更多文本
+            if not final and (start > limit or (stop == end and stop - start < self.window)):
+                safe = min(start, limit)
+                break
+            matched = match.group()
+            replaced = self.template if self.literal_template else match.expand(self.template)
+            self.stats.add(1, replaced != matched, len(replaced) - len(matched))
+            output.append(buffer[pos:start])
+            output.append(replaced)
+            pos = stop
+
+        if safe > pos:
+            output.append(buffer[pos:safe])
+            pos = safe
+
+        keep = min(pos, 1)
+        self.buffer = buffer[pos - keep:]
+        self.pos = keep
+        return "".join(output)
+
+
+class _BufferStage:
+    """无法流式执行的规则：缓存全部输入，结束时整体执行"""
+
+    def __init__(self, rule: CompiledRule):
+        self.rule = rule
+        self.parts: List[str] = []
+        self.stats = _MatchStats()
+        self.skipped = False
+
+    def feed(self, text: str, final: bool = False) -> str:
+        if text:
+            self.parts.append(text)
+        if not final:
+            return ""
+
+        text = "".join(self.parts)
+        self.parts = []
+        rule = self.rule
+        if rule.conditions is not None and not rule.conditions.check(text):
+            self.skipped = True
+            return text
+        try:
+            if rule.guarded:
+                result, matches = regex_guard.substitute(rule, text, report_unchanged=True)
+            else:
+                result, matches = rule.substitute(text, report_unchanged=True)
+        except (RuleTimeoutError, RuntimeError) as e:
+            logger.error(f"应用规则 '{rule.name}' 时出错: {e}")
+            return text
+        for match in matches:
+            self.stats.add(match.count, match.changed, match.length_delta)
+        return result
+
+
+_Stage = Union[_LineStage, _RuleStage, _BufferStage]
+
+
+class StreamingRuleApplier:
+    """
+    对分块输入流式应用执行计划
+
+    依次调用 feed 输入文本块、finish 结束输入，各次返回值拼接后
+    与对完整文本执行计划的结果相同（无宽度上界的规则，匹配长度
+    超过回看窗口时除外）。
+    """
+
+    def __init__(self, plan: Optional[RulePlan], window: Optional[int] = None, low_latency: bool = False):
+        self.plan = plan
+        self.window = window or settings.RULE_STREAM_WINDOW
+        self.low_latency = low_latency
+        self.stages: List[_Stage] = self._build_stages(plan) if plan is not None else []
+        self.finished = False
+
+    def _build_stages(self, plan: RulePlan) -> List[_Stage]:
+        stages: List[_Stage] = []
+        local_steps: List[PlanStep] = []
+        for step, line_local in zip(plan.steps, plan.line_local):
+            if line_local and not (self.low_latency and all(is_streamable(rule) for rule in step_rules(step))):
+                local_steps.append(step)
+                continue
+            if local_steps:
+                stages.append(_LineStage(local_steps, self.window))
+                local_steps = []
+            # 合并执行的规则组拆成单条规则，与逐条执行结果相同
+            for rule in step_rules(step):
+                stages.append(_RuleStage(rule, self.window) if is_streamable(rule) else _BufferStage(rule))
+        if local_steps:
+            stages.append(_LineStage(local_steps, self.window))
+
+        if any(isinstance(stage, _BufferStage) for stage in stages):
+            logger.debug("执行计划包含无法流式执行的规则，相应阶段将缓存全部输入")
+        return stages
+
+    @property
+    def buffered(self) -> bool:
+        """是否有阶段需要缓存全部输入（内存占用随输入增长）"""
+        return any(isinstance(stage, _BufferStage) for stage in self.stages)
+
+    def feed(self, chunk: str) -> str:
+        """输入一块文本，返回已确定的输出"""
+        if self.finished:
+            raise RuntimeError("流式执行已结束")
+        text = chunk
+        for stage in self.stages:
+            if not text:
+                break
+            text = stage.feed(text)
+        return text
+
+    def finish(self) -> str:
+        """结束输入，返回剩余输出并记录规则使用统计"""
+        if self.finished:
+            return ""
+        self.finished = True
+        text = ""
+        for stage in self.stages:
+            text = stage.feed(text, final=True)
+        self._record_usage()
+        return text
+
+    async def apply(self, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        逐块消费异步文本流并产出转换后的文本块
+
+        较大的文本块以及包含需带时限执行规则的计划在线程中处理，
+        避免占用事件循环。
+        """
+        offload = self.plan is not None and self.plan.guarded
+        async for chunk in chunks:
+            if offload or len(chunk) >= settings.RULE_ENGINE_OFFLOAD_THRESHOLD:
+                piece = await asyncio.to_thread(self.feed, chunk)
+            else:
+                piece = self.feed(chunk)
+            if piece:
+                yield piece
+
+        tail = await asyncio.to_thread(self.finish) if offload or self.buffered else self.finish()
+        if tail:
+            yield tail
+
+    def _rule_stats(self) -> Dict[int, Union[_MatchStats, None]]:
+        """规则对象ID -> 匹配汇总；因执行条件跳过的规则为 None"""
+        stats: Dict[int, Union[_MatchStats, None]] = {}
+        for stage in self.stages:
+            if isinstance(stage, _LineStage):
+                stats.update(stage.stats)
+            elif isinstance(stage, _BufferStage) and stage.skipped:
+                stats[id(stage.rule)] = None
+            else:
+                stats[id(stage.rule)] = stage.stats
+        return stats
+
+    def _record_usage(self) -> None:
+        if self.plan is None:
+            return
+        stats = self._rule_stats()
+        for rule in self.plan.rules:
+            if id(rule) in stats and stats[id(rule)] is None:
+                rule_profiler.record_skip(rule)
+                continue
+            rule_profiler.record_step(rule, self._matches(stats, (rule,)))
+
+    def _matches(self, stats: Dict[int, Any], rules: Sequence[CompiledRule]) -> List[RuleMatch]:
+        matches = []
+        for rule in rules:
+            rule_stats = stats.get(id(rule))
+            if rule_stats is not None and rule_stats.count:
+                matches.append(RuleMatch(
+                    rule, rule_stats.count, changed=rule_stats.changed, length_delta=rule_stats.length_delta
+                ))
+        return matches
+
+    def info(self) -> Dict[str, Any]:
+        """应用信息，格式同 apply_rules（不收集转换记录）"""
+        applied_rules = []
+        if self.plan is not None:
+            for match in self._matches(self._rule_stats(), self.plan.rules):
+                if match.changed:
+                    applied_rules.append({**match.rule.applied_info(), "match_count": match.count})
+        return {
+            "applied_rules": applied_rules,
+            "transformations": [],
+            "total_rules_applied": len(applied_rules)
+        }
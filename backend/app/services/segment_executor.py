@@ -0,0 +1,167 @@
+"""
+分段并行执行 - 将长文本按行切分后在进程池中并行应用行内规则
+
+只作用于行内的规则（匹配不跨行、不依赖行外内容、无执行条件）
+在切分后的各段上独立执行，拼接结果与整段执行完全相同。
+切分位置优先选择空行和对话轮次开头。
+"""
+
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from loguru import logger
+
+from app.core.config import settings
+from app.services.rule_plan import PlanStep, RuleMatch, RulePlan, step_rules
+
+
+# 优先的切分位置：空行、对话轮次开头（问：、答：、M：、1： 等）
+TURN_BOUNDARY = re.compile(r"\n(?=\n|问：|答：|访谈者：|被访者：|[A-Za-z0-9]{1,3}：)")
+
+# 单个分段的最小长度，过小的分段进程间传输开销大于收益
+MIN_SEGMENT_SIZE = 2000
+
+
+def split_segments(text: str, parts: int, min_size: int = MIN_SEGMENT_SIZE) -> List[str]:
+    """
+    将文本在行边界切分为约 parts 段
+
+    每段（最后一段除外）都以换行符结尾，拼接后与原文相同。
+    """
+    size = max(len(text) // max(parts, 1), min_size)
+    segments = []
+    start = 0
+    while len(text) - start > size:
+        target = start + size
+        match = TURN_BOUNDARY.search(text, target, target + size // 4)
+        cut = match.start() if match else text.find("\n", target)
+        if cut < 0:
+            break
+        segments.append(text[start:cut + 1])
+        start = cut + 1
+    segments.append(text[start:])
+    return segments
+
+
+def apply_segment_steps(
+    steps: Sequence[PlanStep],
+    segment: str
+) -> Tuple[str, List[Tuple[int, int, int, bool, int]]]:
+    """
+    在工作进程中对一个分段依次执行步骤
+
+    Returns:
+        (结果文本, [(步骤序号, 规则在步骤中的序号, 匹配次数, 是否改变文本, 长度变化)])
+    """
+    matches = []
+    for position, step in enumerate(steps):
+        # 未改变本段的匹配也要计数，汇总后才与整段执行的匹配次数一致
+        segment, step_matches = step.apply(segment, report_unchanged=True)
+        rules = step_rules(step)
+        for match in step_matches:
+            index = next(i for i, rule in enumerate(rules) if rule is match.rule)
+            matches.append((position, index, match.count, match.changed, match.length_delta))
+    return segment, matches
+
+
+def merge_segment_matches(
+    steps: Sequence[PlanStep],
+    results: Sequence[Tuple[str, List[Tuple[int, int, int, bool, int]]]]
+) -> List[RuleMatch]:
+    """汇总各分段的匹配次数，保持与顺序执行相同的规则顺序，只返回改变了文本的规则"""
+    counts = {}
+    deltas = {}
+    changed = set()
+    for _, segment_matches in results:
+        for position, index, count, rule_changed, delta in segment_matches:
+            key = (position, index)
+            counts[key] = counts.get(key, 0) + count
+            deltas[key] = deltas.get(key, 0) + delta
+            if rule_changed:
+                changed.add(key)
+
+    return [
+        RuleMatch(step_rules(steps[key[0]])[key[1]], counts[key], length_delta=deltas[key])
+        for key in sorted(changed)
+    ]
+
+
+class SegmentExecutor:
+    """管理分段执行进程池"""
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self) -> int:
+        return settings.RULE_ENGINE_PROCESSES or os.cpu_count() or 1
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # 服务进程中有多个线程，使用 spawn 避免 fork 带来的锁状态问题
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """在进程池中执行任意可序列化的函数"""
+        return self._get_pool().submit(fn, *args)
+
+    def local_run_end(self, plan: RulePlan, start: int) -> int:
+        """从 start 开始连续的行内步骤的结束位置"""
+        end = start
+        while end < len(plan.steps) and plan.line_local[end]:
+            end += 1
+        return end
+
+    def apply_steps(
+        self,
+        text: str,
+        plan: RulePlan,
+        start: int,
+        end: int
+    ) -> Optional[Tuple[str, List[RuleMatch]]]:
+        """
+        分段并行执行 plan.steps[start:end]
+
+        Returns:
+            (结果文本, 产生了变化的规则的匹配结果)；文本无法切分或
+            进程池不可用时返回 None，由调用方顺序执行
+        """
+        segments = split_segments(text, self.workers)
+        if len(segments) < 2:
+            return None
+
+        steps = plan.steps[start:end]
+        try:
+            pool = self._get_pool()
+            futures = [pool.submit(apply_segment_steps, steps, segment) for segment in segments]
+            results = [future.result() for future in futures]
+        except Exception as e:
+            logger.warning(f"分段并行执行失败，改为顺序执行: {e}")
+            self.shutdown()
+            return None
+
+        return "".join(segment for segment, _ in results), merge_segment_matches(steps, results)
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# 创建全局分段执行器实例
+segment_executor = SegmentExecutor()
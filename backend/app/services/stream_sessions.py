@@ -0,0 +1,184 @@
+"""
+可续传的 SSE 流式会话
+
+v2 流式协议的每个事件带有 "会话ID:序号" 形式的事件ID。会话的事件由后台任务
+生成并保存在内存中，客户端断开不影响生成；客户端重连时带上最后收到的事件ID
+（Last-Event-ID），从下一个事件继续接收。会话结束后保留一段时间供续传。
+
+内存占用有两级上限：每个会话缓存的事件超过 max_bytes 时丢弃最早的事件
+（已丢弃部分不能再续传），同时保留的会话数达到 max_sessions 时先淘汰
+最早结束的会话，仍无空位时拒绝新会话。
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+from loguru import logger
+
+from app.core.config import settings
+
+
+class StreamSessionLimitError(RuntimeError):
+    """进行中的流式会话数达到上限"""
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """解析 "会话ID:序号" 形式的事件ID，格式不符时返回 None"""
+    if not value:
+        return None
+    session_id, _, seq = value.strip().rpartition(":")
+    if not session_id or not seq.isdigit():
+        return None
+    return session_id, int(seq)
+
+
+def _format_event(event_type: str, data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event_type}\ndata: {payload}\n\n"
+
+
+class StreamSession:
+    """一次流式转换的事件缓存"""
+
+    def __init__(
+        self,
+        session_id: str,
+        events: AsyncIterator[Tuple[str, Dict[str, Any]]],
+        max_bytes: int = 2 * 1024 * 1024
+    ):
+        self.id = session_id
+        self.max_bytes = max_bytes
+        # 缓存的事件及其总字节数，events[0] 的序号为 first_seq
+        self.events: Deque[str] = deque()
+        self.size = 0
+        self.first_seq = 1
+        self.count = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self._condition = asyncio.Condition()
+        self._task = asyncio.create_task(self._run(events))
+
+    async def _run(self, events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> None:
+        try:
+            async for event_type, data in events:
+                await self._append(event_type, data)
+        except Exception as e:
+            logger.error(f"流式会话 {self.id} 失败: {e}")
+            await self._append("error", {"success": False, "error": str(e), "message": "转换过程出现错误"})
+        finally:
+            self.done = True
+            self.finished_at = time.monotonic()
+            async with self._condition:
+                self._condition.notify_all()
+
+    async def _append(self, event_type: str, data: Dict[str, Any]) -> None:
+        self.count += 1
+        event = _format_event(event_type, data, f"{self.id}:{self.count}")
+        self.events.append(event)
+        self.size += len(event.encode("utf-8"))
+        # 超出上限时丢弃最早的事件，至少保留最新的一个
+        while self.size > self.max_bytes and len(self.events) > 1:
+            self.size -= len(self.events.popleft().encode("utf-8"))
+            self.first_seq += 1
+        async with self._condition:
+            self._condition.notify_all()
+
+    def can_replay(self, after: int = 0) -> bool:
+        """序号 after 之后的事件是否都还在缓存中"""
+        return max(0, after) >= self.first_seq - 1
+
+    async def replay(self, after: int = 0) -> AsyncIterator[str]:
+        """
+        产出序号大于 after 的事件，会话未结束时等待新事件
+
+        读取过慢、所需事件已被丢弃时发送 error 事件后结束。每个事件
+        发送前都重新检查：读取方在 yield 处暂停期间，后台任务可能已经
+        丢弃了后续事件。
+        """
+        seq = max(0, after)
+        while True:
+            while seq < self.count:
+                if not self.can_replay(seq):
+                    logger.warning(f"流式会话 {self.id} 的事件 {seq + 1} 已被丢弃，无法继续发送")
+                    yield _format_event("error", {
+                        "success": False,
+                        "error": "stream_buffer_overflow",
+                        "message": "缓存的转换事件已被丢弃，请重新发起转换"
+                    })
+                    return
+                yield self.events[seq - self.first_seq + 1]
+                seq += 1
+            if self.done:
+                return
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.count > seq or self.done)
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+
+class StreamSessionRegistry:
+    """流式会话登记，结束超过 ttl 秒的会话在下次访问时清理"""
+
+    def __init__(self, ttl: float = 300.0, max_sessions: int = 100, max_bytes: int = 2 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: Dict[str, StreamSession] = {}
+
+    def start(self, events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> StreamSession:
+        """
+        在后台开始生成事件，返回新会话
+
+        Raises:
+            StreamSessionLimitError: 进行中的会话数已达 max_sessions
+        """
+        self._expire()
+        if len(self._sessions) >= self.max_sessions:
+            self._evict_finished()
+        if len(self._sessions) >= self.max_sessions:
+            raise StreamSessionLimitError(f"进行中的流式会话已达上限 ({self.max_sessions})")
+        session = StreamSession(uuid.uuid4().hex, events, self.max_bytes)
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[StreamSession]:
+        self._expire()
+        return self._sessions.get(session_id)
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if session.done and session.finished_at < deadline
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+    def _evict_finished(self) -> None:
+        """会话数达到上限时，淘汰已结束的会话腾出空位（最早结束的先淘汰）"""
+        finished = sorted(
+            (session for session in self._sessions.values() if session.done),
+            key=lambda session: session.finished_at
+        )
+        for session in finished[:len(self._sessions) - self.max_sessions + 1]:
+            del self._sessions[session.id]
+
+    def close(self) -> None:
+        """取消所有未结束的会话"""
+        for session in self._sessions.values():
+            if not session.done:
+                session.cancel()
+        self._sessions.clear()
+
+
+# 创建全局流式会话登记实例
+stream_sessions = StreamSessionRegistry(
+    ttl=settings.LLM_SSE_SESSION_TTL,
+    max_sessions=settings.LLM_SSE_MAX_SESSIONS,
+    max_bytes=settings.LLM_SSE_SESSION_MAX_BYTES
+)
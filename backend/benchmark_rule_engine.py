@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+规则引擎基准测试脚本
+使用 训练数据/ 与 测试数据/ 中的笔录（及其放大版本）测量规则引擎性能：
+吞吐量（字符/秒）、单条规则耗时和内存分配
+
+用法:
+    python benchmark_rule_engine.py
+    python benchmark_rule_engine.py --scales 1,4,16 --rounds 5 --output result.json
+    python benchmark_rule_engine.py --batch
+    python benchmark_rule_engine.py --baseline result.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from app.core.init_db import SAMPLE_RULES
+from app.services.rule_engine import RuleEngine
+from app.services.rule_plan import RulePlan
+
+# 项目根目录下的笔录数据
+DATA_DIRS = ["训练数据", "测试数据"]
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_corpus() -> Dict[str, str]:
+    """读取原始笔录（不含 *_转换后.txt）"""
+    corpus = {}
+    for dir_name in DATA_DIRS:
+        for path in sorted((PROJECT_ROOT / dir_name).glob("*.txt")):
+            if path.stem.endswith("转换后"):
+                continue
+            corpus[path.stem] = path.read_text(encoding="utf-8")
+    return corpus
+
+
+def scale_text(text: str, factor: int) -> str:
+    """将文本重复 factor 次构造放大的合成笔录"""
+    return "\n\n".join([text] * factor)
+
+
+def sample_rules() -> List[Dict[str, Any]]:
+    """init_db 示例规则，补充数据库分配的 id"""
+    return [dict(rule, id=f"sample_{index}") for index, rule in enumerate(SAMPLE_RULES, 1)]
+
+
+def rule_sets(engine: RuleEngine) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    参与测试的规则集
+
+    每个规则集单独构建执行计划：通过 apply_rules 传入自定义规则时
+    会追加默认规则，测得的将是两者之和。
+    """
+    return {
+        "default": engine._get_default_rules(),
+        "sample": sample_rules(),
+    }
+
+
+def measure_throughput(
+    engine: RuleEngine,
+    text: str,
+    plan: RulePlan,
+    rounds: int,
+    collect_transformations: bool
+) -> Dict[str, float]:
+    """多轮执行规则集的执行计划，返回耗时统计"""
+    # 预热：编译正则
+    engine._execute_plan(text, plan, collect_transformations)
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        engine._execute_plan(text, plan, collect_transformations)
+        timings.append(time.perf_counter() - start)
+
+    median = statistics.median(timings)
+    return {
+        "chars": len(text),
+        "median_ms": median * 1000,
+        "min_ms": min(timings) * 1000,
+        "chars_per_sec": len(text) / median if median else 0.0,
+    }
+
+
+def measure_allocations(engine: RuleEngine, text: str, plan: RulePlan) -> Dict[str, int]:
+    """测量一次规则应用的内存分配"""
+    engine._execute_plan(text, plan)
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        engine._execute_plan(text, plan)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"peak_bytes": peak - before, "retained_bytes": after - before}
+
+
+def measure_rules(engine: RuleEngine, text: str, plan: RulePlan, rounds: int) -> List[Dict[str, Any]]:
+    """按执行顺序逐条测量规则耗时"""
+    results = []
+    current = text
+    for rule in plan.rules:
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            result, matches = rule.apply(current)
+            timings.append(time.perf_counter() - start)
+        results.append({
+            "rule_id": rule.rule_id,
+            "rule_name": rule.name,
+            "median_ms": statistics.median(timings) * 1000,
+            "match_count": sum(match.count for match in matches),
+        })
+        current = result
+    return results
+
+
+def run_benchmark(
+    scales: List[int],
+    rounds: int,
+    collect_transformations: bool = True
+) -> Dict[str, Any]:
+    """运行全部基准测试"""
+    engine = RuleEngine()
+    corpus = load_corpus()
+    if not corpus:
+        raise SystemExit(f"未找到笔录数据: {', '.join(DATA_DIRS)}")
+
+    results: Dict[str, Any] = {"rule_sets": {}, "throughput": {}, "rules": {}}
+    combined = "\n\n".join(corpus.values())
+
+    for set_name, rules in rule_sets(engine).items():
+        plan = engine.get_plan(rules)
+        results["rule_sets"][set_name] = {"rule_count": len(plan.rules), "step_count": len(plan.steps)}
+        print(f"\n📊 规则集: {set_name}（{len(plan.rules)} 条规则，{len(plan.steps)} 个执行步骤）")
+
+        for name, text in corpus.items():
+            key = f"{set_name}/{name}"
+            stats = measure_throughput(engine, text, plan, rounds, collect_transformations)
+            results["throughput"][key] = stats
+            print(f"  {name:<28} {stats['chars']:>8} 字符  "
+                  f"{stats['median_ms']:>8.2f} ms  {stats['chars_per_sec'] / 1e6:>7.2f} M字符/秒")
+
+        for factor in scales:
+            key = f"{set_name}/合成x{factor}"
+            text = scale_text(combined, factor)
+            stats = measure_throughput(engine, text, plan, rounds, collect_transformations)
+            stats.update(measure_allocations(engine, text, plan))
+            results["throughput"][key] = stats
+            print(f"  {'合成x' + str(factor):<28} {stats['chars']:>8} 字符  "
+                  f"{stats['median_ms']:>8.2f} ms  {stats['chars_per_sec'] / 1e6:>7.2f} M字符/秒  "
+                  f"峰值内存 {stats['peak_bytes'] / 1024:.0f} KB")
+
+        rule_stats = measure_rules(engine, combined, plan, rounds)
+        results["rules"][set_name] = rule_stats
+        print("  单条规则耗时（合并语料）:")
+        for item in sorted(rule_stats, key=lambda x: x["median_ms"], reverse=True):
+            print(f"    {str(item['rule_name']):<20} {item['median_ms']:>8.3f} ms  "
+                  f"匹配 {item['match_count']}")
+
+    engine.shutdown()
+    return results
+
+
+def compare_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """与基线结果比较吞吐量，返回退化项"""
+    regressions = []
+    for key, stats in results["throughput"].items():
+        base = baseline.get("throughput", {}).get(key)
+        if not base or not base.get("chars_per_sec"):
+            continue
+        ratio = stats["chars_per_sec"] / base["chars_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append(f"{key}: 吞吐量下降 {(1 - ratio) * 100:.1f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="规则引擎基准测试")
+    parser.add_argument("--scales", default="1,4,16", help="合成笔录放大倍数，逗号分隔")
+    parser.add_argument("--rounds", type=int, default=5, help="每项测量的执行轮数")
+    parser.add_argument("--batch", action="store_true", help="不收集转换记录（批量处理模式）")
+    parser.add_argument("--output", help="将结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的吞吐量下降比例")
+    args = parser.parse_args()
+
+    # 基准测试时关闭规则引擎的调试日志
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    scales = [int(factor) for factor in args.scales.split(",") if factor]
+    print("🚀 规则引擎基准测试")
+    results = run_benchmark(scales, args.rounds, not args.batch)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n💾 结果已保存到 {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ 发现性能退化:")
+            for item in regressions:
+                print(f"  - {item}")
+            sys.exit(1)
+        print("\n✅ 未发现性能退化")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+对话类型分类器测试
+将单次扫描的 ConversationClassifier 与原先逐个关键词查找的实现逐项对照，
+覆盖典型笔录、关键词重叠与包含、重复关键词、同分与大小写等情况
+"""
+
+import random
+
+from app.services.prompt_templates import (
+    ConversationClassifier, ConversationType, PromptTemplateManager
+)
+
+
+manager = PromptTemplateManager()
+
+
+def legacy_detect(detectors, text: str) -> ConversationType:
+    """原先的实现：逐个类型、逐个关键词在小写文本中查找"""
+    text_lower = text.lower()
+    type_scores = {}
+
+    for conv_type, keywords in detectors.items():
+        score = 0
+        for keyword in keywords:
+            if keyword in text_lower:
+                if conv_type == ConversationType.EMOTIONAL and keyword in ['感受', '情绪', '心情', '影响', '变化']:
+                    score += 2
+                elif conv_type == ConversationType.CONSULTATION and keyword in ['建议', '帮助', '指导', '解决']:
+                    score += 2
+                elif conv_type == ConversationType.CASUAL and keyword in ['昨天', '今天', '电影', '朋友']:
+                    score += 2
+                else:
+                    score += 1
+
+        if score > 0:
+            type_scores[conv_type] = score
+
+    if not type_scores:
+        return ConversationType.GENERAL
+
+    return max(type_scores.items(), key=lambda x: x[1])[0]
+
+
+def legacy_scores(detectors, weights, text: str):
+    """原先的计分方式推广到任意关键词表与权重"""
+    text_lower = text.lower()
+    scores = {}
+    for conv_type, keywords in detectors.items():
+        score = sum(weights.get(conv_type, {}).get(keyword, 1) for keyword in keywords if keyword in text_lower)
+        if score > 0:
+            scores[conv_type] = score
+    return scores
+
+
+CASES = [
+    # (说明, 文本)
+    ("空文本", ""),
+    ("无关键词", "问：你好。\n答：你好，很高兴见到你。"),
+    ("访谈", "问：请介绍一下你的工作经历和教育背景。\n答：我毕业于某学校计算机专业，在公司做过几个项目。"),
+    ("会议", "今天的会议主要讨论项目进度，大家决定下周提交方案，并安排议题。"),
+    ("咨询", "问：我有个问题想咨询一下，能给点建议吗？\n答：可以，我推荐你先解决最困惑的部分。"),
+    ("情感", "最近心情不好，压力很大，很焦虑，这些变化对我影响很大。"),
+    ("日常", "昨天和朋友去看了电影，周末打算和家人去旅行，天气不错。"),
+    ("加权关键词决定胜负", "心情\n公司 学校 专业"),
+    ("同分按类型顺序", "项目"),
+    ("访谈与会议同分", "项目 会议 经验"),
+    ("咨询重复列出的关键词计两次", "建议 感受"),
+    ("重复出现只计一次", "会议会议会议会议 帮助"),
+    ("相邻关键词首尾相连", "咨询建议帮助指导解决问题困惑选择推荐意见"),
+    ("各类型混合", "昨天开会讨论了我的职业选择，心情有点焦虑，朋友给了建议。"),
+    ("英文与标点", "Meeting：会议 / Project：项目；Feeling：心情！"),
+]
+
+
+def test_representative_inputs_match_legacy():
+    for name, text in CASES:
+        expected = legacy_detect(manager.conversation_detectors, text)
+        assert manager.detect_conversation_type(text) == expected, (name, expected)
+        # 不经过缓存的新分类器同样一致
+        fresh = ConversationClassifier(manager.conversation_detectors, manager._init_keyword_weights())
+        assert fresh.classify(text) == expected, name
+
+
+def test_scores_match_legacy():
+    weights = manager._init_keyword_weights()
+    for name, text in CASES:
+        expected = legacy_scores(manager.conversation_detectors, weights, text)
+        assert manager.classifier.scores(text) == expected, (name, expected)
+
+
+DETECTORS = {
+    ConversationType.INTERVIEW: ["ab", "abc", "xyz"],
+    ConversationType.MEETING: ["bcd", "c", "abc"],
+    ConversationType.CONSULTATION: ["cd", "d", "d"],
+    ConversationType.EMOTIONAL: ["abcd", "z"],
+}
+WEIGHTS = {
+    ConversationType.MEETING: {"c": 3},
+    ConversationType.EMOTIONAL: {"abcd": 2},
+}
+
+OVERLAP_CASES = [
+    # 较长关键词包含较短关键词
+    "abcd",
+    # 关键词相互重叠但互不包含
+    "abcxyz",
+    "xbcd",
+    "cd",
+    # 同一关键词在多个类型中出现
+    "abc",
+    # 同一类型中重复列出的关键词
+    "d",
+    # 大写文本按小写匹配
+    "ABCD", "XyZ",
+    "",
+    "qqq",
+]
+
+
+def test_overlapping_keywords_match_legacy():
+    classifier = ConversationClassifier(DETECTORS, WEIGHTS)
+
+    def expected_type(text):
+        scores = legacy_scores(DETECTORS, WEIGHTS, text)
+        return max(scores.items(), key=lambda x: x[1])[0] if scores else ConversationType.GENERAL
+
+    for text in OVERLAP_CASES:
+        assert classifier.scores(text) == legacy_scores(DETECTORS, WEIGHTS, text), text
+        assert classifier.classify(text) == expected_type(text), text
+
+
+def test_random_keyword_mixes_match_legacy():
+    rng = random.Random(20261017)
+    keywords = [keyword for values in manager.conversation_detectors.values() for keyword in values]
+    filler = ["我", "们", "，", "。", "问：", "答：", "\n", "嗯", "工作", "议", "心"]
+    classifier = ConversationClassifier(manager.conversation_detectors, manager._init_keyword_weights())
+    overlap = ConversationClassifier(DETECTORS, WEIGHTS)
+    for _ in range(2000):
+        text = "".join(rng.choice(keywords + filler) for _ in range(rng.randint(0, 12)))
+        assert classifier.classify(text) == legacy_detect(manager.conversation_detectors, text), text
+
+        text = "".join(rng.choice("abcdxyzq") for _ in range(rng.randint(0, 10)))
+        assert overlap.scores(text) == legacy_scores(DETECTORS, WEIGHTS, text), text
+
+
+def test_batch_and_cache():
+    texts = [text for _, text in CASES] * 2
+    expected = [legacy_detect(manager.conversation_detectors, text) for text in texts]
+    assert manager.detect_conversation_types(texts) == expected
+    # 再次调用命中缓存，结果不变
+    assert [manager.detect_conversation_type(text) for text in texts] == expected
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始对话类型分类器测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+端到端流式转换测试
+在随机分块边界（包括切在多字节 UTF-8 字符中间、切在规则匹配中间）下，
+验证 rule_engine.apply_rules_stream、/upload/stream 与 /convert/stream
+拼接后的输出都与对完整文本执行 apply_rules_sync 的结果一致
+"""
+
+import asyncio
+import json
+import random
+from contextlib import contextmanager
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.http_client import http_client
+from app.services.llm_cache import llm_cache
+from app.services.llm_providers import OpenAICompatibleProvider
+from app.services.llm_router import llm_router
+from app.services.llm_service import llm_service
+from app.services.rule_engine import rule_engine
+
+
+SEEDS = range(12)
+
+# 包含默认规则与后处理规则会匹配的内容：对话标记、语气词、多余空白、标点后的空白
+TRANSCRIPT = (
+    "问：嗯嗯，你那个周末去了哪里？\n答：啊，我们   去了杭州西湖。然后去了灵隐寺。\n"
+    "问：感觉怎么样？\n答：呃，风景很好，  人有点多！  后来下雨了。\n\n\n"
+    "问：花了多少钱？\n答：那个那个，大概一千五百元左右 😀。\n"
+)
+ANSWER = (
+    "周末我们去了杭州西湖，  之后又去了灵隐寺。 \n \n\n风景很好，人有点多！ 后来下起了雨。\n"
+    "   \n这次大概花了一千五百元左右 😀。  接着就回家了。\n\n"
+)
+
+
+def random_splits(length: int, rng: random.Random):
+    """随机选取切分位置，返回 [(start, end)]，包含长度为 1 的小块"""
+    cuts = sorted(rng.sample(range(1, length), min(length - 1, rng.randint(1, length // 2))))
+    bounds = [0] + cuts + [length]
+    return list(zip(bounds, bounds[1:]))
+
+
+def test_apply_rules_stream_random_boundaries():
+    expected, _ = rule_engine.apply_rules_sync(TRANSCRIPT)
+
+    async def run(chunks):
+        async def source():
+            for chunk in chunks:
+                yield chunk
+
+        return "".join([piece async for piece in rule_engine.apply_rules_stream(source())])
+
+    for seed in SEEDS:
+        rng = random.Random(seed)
+        chunks = [TRANSCRIPT[start:end] for start, end in random_splits(len(TRANSCRIPT), rng)]
+        assert asyncio.run(run(chunks)) == expected, (seed, chunks)
+
+
+def test_upload_stream_splits_multibyte_characters():
+    """文件按很小的字节数读取，多字节字符被切在两次读取之间"""
+    client = TestClient(app)
+    data = TRANSCRIPT.encode("utf-8")
+    expected, _ = rule_engine.apply_rules_sync(TRANSCRIPT)
+    original = settings.RULE_STREAM_CHUNK_SIZE
+    try:
+        for chunk_size in (1, 2, 4, 5, 7, 64):
+            settings.RULE_STREAM_CHUNK_SIZE = chunk_size
+            response = client.post(
+                "/api/v1/transcription/upload/stream",
+                files={"file": ("transcript.txt", data, "text/plain")}
+            )
+            assert response.status_code == 200, response.text
+            assert response.text == expected, chunk_size
+    finally:
+        settings.RULE_STREAM_CHUNK_SIZE = original
+
+
+class ChunkedAnswer:
+    """假的 LLM 接口：将回答编码为 SSE 后按随机字节位置切分返回"""
+
+    def __init__(self, answer: str, rng: random.Random):
+        self.answer = answer
+        self.rng = rng
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        tokens = [self.answer[start:end] for start, end in random_splits(len(self.answer), self.rng)]
+        lines = [
+            f"data: {json.dumps({'choices': [{'delta': {'content': token}}]}, ensure_ascii=False)}\n\n"
+            for token in tokens
+        ]
+        body = "".join(lines + ["data: [DONE]\n\n"]).encode("utf-8")
+        pieces = [body[start:end] for start, end in random_splits(len(body), self.rng)]
+
+        async def content():
+            for piece in pieces:
+                yield piece
+
+        return httpx.Response(200, content=content(), headers={"Content-Type": "text/event-stream"})
+
+
+@contextmanager
+def fake_llm(answer: ChunkedAnswer):
+    """将共享客户端与路由替换为返回固定回答的假服务商，并关闭结果缓存"""
+    saved = (http_client._create, http_client._client, llm_router.providers, llm_cache.enabled)
+    http_client._create = lambda: httpx.AsyncClient(transport=httpx.MockTransport(answer.handler))
+    http_client._client = None
+    llm_router.providers = [OpenAICompatibleProvider("test", "https://llm.test/v1", "test-model", "test-key")]
+    llm_cache.enabled = False
+    try:
+        yield
+    finally:
+        http_client._create, http_client._client, llm_router.providers, llm_cache.enabled = saved
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.split("\n\n"):
+        if not block.strip():
+            continue
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_convert_stream_matches_apply_rules_sync():
+    """chunk 事件拼接后与对完整回答执行后处理规则的结果一致，也与 complete 事件的结果一致"""
+    expected, _ = rule_engine.apply_rules_sync(ANSWER.strip(), custom_rules=llm_service._postprocessing_rules())
+    for seed in SEEDS:
+        with fake_llm(ChunkedAnswer(ANSWER, random.Random(seed))):
+            with TestClient(app) as client:
+                response = client.post(
+                    "/api/v1/transcription/convert/stream",
+                    json={"original_text": TRANSCRIPT}
+                )
+        assert response.status_code == 200, response.text
+        events = parse_sse(response.text)
+        kinds = [kind for kind, _ in events]
+        assert kinds[0] == "start" and kinds[-1] == "complete", kinds
+        streamed = "".join(data["content"] for kind, data in events if kind == "chunk")
+        result = events[-1][1]
+        assert streamed == expected, (seed, streamed)
+        assert result["converted_text"] == expected
+        assert result["processing_stages"]["llm_conversion"]["text"] == ANSWER.strip()
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始端到端流式转换测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
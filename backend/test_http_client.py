@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+共享 HTTP 客户端测试
+验证多次 LLM 调用复用同一个客户端、关闭后重新创建，以及应用关闭时释放客户端
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from app.services.http_client import SharedHttpClient, http_client
+from app.services.llm_cache import llm_cache
+from app.services.llm_providers import OpenAICompatibleProvider
+from app.services.llm_router import llm_router
+from app.services.llm_service_simple import SimpleLLMService
+
+
+class MockClientFactory:
+    """代替 SharedHttpClient._create，创建使用假传输层的客户端并记录创建次数"""
+
+    def __init__(self):
+        self.clients = []
+        self.requests = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        body = json.loads(request.content)
+        text = body["messages"][-1]["content"][-20:]
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"转换结果：{text}"}}]})
+
+    def __call__(self) -> httpx.AsyncClient:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        self.clients.append(client)
+        return client
+
+
+class patched_llm:
+    """将全局共享客户端与路由替换为测试用的假服务商，退出时恢复"""
+
+    def __init__(self, factory: MockClientFactory):
+        self.factory = factory
+
+    def __enter__(self):
+        self.saved = (http_client._create, http_client._client, llm_router.providers, llm_cache.enabled)
+        http_client._create = self.factory
+        http_client._client = None
+        llm_router.providers = [OpenAICompatibleProvider("test", "https://llm.test/v1", "test-model", "test-key")]
+        # 关闭结果缓存，每次转换都发出请求
+        llm_cache.enabled = False
+        return self
+
+    def __exit__(self, *exc_info):
+        http_client._create, http_client._client, llm_router.providers, llm_cache.enabled = self.saved
+
+
+def test_client_reused_across_service_calls():
+    factory = MockClientFactory()
+
+    async def main():
+        service = SimpleLLMService()
+        clients = set()
+        for index in range(3):
+            result = await service.convert_transcription(f"问：第{index}个问题是什么？\n答：嗯，这是回答{index}。")
+            assert result["success"], result
+            clients.add(id(http_client.client))
+        assert len(factory.requests) == 3
+        assert len(factory.clients) == 1 and clients == {id(factory.clients[0])}
+        await http_client.close()
+
+    with patched_llm(factory):
+        asyncio.run(main())
+
+
+def test_client_recreated_after_close():
+    factory = MockClientFactory()
+
+    async def main():
+        shared = SharedHttpClient()
+        shared._create = factory
+        await shared.start()
+        first = shared.client
+        await shared.start()
+        assert shared.client is first and len(factory.clients) == 1
+
+        # 直接关闭底层客户端（如被其他代码 aclose）后按需重新创建
+        await first.aclose()
+        second = shared.client
+        assert second is not first and not second.is_closed and len(factory.clients) == 2
+
+        await shared.close()
+        assert second.is_closed and shared._client is None
+        third = shared.client
+        assert third is not second and len(factory.clients) == 3
+        await shared.close()
+
+    asyncio.run(main())
+
+
+def test_lifespan_creates_and_closes_client():
+    """应用启动时创建共享客户端，关闭时释放"""
+    from app.main import app, lifespan
+
+    factory = MockClientFactory()
+
+    async def main():
+        async with lifespan(app):
+            assert len(factory.clients) == 1
+            client = http_client.client
+            assert client is factory.clients[0] and not client.is_closed
+        assert client.is_closed and http_client._client is None
+
+    with patched_llm(factory):
+        asyncio.run(main())
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始共享 HTTP 客户端测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+增量规则执行测试
+验证修改笔录的一个文本块后只重新执行该块，结果与完整执行 apply_rules_sync 一致，
+以及缓存为空时未命中的文本块并行执行
+"""
+
+import random
+
+from app.core.config import settings
+from app.models.rule import RuleType
+from app.services.incremental_rules import block_digest, incremental_cache, split_blocks
+from app.services.rule_engine import rule_engine
+from app.services.segment_executor import segment_executor
+
+
+def make_rules(specs, rule_type=RuleType.LANGUAGE_STYLE):
+    """由 (pattern, replacement) 列表构造同类型、优先级递减的规则"""
+    return [
+        {
+            "id": index + 1,
+            "name": f"rule_{index + 1}",
+            "rule_type": rule_type,
+            "priority": len(specs) - index,
+            "pattern": pattern,
+            "replacement": replacement,
+        }
+        for index, (pattern, replacement) in enumerate(specs)
+    ]
+
+
+RULES = make_rules([("嗯+|啊", ""), ("那个", "这个"), (r"(\d+)元", r"\1块"), ("[ \t]+", " ")])
+WORDS = ["嗯", "那个", "我们", "然后", "12元", "就是说", "啊", "  ", "价格", "问题", "，", "。"]
+
+
+def make_transcript(turns: int, seed: int = 20261017) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for index in range(turns):
+        speaker = "问：" if index % 2 == 0 else "答："
+        lines.append(speaker + "".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))))
+    return "\n".join(lines) + "\n"
+
+
+def edit_block(text: str, block_index: int) -> str:
+    """
+    在指定文本块内修改一处文字
+
+    修改位置在行首 16 个字符之后、长度不变：切分位置由行首的文本内容
+    和块长度决定，这样的修改不会移动文本块边界。
+    """
+    blocks = split_blocks(text)
+    lines = blocks[block_index].split("\n")
+    index = next(i for i, line in enumerate(lines) if len(line) >= 30)
+    lines[index] = lines[index][:20] + "那个30元" + lines[index][25:]
+    blocks[block_index] = "\n".join(lines)
+    return "".join(blocks)
+
+
+def run(text: str):
+    return rule_engine.apply_rules_sync(text, custom_rules=RULES, collect_transformations=False, incremental=True)
+
+
+def applied(info):
+    return [(rule["rule_id"], rule["match_count"]) for rule in info["applied_rules"]]
+
+
+def test_edit_reruns_only_changed_block():
+    """
+    只使用 RULES 的执行计划（apply_rules_sync 传入自定义规则时还会追加默认规则），
+    全部步骤为行内步骤，文本块与 split_blocks 的结果一一对应
+    """
+    incremental_cache.clear()
+    plan = rule_engine.get_plan(RULES)
+    assert all(plan.line_local)
+
+    def execute(text, incremental):
+        return rule_engine._execute_plan(text, plan, False, incremental)
+
+    text = make_transcript(600)
+    blocks = split_blocks(text)
+    assert len(blocks) >= 5, len(blocks)
+
+    result_text, info = execute(text, True)
+    expected_text, expected_info = execute(text, False)
+    assert result_text == expected_text and applied(info) == applied(expected_info)
+    assert info["incremental"]["segments"] == info["incremental"]["recomputed_segments"] == len(blocks)
+    assert info["incremental"]["changed_ranges"] == [[0, len(text)]]
+
+    # 原样重新执行时全部命中缓存
+    _, info = execute(text, True)
+    assert info["incremental"]["recomputed_segments"] == 0 and info["incremental"]["changed_ranges"] == []
+
+    # 修改中间一块，只重新执行该块
+    edited = edit_block(text, len(blocks) // 2)
+    edited_blocks = split_blocks(edited)
+    changed = [index for index, block in enumerate(edited_blocks) if block not in blocks]
+    assert changed == [len(blocks) // 2], changed
+
+    result_text, info = execute(edited, True)
+    expected_text, expected_info = execute(edited, False)
+    assert result_text == expected_text and applied(info) == applied(expected_info)
+    assert info["incremental"]["recomputed_segments"] == 1
+    start = sum(len(block) for block in edited_blocks[:changed[0]])
+    assert info["incremental"]["changed_ranges"] == [[start, start + len(edited_blocks[changed[0]])]]
+
+    # 与包含默认规则的完整 apply_rules_sync 结果一致，默认规则的行内步骤同样复用缓存
+    run(edited)
+    result_text, info = run(edited)
+    assert result_text == rule_engine.apply_rules_sync(edited, custom_rules=RULES)[0]
+    assert info["incremental"]["recomputed_segments"] == 0
+
+
+def test_random_edits_match_full_run():
+    incremental_cache.clear()
+    rng = random.Random(7)
+    text = make_transcript(300, seed=1)
+    for _ in range(20):
+        lines = text.split("\n")
+        index = rng.randrange(len(lines) - 1)
+        lines[index] = lines[index][:2] + "".join(rng.choice(WORDS) for _ in range(rng.randint(0, 10)))
+        text = "\n".join(lines)
+        result_text, info = run(text)
+        expected_text, expected_info = rule_engine.apply_rules_sync(text, custom_rules=RULES)
+        assert result_text == expected_text
+        assert applied(info) == applied(expected_info)
+
+
+def test_cache_keys_use_block_digest():
+    incremental_cache.clear()
+    text = make_transcript(200)
+    run(text)
+    keys = list(incremental_cache._cache._data)
+    assert keys and all(isinstance(key[2], bytes) and len(key[2]) == 16 for key in keys)
+    assert {key[2] for key in keys} >= {block_digest(block) for block in split_blocks(text)}
+
+
+def test_cold_cache_runs_missing_blocks_in_parallel():
+    """缓存为空时未命中的文本块交给分段执行进程池，结果不变"""
+    incremental_cache.clear()
+    original = (settings.RULE_ENGINE_PROCESSES, settings.RULE_ENGINE_PARALLEL_THRESHOLD)
+    settings.RULE_ENGINE_PROCESSES, settings.RULE_ENGINE_PARALLEL_THRESHOLD = 2, 1000
+    submitted = []
+    original_submit = segment_executor.submit
+
+    def submit(fn, *args):
+        submitted.append(len(args[1]))
+        return original_submit(fn, *args)
+
+    segment_executor.submit = submit
+    try:
+        plan = rule_engine.get_plan(RULES)
+        text = make_transcript(400, seed=3)
+        result_text, info = rule_engine._execute_plan(text, plan, False, True)
+        expected_text, expected_info = rule_engine._execute_plan(text, plan, False, False)
+        assert result_text == expected_text and applied(info) == applied(expected_info)
+        assert len(submitted) == info["incremental"]["recomputed_segments"] == len(split_blocks(text)) > 1
+
+        # 只修改一块时未命中的文本不足阈值，在当前进程中执行
+        submitted.clear()
+        _, info = rule_engine._execute_plan(edit_block(text, 1), plan, False, True)
+        assert submitted == [] and info["incremental"]["recomputed_segments"] == 1
+    finally:
+        segment_executor.submit = original_submit
+        segment_executor.shutdown()
+        settings.RULE_ENGINE_PROCESSES, settings.RULE_ENGINE_PARALLEL_THRESHOLD = original
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始增量规则执行测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+LLM 结果缓存测试
+验证相同请求的并发调用合并为一次、异常与取消时的处理，以及结果持久化
+"""
+
+import asyncio
+import os
+import tempfile
+
+from app.services.llm_cache import LLMResponseCache
+
+
+PAYLOAD = {"model": "test-model", "messages": [{"role": "user", "content": "你好"}], "temperature": 0.2}
+
+
+def make_cache() -> LLMResponseCache:
+    directory = tempfile.mkdtemp()
+    return LLMResponseCache(os.path.join(directory, "llm_cache.db"), ttl=3600, max_entries=100)
+
+
+class FakeCall:
+    """记录调用次数的假 LLM 调用，在 release 前一直挂起"""
+
+    def __init__(self, result: str = "转换结果", error: BaseException = None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        self.started.set()
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_identical_inflight_requests_are_coalesced():
+    async def main():
+        cache = make_cache()
+        call = FakeCall()
+        tasks = [asyncio.create_task(cache.get_or_call(dict(PAYLOAD), call)) for _ in range(5)]
+        await call.started.wait()
+        await asyncio.sleep(0)
+        call.release.set()
+        assert await asyncio.gather(*tasks) == ["转换结果"] * 5
+        assert call.calls == 1 and cache.coalesced == 4 and cache.misses == 1
+
+        # 之后的相同请求直接命中缓存
+        again = FakeCall()
+        assert await cache.get_or_call(dict(PAYLOAD), again) == "转换结果"
+        assert again.calls == 0 and cache.hits == 1
+
+    asyncio.run(main())
+
+
+def test_different_requests_are_not_coalesced():
+    async def main():
+        cache = make_cache()
+        first, second = FakeCall("一"), FakeCall("二")
+        other = {**PAYLOAD, "temperature": 0.7}
+        tasks = [
+            asyncio.create_task(cache.get_or_call(dict(PAYLOAD), first)),
+            asyncio.create_task(cache.get_or_call(other, second)),
+        ]
+        await first.started.wait()
+        await second.started.wait()
+        first.release.set()
+        second.release.set()
+        assert await asyncio.gather(*tasks) == ["一", "二"]
+        assert cache.coalesced == 0
+
+    asyncio.run(main())
+
+
+def test_errors_propagate_and_are_not_cached():
+    async def main():
+        cache = make_cache()
+        call = FakeCall(error=RuntimeError("upstream failed"))
+        tasks = [asyncio.create_task(cache.get_or_call(dict(PAYLOAD), call)) for _ in range(3)]
+        await call.started.wait()
+        await asyncio.sleep(0)
+        call.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert call.calls == 1
+
+        retry = FakeCall("恢复")
+        retry.release.set()
+        assert await cache.get_or_call(dict(PAYLOAD), retry) == "恢复"
+        assert retry.calls == 1
+
+    asyncio.run(main())
+
+
+def test_cancelled_leader_hands_over_to_waiter():
+    """先到达的调用被取消时，等待中的调用重新发起请求而不是一起失败"""
+    async def main():
+        cache = make_cache()
+        leader_call = FakeCall()
+        leader = asyncio.create_task(cache.get_or_call(dict(PAYLOAD), leader_call))
+        await leader_call.started.wait()
+
+        follower_call = FakeCall("接替结果")
+        follower_call.release.set()
+        follower = asyncio.create_task(cache.get_or_call(dict(PAYLOAD), follower_call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+
+        assert await follower == "接替结果"
+        assert leader_call.calls == 1 and follower_call.calls == 1
+        assert leader.cancelled()
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    async def main():
+        cache = make_cache()
+        call = FakeCall()
+        leader = asyncio.create_task(cache.get_or_call(dict(PAYLOAD), call))
+        await call.started.wait()
+        waiter = asyncio.create_task(cache.get_or_call(dict(PAYLOAD), FakeCall()))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        call.release.set()
+        assert await leader == "转换结果"
+
+    asyncio.run(main())
+
+
+def test_results_persist_across_instances():
+    async def main():
+        cache = make_cache()
+        call = FakeCall()
+        call.release.set()
+        await cache.get_or_call(dict(PAYLOAD), call)
+        reopened = LLMResponseCache(cache.path, ttl=3600, max_entries=100)
+        # stream 字段不参与指纹，流式与非流式请求共用结果
+        assert await reopened.get({**PAYLOAD, "stream": True}) == "转换结果"
+
+    asyncio.run(main())
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始 LLM 结果缓存测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
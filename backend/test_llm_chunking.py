@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+长笔录分块转换测试
+验证 split_transcript 的切分边界、空输入处理，衔接处润色的范围与失败回退，
+按顺序逐块输出，以及流式转换对长笔录分块
+"""
+
+import asyncio
+import random
+
+from app.services.llm_chunking import (
+    CHUNK_INSTRUCTION, ChunkedConverter, chunked_converter, split_transcript
+)
+from app.services.llm_service_simple import SimpleLLMService
+
+
+WORDS = ["嗯", "那个", "我们", "然后", "就是说", "价格", "问题", "，", "。", "当时", "后来"]
+
+
+def make_transcript(turns: int, seed: int = 20261017, speakers=("问：", "答：")) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for index in range(turns):
+        speaker = speakers[index % len(speakers)]
+        lines.append(speaker + "".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60))))
+    return "\n".join(lines) + "\n"
+
+
+def test_split_boundaries():
+    text = make_transcript(400)
+    chunks = split_transcript(text, 2000)
+    assert len(chunks) > 3
+    assert "".join(chunks) == text
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    # 切分在轮次边界，且新块以提问方开头，问答不被拆开
+    assert all(chunk.endswith("\n") for chunk in chunks[:-1])
+    assert all(chunk.startswith("问：") for chunk in chunks)
+    # 除最后一块外不短于 max_size 的一半
+    assert all(len(chunk) >= 1000 for chunk in chunks[:-1])
+
+
+def test_split_short_and_empty_input():
+    assert split_transcript("", 2000) == []
+    assert split_transcript("  \n\n ", 2000) == []
+    assert split_transcript("问：你好\n答：你好\n", 2000) == ["问：你好\n答：你好\n"]
+
+
+def test_split_without_turn_boundaries():
+    # 单个轮次超过 max_size 时在换行处切分
+    lines = "\n".join("这是很长的一段叙述" * 5 for _ in range(60))
+    chunks = split_transcript(lines, 500)
+    assert "".join(chunks) == lines and all(len(chunk) <= 500 for chunk in chunks)
+    assert all(chunk.endswith("\n") for chunk in chunks[:-1])
+    # 没有换行时按长度截断
+    flat = "字" * 1234
+    chunks = split_transcript(flat, 500)
+    assert [len(chunk) for chunk in chunks] == [500, 500, 234] and "".join(chunks) == flat
+
+
+def test_edit_changes_only_its_chunk():
+    """切分位置由文本内容决定，修改一处只影响所在的块"""
+    text = make_transcript(600)
+    chunks = split_transcript(text, 3000)
+    target = len(chunks) // 2
+    lines = chunks[target].split("\n")
+    line = next(index for index, value in enumerate(lines) if len(value) > 40)
+    lines[line] = lines[line][:30] + "修改" + lines[line][32:]
+    edited = "".join(chunks[:target]) + "\n".join(lines) + "".join(chunks[target + 1:])
+    edited_chunks = split_transcript(edited, 3000)
+    assert len(edited_chunks) == len(chunks)
+    assert [index for index, (a, b) in enumerate(zip(chunks, edited_chunks)) if a != b] == [target]
+
+
+class FakeLLM:
+    """记录请求的假转换与润色函数"""
+
+    def __init__(self, stitch=None):
+        self.chunks = []
+        self.stitch_prompts = []
+        self.stitch = stitch
+
+    async def convert_chunk(self, chunk: str, index: int, total: int) -> str:
+        self.chunks.append((index, total))
+        await asyncio.sleep(0.001 * (total - index))
+        return f"  <{index}>{chunk.strip()}</{index}>  "
+
+    async def complete(self, prompt: str) -> str:
+        self.stitch_prompts.append(prompt)
+        if isinstance(self.stitch, BaseException):
+            raise self.stitch
+        return self.stitch(prompt)
+
+
+def join_parts(text: str, size: int):
+    return [f"<{index}>{chunk.strip()}</{index}>" for index, chunk in enumerate(split_transcript(text, size))]
+
+
+def test_convert_without_stitching():
+    converter = ChunkedConverter(threshold=100, chunk_size=1500, concurrency=2)
+    text = make_transcript(200)
+    llm = FakeLLM()
+    result = asyncio.run(converter.convert(text, llm.convert_chunk))
+    assert result == "\n\n".join(join_parts(text, 1500))
+    assert sorted(llm.chunks) == [(index, len(llm.chunks)) for index in range(len(llm.chunks))]
+
+
+def test_stitch_replaces_overlap_windows():
+    """润色范围为前一块结尾与后一块开头的句子，替换后不重复也不丢失其余文字"""
+    converter = ChunkedConverter(threshold=100, chunk_size=1500, concurrency=2, stitch_window=50)
+    text = make_transcript(200)
+
+    def stitch(prompt: str) -> str:
+        tail = prompt.split("前文结尾：\n")[1].split("\n\n后文开头：")[0]
+        head = prompt.split("后文开头：\n")[1].split("\n\n改写后的衔接文字：")[0]
+        return f"[{tail}|{head}]"
+
+    llm = FakeLLM(stitch)
+    result = asyncio.run(converter.convert(text, llm.convert_chunk, llm.complete))
+    parts = join_parts(text, 1500)
+    assert len(llm.stitch_prompts) == len(parts) - 1
+    # 去掉润色标记后与直接拼接相同：每个衔接处的文字恰好出现一次
+    assert result.replace("[", "").replace("|", "").replace("]", "") == "".join(parts)
+    assert result.count("[") == len(parts) - 1
+
+
+def test_stitch_failures_keep_original():
+    converter = ChunkedConverter(threshold=100, chunk_size=1500, concurrency=2, stitch_window=50)
+    text = make_transcript(200)
+    expected = "\n\n".join(join_parts(text, 1500))
+
+    # 润色请求失败
+    llm = FakeLLM(RuntimeError("upstream failed"))
+    assert asyncio.run(converter.convert(text, llm.convert_chunk, llm.complete)) == expected
+    # 润色结果长度异常（如模型输出了整段说明）
+    llm = FakeLLM(lambda prompt: "好的" * 1000)
+    assert asyncio.run(converter.convert(text, llm.convert_chunk, llm.complete)) == expected
+
+
+def test_single_chunk_and_empty_results():
+    converter = ChunkedConverter(threshold=100, chunk_size=1500)
+    llm = FakeLLM()
+    assert asyncio.run(converter.convert("问：短\n", llm.convert_chunk)) == "  <0>问：短</0>  "
+
+    async def empty(chunk: str, index: int, total: int) -> str:
+        return "" if index == 1 else f"<{index}>"
+
+    text = make_transcript(200)
+    total = len(split_transcript(text, 1500))
+    assert asyncio.run(converter.convert(text, empty)) == "\n\n".join(f"<{i}>" for i in range(total) if i != 1)
+
+
+def test_iter_convert_yields_in_order():
+    converter = ChunkedConverter(threshold=100, chunk_size=1500, concurrency=3)
+    text = make_transcript(200)
+    llm = FakeLLM()
+
+    async def collect():
+        return [part async for part in converter.iter_convert(text, llm.convert_chunk)]
+
+    # 后面的块先完成，输出仍按原顺序
+    assert asyncio.run(collect()) == join_parts(text, 1500)
+
+
+def test_iter_convert_cancels_remaining_on_error():
+    converter = ChunkedConverter(threshold=100, chunk_size=1500, concurrency=2)
+    text = make_transcript(200)
+    cancelled = []
+
+    async def convert_chunk(chunk: str, index: int, total: int) -> str:
+        if index == 0:
+            raise RuntimeError("chunk failed")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return chunk
+
+    async def collect():
+        try:
+            async for _ in converter.iter_convert(text, convert_chunk):
+                pass
+        except RuntimeError:
+            return True
+        return False
+
+    assert asyncio.run(asyncio.wait_for(collect(), 5))
+    assert cancelled
+
+
+def test_streaming_chunks_long_transcripts():
+    """流式转换长笔录时分块请求，逐块输出的内容拼接后与分块结果一致"""
+    service = SimpleLLMService()
+    text = make_transcript(400)
+    assert chunked_converter.should_chunk(text)
+    chunks = [chunk.strip() for chunk in split_transcript(text, chunked_converter.chunk_size)]
+    requests = []
+
+    async def complete(messages):
+        content = messages[-1]["content"]
+        assert content.startswith(CHUNK_INSTRUCTION)
+        requests.append(content)
+        return f"第{next(i for i, chunk in enumerate(chunks) if chunk in content)}块"
+
+    async def stream(messages):
+        raise AssertionError("长笔录不应整篇发送")
+        yield
+
+    service._complete = complete
+    service._stream_call_deepseek_api = stream
+
+    async def collect():
+        return [event async for event in service.stream_conversion_events(text, protocol=2)]
+
+    events = asyncio.run(collect())
+    assert events[-1][0] == "complete", events[-1]
+    deltas = "".join(data["content"] for kind, data in events if kind == "delta")
+    assert len(requests) == len(chunks) > 1
+    assert deltas == "\n\n".join(f"第{index}块" for index in range(len(chunks)))
+    assert events[-1][1]["final_length"] == len(deltas)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始长笔录分块转换测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+LLM 并发控制测试
+验证 AIMD 上限调整、按优先级唤醒排队请求以及取消排队请求后的名额归还
+"""
+
+import asyncio
+
+import httpx
+
+from app.services.llm_limiter import AdaptiveLimiter, LLMPriority, llm_priority
+
+
+def overload_error() -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://llm.test/chat")
+    response = httpx.Response(429, request=request)
+    return httpx.HTTPStatusError("HTTP 429", request=request, response=response)
+
+
+async def run_in_slot(limiter: AdaptiveLimiter, error: BaseException = None) -> None:
+    try:
+        async with limiter.slot():
+            if error is not None:
+                raise error
+    except type(error) if error is not None else ():
+        pass
+
+
+def test_additive_increase():
+    async def main():
+        limiter = AdaptiveLimiter(initial=2, max_limit=3)
+        await run_in_slot(limiter)
+        assert limiter.limit == 2.5
+        await run_in_slot(limiter)
+        assert abs(limiter.limit - 2.9) < 1e-9
+        for _ in range(10):
+            await run_in_slot(limiter)
+        assert limiter.limit == 3 and limiter.completed == 12
+
+    asyncio.run(main())
+
+
+def test_multiplicative_decrease_once_per_congestion():
+    async def main():
+        limiter = AdaptiveLimiter(initial=8, min_limit=1, max_limit=16, backoff=0.5)
+        gate = asyncio.Event()
+
+        async def failing():
+            async with limiter.slot():
+                await gate.wait()
+                raise overload_error()
+
+        # 同时在执行的请求相继失败，只减半一次
+        tasks = [asyncio.create_task(failing()) for _ in range(4)]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert limiter.limit == 4 and limiter.overloaded == 4
+
+        # 之后开始的请求再次失败时继续减半，不低于下限
+        for expected in (2, 1, 1):
+            await run_in_slot(limiter, overload_error())
+            assert limiter.limit == expected
+
+        # 非过载错误不影响上限
+        await run_in_slot(limiter, ValueError("bad response"))
+        assert limiter.limit == 1 and limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_priority_wake_order():
+    async def main():
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        order = []
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot():
+                await release.wait()
+
+        async def request(name: str, priority: LLMPriority):
+            async with limiter.slot(priority):
+                order.append(name)
+
+        async def contextual(name: str):
+            with llm_priority(LLMPriority.BATCH):
+                async with limiter.slot():
+                    order.append(name)
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(request("batch-1", LLMPriority.BATCH)),
+            asyncio.create_task(contextual("batch-2")),
+            asyncio.create_task(request("interactive-1", LLMPriority.INTERACTIVE)),
+            asyncio.create_task(request("batch-3", LLMPriority.BATCH)),
+            asyncio.create_task(request("interactive-2", LLMPriority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == {"interactive": 2, "batch": 3}
+        release.set()
+        await asyncio.gather(first, *tasks)
+        # 交互式请求先于批量任务，同优先级按到达顺序
+        assert order == ["interactive-1", "interactive-2", "batch-1", "batch-2", "batch-3"]
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def main():
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot():
+                await release.wait()
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(run_in_slot(limiter))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        release.set()
+        await first
+        assert limiter.in_flight == 0 and limiter.has_capacity()
+        await asyncio.wait_for(run_in_slot(limiter), 1.0)
+
+    asyncio.run(main())
+
+
+def test_growing_limit_wakes_waiters():
+    async def main():
+        limiter = AdaptiveLimiter(initial=1, max_limit=4)
+        limiter.limit = 1.9
+        started = []
+        release = asyncio.Event()
+
+        async def request(name: str):
+            async with limiter.slot():
+                started.append(name)
+                await release.wait()
+
+        async def quick():
+            async with limiter.slot():
+                pass
+
+        first = asyncio.create_task(quick())
+        queued = [asyncio.create_task(request(f"r{index}")) for index in range(3)]
+        await asyncio.sleep(0)
+        await first
+        await asyncio.sleep(0)
+        # 成功使上限增至 2 以上，唤醒排队的请求直到占满新上限
+        assert int(limiter.limit) == 2 and len(started) == 2
+        release.set()
+        await asyncio.gather(*queued)
+
+    asyncio.run(main())
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始 LLM 并发控制测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
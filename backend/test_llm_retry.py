@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+LLM 调用重试测试
+使用假的单次尝试函数验证重试、单次尝试时限（含排队等待）、总时限与对冲请求
+"""
+
+import asyncio
+import time
+
+import httpx
+
+from app.services.llm_limiter import AdaptiveLimiter
+from app.services.llm_retry import AttemptTimeoutError, RetryingCaller, is_retryable_error
+
+
+def make_caller(**kwargs) -> RetryingCaller:
+    options = dict(attempts=3, base_delay=0.001, max_delay=0.01, attempt_timeout=1.0, total_timeout=5.0)
+    options.update(kwargs)
+    return RetryingCaller(**options)
+
+
+def status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://llm.test/chat")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+class FakeAttempt:
+    """按预设行为依次执行的尝试：返回字符串、抛出异常，或 "hang" 一直挂起"""
+
+    def __init__(self, *behaviours):
+        self.behaviours = list(behaviours)
+        self.timeouts = []
+        self.cancelled = 0
+
+    async def __call__(self, timeout: float) -> str:
+        self.timeouts.append(timeout)
+        behaviour = self.behaviours.pop(0) if self.behaviours else "hang"
+        if isinstance(behaviour, BaseException):
+            raise behaviour
+        if behaviour == "hang":
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return behaviour
+
+
+def test_retries_retryable_errors():
+    caller = make_caller()
+    attempt = FakeAttempt(status_error(503), httpx.ConnectError("reset"), "ok")
+    assert asyncio.run(caller.call(attempt)) == "ok"
+    assert caller.retries == 2 and len(attempt.timeouts) == 3
+
+
+def test_does_not_retry_client_errors():
+    caller = make_caller()
+    attempt = FakeAttempt(status_error(400), "ok")
+    try:
+        asyncio.run(caller.call(attempt))
+    except httpx.HTTPStatusError as e:
+        assert e.response.status_code == 400
+    else:
+        raise AssertionError("400 不应重试")
+    assert caller.retries == 0
+
+
+def test_retry_after_sets_minimum_delay():
+    caller = make_caller(max_delay=30.0)
+    assert caller.backoff_delay(1, status_error(429, {"Retry-After": "7"})) >= 7.0
+    # Retry-After 也受 max_delay 限制
+    assert make_caller(max_delay=2.0).backoff_delay(1, status_error(429, {"Retry-After": "60"})) <= 2.0
+
+
+def test_stuck_attempt_is_cancelled_and_retried():
+    """httpx 的 timeout 不限制整个请求，挂起的尝试由整体时限取消后重试"""
+    caller = make_caller(attempt_timeout=0.05)
+    attempt = FakeAttempt("hang", "ok")
+    started = time.monotonic()
+    assert asyncio.run(caller.call(attempt)) == "ok"
+    assert time.monotonic() - started < 0.5
+    assert attempt.cancelled == 1 and caller.retries == 1
+    assert is_retryable_error(AttemptTimeoutError("timeout"))
+
+
+def test_total_deadline_bounds_all_attempts():
+    caller = make_caller(attempts=10, attempt_timeout=0.2, total_timeout=0.3)
+    attempt = FakeAttempt()
+    started = time.monotonic()
+    try:
+        asyncio.run(caller.call(attempt))
+    except AttemptTimeoutError:
+        pass
+    else:
+        raise AssertionError("应超过总时限")
+    assert time.monotonic() - started < 0.6
+    assert len(attempt.timeouts) <= 2 and attempt.timeouts[-1] <= 0.3
+
+
+def test_deadline_includes_limiter_queue():
+    """排队等待并发名额的时间计入尝试时限，超时后名额不被泄漏"""
+    async def main():
+        limiter = AdaptiveLimiter(initial=1, max_limit=1)
+        caller = make_caller(attempts=1, attempt_timeout=0.05)
+        held = asyncio.Event()
+        release = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot():
+                held.set()
+                await release.wait()
+
+        async def attempt(timeout: float) -> str:
+            async with limiter.slot():
+                return "ok"
+
+        task = asyncio.create_task(holder())
+        await held.wait()
+        try:
+            await caller.call(attempt)
+        except AttemptTimeoutError:
+            pass
+        else:
+            raise AssertionError("排队时间应计入时限")
+        release.set()
+        await task
+        assert limiter.in_flight == 0
+        # 被取消的排队项不占用名额，后续请求可以立即执行
+        assert await caller.call(attempt) == "ok"
+
+    asyncio.run(main())
+
+
+def test_hedge_wins_and_cancels_primary():
+    caller = make_caller(hedge_enabled=True, hedge_min_delay=0.02)
+    caller._latencies.extend([0.01] * 20)
+    attempt = FakeAttempt("hang", "hedged")
+    assert asyncio.run(caller.call(attempt)) == "hedged"
+    assert caller.hedged == 1 and caller.hedge_wins == 1
+    assert attempt.cancelled == 1
+
+
+def test_hedge_skipped_without_capacity():
+    caller = make_caller(attempts=1, attempt_timeout=0.1, hedge_enabled=True, hedge_min_delay=0.02)
+    caller._latencies.extend([0.01] * 20)
+    attempt = FakeAttempt("hang", "hedged")
+    try:
+        asyncio.run(caller.call(attempt, has_capacity=lambda: False))
+    except AttemptTimeoutError:
+        pass
+    else:
+        raise AssertionError("没有空闲名额时不应对冲")
+    assert caller.hedged == 0 and len(attempt.timeouts) == 1 and attempt.cancelled == 1
+
+
+def test_hedge_needs_latency_samples():
+    caller = make_caller(hedge_enabled=True)
+    assert caller.hedge_delay() is None
+    caller._latencies.extend([0.5] * 19 + [4.0])
+    assert caller.hedge_delay() == caller.hedge_min_delay
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始 LLM 调用重试测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+LLM 路由测试
+使用假的服务商接口验证出错、超时时的故障转移，连续失败后的冷却与恢复，
+以及按近期耗时排序
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from app.services.http_client import http_client
+from app.services.llm_cache import llm_cache
+from app.services.llm_limiter import AdaptiveLimiter
+from app.services.llm_providers import OllamaProvider, OpenAICompatibleProvider
+from app.services.llm_router import LLMRouter, NoProviderError
+
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+class StubServer:
+    """按主机名分派的假服务商接口，每个主机按预设行为依次响应"""
+
+    def __init__(self, **behaviours):
+        self.behaviours = {host: list(items) for host, items in behaviours.items()}
+        self.calls = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host.split(".")[0]
+        self.calls.append(host)
+        queue = self.behaviours.get(host) or ["ok"]
+        behaviour = queue.pop(0) if len(queue) > 1 else queue[0]
+        if behaviour == "timeout":
+            raise httpx.ReadTimeout("read timed out", request=request)
+        if isinstance(behaviour, int):
+            return httpx.Response(behaviour, request=request)
+        stream = json.loads(request.content).get("stream")
+        text = f"{host}:{behaviour}"
+        if host.startswith("ollama"):
+            return httpx.Response(200, json={"message": {"content": text}, "done": True})
+        if stream:
+            lines = [
+                f"data: {json.dumps({'choices': [{'delta': {'content': part}}]}, ensure_ascii=False)}"
+                for part in (text[:3], text[3:])
+            ]
+            return httpx.Response(200, text="\n\n".join(lines + ["data: [DONE]"]) + "\n\n")
+        return httpx.Response(200, json={"choices": [{"message": {"content": text}}]})
+
+
+def make_provider(name: str, cooldown: float = 30.0, threshold: int = 3):
+    provider = OpenAICompatibleProvider(
+        name, f"https://{name}.test/v1", f"{name}-model", "key", limiter=AdaptiveLimiter(initial=4)
+    )
+    provider.health.cooldown = cooldown
+    provider.health.failure_threshold = threshold
+    return provider
+
+
+class stub_transport:
+    """将共享客户端替换为使用假接口的客户端，并关闭结果缓存"""
+
+    def __init__(self, server: StubServer):
+        self.server = server
+
+    def __enter__(self):
+        self.saved = (http_client._create, http_client._client, llm_cache.enabled)
+        http_client._create = lambda: httpx.AsyncClient(transport=httpx.MockTransport(self.server.handler))
+        http_client._client = None
+        llm_cache.enabled = False
+        return self
+
+    def __exit__(self, *exc_info):
+        http_client._create, http_client._client, llm_cache.enabled = self.saved
+
+
+def run(coro_factory, server: StubServer):
+    async def main():
+        try:
+            return await coro_factory()
+        finally:
+            await http_client.close()
+
+    with stub_transport(server):
+        return asyncio.run(main())
+
+
+def test_failover_on_error_and_timeout():
+    for failure in (503, "timeout", 429):
+        server = StubServer(primary=[failure], backup=["ok"])
+        router = LLMRouter([make_provider("primary"), make_provider("backup")])
+        result = run(lambda: router._complete_once(MESSAGES, 0.2, 100, 5.0), server)
+        assert result == "backup:ok", (failure, result)
+        assert server.calls == ["primary", "backup"] and router.failovers == 1
+        primary, backup = router.providers
+        assert primary.health.failures == 1 and primary.health.consecutive_failures == 1
+        assert backup.health.failures == 0 and backup.health.latency is not None
+
+
+def test_all_providers_fail_raises_last_error():
+    server = StubServer(primary=[500], backup=["timeout"])
+    router = LLMRouter([make_provider("primary"), make_provider("backup")])
+    try:
+        run(lambda: router._complete_once(MESSAGES, 0.2, 100, 5.0), server)
+    except httpx.ReadTimeout:
+        pass
+    else:
+        raise AssertionError("全部服务商失败时应抛出最后一个错误")
+
+    try:
+        asyncio.run(LLMRouter([]).complete(MESSAGES))
+    except NoProviderError:
+        pass
+    else:
+        raise AssertionError("没有服务商时应抛出 NoProviderError")
+
+
+def test_failover_through_public_complete():
+    server = StubServer(primary=[502], backup=["ok"])
+    router = LLMRouter([make_provider("primary"), make_provider("backup")])
+    assert run(lambda: router.complete(MESSAGES, max_tokens=100), server) == "backup:ok"
+
+
+def test_cooldown_and_recovery():
+    server = StubServer(primary=[503, 503, "ok"], backup=["ok"])
+    primary, backup = make_provider("primary", cooldown=0.2, threshold=2), make_provider("backup")
+    router = LLMRouter([primary, backup])
+
+    # 备用服务商较慢，主服务商出错后仍排在前面，直到熔断
+    primary.health.latency, backup.health.latency = 0.01, 10.0
+
+    async def scenario():
+        results = [await router._complete_once(MESSAGES, 0.2, 100, 5.0) for _ in range(2)]
+        assert server.calls == ["primary", "backup"] * 2
+        # 连续失败达到阈值，冷却期内不再优先尝试
+        assert not primary.health.available
+        assert router.ranked() == [backup, primary]
+        server.calls.clear()
+        results.append(await router._complete_once(MESSAGES, 0.2, 100, 5.0))
+        assert server.calls == ["backup"]
+
+        # 冷却结束后恢复为可用，重新按耗时与错误率参与排序
+        await asyncio.sleep(0.25)
+        assert primary.health.available
+        assert router.ranked()[0] is primary
+        server.calls.clear()
+        results.append(await router._complete_once(MESSAGES, 0.2, 100, 5.0))
+        assert server.calls == ["primary"]
+        assert primary.health.consecutive_failures == 0
+        return results
+
+    assert run(scenario, server) == ["backup:ok", "backup:ok", "backup:ok", "primary:ok"]
+
+
+def test_ranking_prefers_lower_latency_and_error_rate():
+    fast, slow, flaky = make_provider("fast"), make_provider("slow"), make_provider("flaky")
+    router = LLMRouter([slow, flaky, fast])
+    slow.health.record_success(2.0)
+    fast.health.record_success(0.5)
+    flaky.health.record_success(0.4)
+    for _ in range(2):
+        flaky.health.record_failure()
+    assert router.ranked() == [fast, flaky, slow]
+    # 尚无耗时记录的服务商按已知最小耗时估计，配置顺序靠前者优先
+    fresh = make_provider("fresh")
+    assert LLMRouter([fresh, slow]).ranked() == [fresh, slow]
+
+
+def test_stream_fails_over_before_first_chunk():
+    server = StubServer(primary=["timeout"], backup=["ok"])
+    router = LLMRouter([make_provider("primary"), make_provider("backup")])
+
+    async def collect():
+        return [chunk async for chunk in router.stream(MESSAGES, max_tokens=100, timeout=5.0)]
+
+    chunks = run(collect, server)
+    assert "".join(chunk["content"] for chunk in chunks) == "backup:ok"
+    assert {chunk["provider"] for chunk in chunks} == {"backup"} and router.failovers == 1
+
+
+def test_ollama_provider_in_rotation():
+    server = StubServer(primary=[503], ollama=["ok"])
+    local = OllamaProvider("ollama", "http://ollama.test:11434", "qwen")
+    router = LLMRouter([make_provider("primary"), local])
+    assert run(lambda: router._complete_once(MESSAGES, 0.2, 100, 5.0), server) == "ollama:ok"
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始 LLM 路由测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+正则执行保护测试
+验证灾难性回溯的规则在时限内被终止、安全规则正常执行，
+以及子进程的复用与超时后的补充
+"""
+
+import threading
+import time
+
+from app.models.rule import RuleType
+from app.services.pattern_analysis import backtracking_risks
+from app.services.regex_guard import RegexGuard, RuleTimeoutError
+from app.services.rule_engine import rule_engine
+from app.services.rule_plan import RULE_PATTERN_FLAGS, build_rule_plan
+
+
+CATASTROPHIC = r"(a+)+$"
+EVIL_TEXT = "a" * 40 + "b"
+TIMEOUT = 0.5
+# 时限之外允许的调度开销
+SLACK = 0.5
+
+
+def make_rule(pattern: str, replacement: str = "X"):
+    return {
+        "id": 1,
+        "name": "guarded_rule",
+        "rule_type": RuleType.LANGUAGE_STYLE,
+        "priority": 5,
+        "pattern": pattern,
+        "replacement": replacement,
+    }
+
+
+def timed(func, *args, **kwargs):
+    started = time.monotonic()
+    try:
+        return func(*args, **kwargs), time.monotonic() - started
+    except Exception as e:
+        return e, time.monotonic() - started
+
+
+def test_catastrophic_pattern_is_flagged_and_guarded():
+    assert backtracking_risks(CATASTROPHIC, RULE_PATTERN_FLAGS)
+    assert not backtracking_risks(r"\d{3}-\d{4}", RULE_PATTERN_FLAGS)
+    plan = build_rule_plan([make_rule(CATASTROPHIC), {**make_rule("那个", "这个"), "id": 2}])
+    assert plan.guarded
+    assert [rule.guarded for rule in plan.rules] == [True, False]
+
+
+def test_catastrophic_pattern_times_out():
+    guard = RegexGuard(max_workers=1)
+    guard.start()
+    try:
+        result, elapsed = timed(guard.subn, CATASTROPHIC, RULE_PATTERN_FLAGS, "X", EVIL_TEXT, timeout=TIMEOUT)
+        assert isinstance(result, RuleTimeoutError), result
+        assert elapsed < TIMEOUT + SLACK, elapsed
+
+        # 被结束的子进程在后台补充，之后的安全正则照常执行
+        assert guard.subn("a", 0, "b", "aa", timeout=5.0) == ("bb", 2)
+    finally:
+        guard.shutdown()
+
+
+def test_safe_pattern_passes_and_reuses_worker():
+    guard = RegexGuard(max_workers=1)
+    guard.start()
+    try:
+        worker = guard._idle[0]
+        for _ in range(3):
+            assert guard.subn(r"(\d+)元", 0, r"\1块", "12元和3元", timeout=TIMEOUT) == ("12块和3块", 2)
+        assert guard._idle == [worker] and worker.process.is_alive()
+    finally:
+        guard.shutdown()
+
+
+def test_waiting_for_busy_worker_counts_toward_timeout():
+    guard = RegexGuard(max_workers=1)
+    guard.start()
+    try:
+        busy = threading.Thread(
+            target=timed, args=(guard.subn, CATASTROPHIC, RULE_PATTERN_FLAGS, "X", EVIL_TEXT), kwargs={"timeout": 1.0}
+        )
+        busy.start()
+        time.sleep(0.1)
+        result, elapsed = timed(guard.subn, "a", 0, "b", "a", timeout=0.2)
+        busy.join()
+        assert isinstance(result, RuleTimeoutError), result
+        assert elapsed < 0.2 + SLACK, elapsed
+    finally:
+        guard.shutdown()
+
+
+def test_rule_engine_test_rule():
+    result, elapsed = timed(rule_engine.test_rule, EVIL_TEXT, make_rule(CATASTROPHIC))
+    assert result["success"] is False and "超过" in result["error"], result
+
+    result = rule_engine.test_rule("电话123-4567", make_rule(r"\d{3}-\d{4}", "[电话]"))
+    assert result["success"] and result["applied"] and result["result_text"] == "电话[电话]"
+
+    # 有风险但输入不会触发回溯时，经子进程执行也能得到正确结果
+    result = rule_engine.test_rule("aaa", make_rule(CATASTROPHIC))
+    assert result["success"] and result["result_text"] == "X"
+
+
+def test_validate_rule_rejects_catastrophic_pattern():
+    result = rule_engine.validate_rule(make_rule(CATASTROPHIC))
+    assert not result["valid"] and result["issues"]
+    assert rule_engine.validate_rule(make_rule(r"\d+")) == {"valid": True, "issues": [], "warnings": []}
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始正则执行保护测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    try:
+        for test in tests:
+            test()
+            print(f"✅ {test.__name__}")
+    finally:
+        rule_engine.shutdown()
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+规则执行计划等价性测试
+验证字面量合并（LiteralGroup）与正则融合（FusedGroup）后的执行计划，
+与逐条执行规则的结果（转换文本及 applied_rules）完全一致
+"""
+
+import random
+
+from app.models.rule import RuleType
+from app.services.literal_matcher import extract_literals
+from app.services.pattern_analysis import analyze_pattern
+from app.services.rule_engine import rule_engine
+from app.services.rule_plan import (
+    RULE_PATTERN_FLAGS, CompiledRule, FusedGroup, LiteralGroup, RulePlan,
+    build_rule_plan, is_line_local
+)
+
+
+def make_rules(specs, rule_type=RuleType.LANGUAGE_STYLE):
+    """由 (pattern, replacement) 列表构造同类型、优先级递减的规则"""
+    return [
+        {
+            "id": index + 1,
+            "name": f"rule_{index + 1}",
+            "rule_type": rule_type,
+            "priority": len(specs) - index,
+            "pattern": pattern,
+            "replacement": replacement,
+        }
+        for index, (pattern, replacement) in enumerate(specs)
+    ]
+
+
+def baseline_plan(plan: RulePlan) -> RulePlan:
+    """不合并、不融合的执行计划，每条规则单独作为一个步骤"""
+    return RulePlan(
+        fingerprint=f"baseline:{plan.fingerprint}",
+        rules=plan.rules,
+        steps=plan.rules,
+        line_local=tuple(is_line_local(rule) for rule in plan.rules)
+    )
+
+
+def applied(info):
+    return [(rule["rule_id"], rule["match_count"]) for rule in info["applied_rules"]]
+
+
+def assert_equivalent(rules, text):
+    """计划执行与逐条执行的结果一致，返回计划的步骤"""
+    plan = build_rule_plan(rules)
+    expected_text, expected_info = rule_engine._execute_plan(text, baseline_plan(plan), False)
+    actual_text, actual_info = rule_engine._execute_plan(text, plan, False)
+    assert actual_text == expected_text, (rules, text, actual_text, expected_text)
+    assert applied(actual_info) == applied(expected_info), (rules, text)
+    return plan.steps
+
+
+def step_kinds(steps):
+    return [type(step).__name__ for step in steps]
+
+
+def test_literal_group_merges_and_matches():
+    rules = make_rules([("那个", "这个"), ("嗯|啊", ""), ("吧", "")])
+    steps = assert_equivalent(rules, "嗯，那个问题啊，就这样吧。那个吧")
+    assert step_kinds(steps) == ["LiteralGroup"]
+
+
+def test_overlapping_literals_not_merged():
+    rules = make_rules([("ab", "x"), ("b", "y"), ("bc", "z")])
+    for text in ["abc", "bbc", "abbc", "cab", "ababcbc"]:
+        steps = assert_equivalent(rules, text)
+        assert not any(isinstance(step, LiteralGroup) for step in steps)
+
+
+def test_replacement_creating_later_match():
+    rules = make_rules([("a", "b"), ("b", "c"), ("x", "")])
+    for text in ["aab", "bab", "xaxbx"]:
+        assert_equivalent(rules, text)
+
+
+def test_deletion_splicing_literals():
+    rules = make_rules([("x", ""), ("ab", "Q"), ("y", "")])
+    for text in ["axb", "ab", "xayb", "aaxbb"]:
+        assert_equivalent(rules, text)
+
+
+def test_run_pattern_counts():
+    rules = make_rules([("(嗯|啊)+", ""), ("呃", "")])
+    steps = assert_equivalent(rules, "嗯啊嗯，呃呃，啊")
+    assert step_kinds(steps) == ["LiteralGroup"]
+
+
+def test_group_references_in_fused_template():
+    rules = make_rules([(r"(\d+)元", r"\1块"), (r"([a-z]+)@", r"<\1>"), (r"[A-Z]{2}", "大写")])
+    steps = assert_equivalent(rules, "价格12元，联系abc@，编号XY，再付3元")
+    assert step_kinds(steps) == ["FusedGroup"]
+
+
+def test_named_groups_conflict_falls_back():
+    rules = make_rules([(r"(?P<n>\d+)元", r"\g<n>块"), (r"(?P<n>[a-z]+)@", r"<\g<n>>")])
+    steps = assert_equivalent(rules, "12元 ab@")
+    assert not any(isinstance(step, FusedGroup) for step in steps)
+
+
+def test_ignorecase_rules():
+    cases = [
+        [("K", "1"), ("(?i:kk)", "2")],
+        [("(?i:ab)", "x"), ("AB", "y")],
+        [("(?i)abc", "x"), ("d", "y")],
+        [("k", "1"), ("K", "2")],
+        [("(?i:ss)", "1"), ("ß", "2")],
+    ]
+    for specs in cases:
+        rules = make_rules(specs)
+        for text in ["kK", "KK", "kk", "aB AB ab", "ABCd abcD", "ßSS sS"]:
+            assert_equivalent(rules, text)
+
+
+def test_lookaround_and_anchor_rules():
+    cases = [
+        [(r"^问", "Q"), (r"答$", "A")],
+        [(r"(?<=问)：", ":"), (r"\d", "#")],
+        [(r"\bok\b", "好"), (r"o", "0")],
+        [(r"a(?=b)", "x"), (r"b", "y")],
+        [(r"\Afoo", "F"), (r"o", "0")],
+    ]
+    for specs in cases:
+        rules = make_rules(specs)
+        for text in ["问：答\n问1答", "ok okay ok", "ab ba aab", "foo\nfoo"]:
+            assert_equivalent(rules, text)
+
+
+def test_ignorecase_subpattern_chars_unknown():
+    """作用域内的 (?i:...) 使大小写字符集无法精确枚举"""
+    assert analyze_pattern("(?i:k)", RULE_PATTERN_FLAGS).chars is None
+    assert analyze_pattern("(?i:1)", RULE_PATTERN_FLAGS).chars == frozenset("1")
+    assert analyze_pattern("(?-i:k)", RULE_PATTERN_FLAGS | 2).chars == frozenset("k")
+    assert extract_literals("(?i:k)", "x", RULE_PATTERN_FLAGS) is None
+
+
+_ATOMS = [
+    "a", "b", "c", "A", "B", "1", "ab", "bc", "[ab]", "[a-c]", r"\d", "a+", "b?", "c*",
+    "(a|b)", "(?:ab|c)", "(?i:a)", "(?i:ab)", "(?i:b)", "K", "(?i:k)", "^", "$",
+    r"\b", "(?=a)", "(?!b)", "(?<=a)", ".", r"\s", "x",
+]
+_TEMPLATES = ["", "x", "y", "ab", "Q", "a", r"\g<0>", r"<\g<0>>"]
+_ALPHABET = "abcABK1kx \n"
+
+
+def random_rules(rng: random.Random):
+    specs = []
+    for _ in range(rng.randint(2, 5)):
+        pattern = "".join(rng.choice(_ATOMS) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.3:
+            pattern = f"({pattern})"
+            template = rng.choice(_TEMPLATES + [r"\1", r"[\1]"])
+        else:
+            template = rng.choice(_TEMPLATES)
+        specs.append((pattern, template))
+    return make_rules(specs)
+
+
+def test_random_plans_match_baseline():
+    rng = random.Random(20261017)
+    merged = fused = 0
+    for _ in range(3000):
+        rules = random_rules(rng)
+        steps = build_rule_plan(rules).steps
+        merged += any(isinstance(step, LiteralGroup) for step in steps)
+        fused += any(isinstance(step, FusedGroup) for step in steps)
+        for _ in range(5):
+            text = "".join(rng.choice(_ALPHABET) for _ in range(rng.randint(0, 24)))
+            assert_equivalent(rules, text)
+    # 确保随机用例确实覆盖了合并与融合
+    assert merged > 50 and fused > 50, (merged, fused)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始规则执行计划等价性测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+流式规则执行测试
+验证 StreamingRuleApplier 按不同分块大小输入时，输出及 applied_rules
+与对完整文本执行 apply_rules 的结果一致，并固定无宽度上界规则的窗口限制
+"""
+
+import random
+
+from app.models.rule import RuleType
+from app.services.rule_engine import rule_engine
+from app.services.rule_plan import build_rule_plan
+from app.services.rule_stream import StreamingRuleApplier
+
+
+CHUNK_SIZES = (1, 2, 3, 5, 8, 64, 10 ** 6)
+
+
+def make_rules(specs, rule_type=RuleType.LANGUAGE_STYLE):
+    """由 (pattern, replacement) 列表构造同类型、优先级递减的规则"""
+    return [
+        {
+            "id": index + 1,
+            "name": f"rule_{index + 1}",
+            "rule_type": rule_type,
+            "priority": len(specs) - index,
+            "pattern": pattern,
+            "replacement": replacement,
+        }
+        for index, (pattern, replacement) in enumerate(specs)
+    ]
+
+
+def applied(info):
+    return [(rule["rule_id"], rule["match_count"]) for rule in info["applied_rules"]]
+
+
+def stream(rules, text, chunk_size, window=None, low_latency=False):
+    """按固定大小分块输入，返回拼接后的输出及应用信息"""
+    applier = rule_engine.create_stream(custom_rules=rules, window=window, low_latency=low_latency)
+    pieces = [applier.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+    pieces.append(applier.finish())
+    return "".join(pieces), applier.info()
+
+
+def assert_stream_matches(rules, text, window=None):
+    """各分块大小、两种模式下的流式结果都与整段执行一致"""
+    expected_text, expected_info = rule_engine.apply_rules_sync(text, custom_rules=rules)
+    for low_latency in (False, True):
+        for chunk_size in CHUNK_SIZES:
+            actual_text, actual_info = stream(rules, text, chunk_size, window, low_latency)
+            assert actual_text == expected_text, (rules, text, chunk_size, low_latency, actual_text)
+            assert applied(actual_info) == applied(expected_info), (rules, text, chunk_size, low_latency)
+
+
+def test_match_across_chunk_boundary():
+    rules = make_rules([("那个", "这个"), (r"\d{3}-\d{4}", "[电话]"), ("嗯+", "")])
+    text = "那个，我的电话是123-4567，嗯嗯嗯嗯，那个那个\n号码是765-4321那个"
+    assert_stream_matches(rules, text)
+    # 匹配恰好被切在两个分块之间
+    chunks = ["他说那", "个号码是12", "3-45", "67嗯", "嗯"]
+    for low_latency in (False, True):
+        applier = rule_engine.create_stream(custom_rules=rules, low_latency=low_latency)
+        output = "".join(applier.feed(chunk) for chunk in chunks) + applier.finish()
+        expected, _ = rule_engine.apply_rules_sync("".join(chunks), custom_rules=rules)
+        assert output == expected and "[电话]" in output, (low_latency, output)
+
+
+def test_group_references_and_anchors():
+    rules = make_rules([
+        (r"(\d+)元", r"\1块"),
+        (r"^问：", "Q:"),
+        (r"\bok\b", "好"),
+        (r"[ \t]+$", ""),
+    ])
+    text = "问：价格12元吗 \nok，okay 30元\n问：ok  \n答：100元"
+    assert_stream_matches(rules, text)
+
+
+def test_buffered_rules():
+    """有执行条件、前后查看、全文锚点的规则缓存全部输入后执行"""
+    rules = make_rules([
+        ("嗯", ""),
+        ("(?<=问)：", ":"),
+        (r"\A", "开头"),
+        ("他", "她"),
+    ])
+    rules[3]["conditions"] = {"contains": ["她"]}
+    assert_stream_matches(rules, "问：嗯他来了吗\n答：她来了，嗯")
+    assert_stream_matches(rules, "问：嗯他来了吗\n答：没有")
+
+
+def test_line_local_rules_with_plan_groups():
+    rules = make_rules([("嗯|啊", ""), ("那个", "这个"), (r"\d{2}", "##"), ("[ \t]+", " ")])
+    text = "嗯 那个  12啊\n  啊那个 345\t\t6\n" * 20
+    assert_stream_matches(rules, text)
+
+
+def test_unbounded_match_within_window():
+    rules = make_rules([("a+", "X"), ("b[^\n]*c", "Y")])
+    assert_stream_matches(rules, "xaaaay b--c aaaaaaa bbbc", window=16)
+
+
+def test_unbounded_match_longer_than_window():
+    """
+    无宽度上界规则的匹配超过回看窗口时被拆成多次匹配（文档中说明的限制）
+
+    行内规则默认在整行上执行，不受窗口限制；低延迟模式下逐条流式替换，
+    匹配在起点超出回看范围（窗口 + 1）且长度达到窗口后即输出，拆分位置
+    取决于分块：逐字输入时 20 个字符被拆成 9 + 9 + 2，每次 4 个字符时拆成 12 + 8。
+    直接使用单条规则的执行计划，避免默认规则的回看窗口改变分块。
+    """
+    plan = build_rule_plan(make_rules([("a+", "X")]))
+    text = "a" * 20
+
+    def run(chunk_size, low_latency):
+        applier = StreamingRuleApplier(plan, window=8, low_latency=low_latency)
+        pieces = [applier.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+        return "".join(pieces) + applier.finish(), applier.info()
+
+    for chunk_size, expected in ((1, "XXX"), (4, "XX")):
+        assert run(chunk_size, False)[0] == "X"
+        output, info = run(chunk_size, True)
+        assert output == expected, (chunk_size, output)
+        assert applied(info) == [(1, len(expected))]
+    # 整段一次输入时不受窗口限制
+    assert run(len(text), True)[0] == "X"
+
+
+_SPECS = [
+    ("ab", "x"), ("b", "yy"), ("c{2}", "C"), (r"\d+", "#"), ("a[bc]", ""), ("(x)(y)", r"\2\1"),
+    ("^a", "A"), (r"\bb", "B"), ("y$", "Z"), ("[ \t]+", " "), (r"\s+$", ""), ("嗯+", ""),
+]
+_ALPHABET = "abcxy12 \n嗯"
+
+
+def test_random_chunking_matches_full_text():
+    rng = random.Random(20261017)
+    for _ in range(300):
+        rules = make_rules(rng.sample(_SPECS, rng.randint(1, 5)))
+        text = "".join(rng.choice(_ALPHABET) for _ in range(rng.randint(0, 40)))
+        assert_stream_matches(rules, text, window=16)
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始流式规则执行测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()
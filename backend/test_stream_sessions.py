@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+可续传流式会话测试
+验证 StreamSession 按 Last-Event-ID 续传、读取过慢时缓存溢出返回
+stream_buffer_overflow、StreamSessionRegistry 的过期清理、淘汰与会话数上限，
+以及 /convert/stream 的 v1、v2 协议
+"""
+
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 导入 supabase_transcription 时会创建 Supabase 客户端（不发起请求），未配置时使用占位值
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+
+from app.api.endpoints import supabase_transcription  # noqa: E402
+from app.services.http_client import http_client  # noqa: E402
+from app.services.llm_cache import llm_cache  # noqa: E402
+from app.services.llm_providers import OpenAICompatibleProvider  # noqa: E402
+from app.services.llm_router import llm_router  # noqa: E402
+from app.services.stream_sessions import (  # noqa: E402
+    StreamSession, StreamSessionLimitError, StreamSessionRegistry, parse_event_id, stream_sessions
+)
+
+
+class Feed:
+    """由测试控制的事件来源，put(None) 结束"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, item):
+        self.queue.put_nowait(item)
+
+    async def events(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            yield item
+
+
+async def wait_until(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.001)
+
+
+def parse_sse(body: str):
+    """解析 SSE 文本，返回 [(事件ID, 事件类型, 数据)]"""
+    events = []
+    for block in body.split("\n\n"):
+        if not block.strip():
+            continue
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def collect(stream):
+    return parse_sse("".join([event async for event in stream]))
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc:12") == ("abc", 12)
+    assert parse_event_id(" a:b:3 ") == ("a:b", 3)
+    for value in (None, "", "abc", ":3", "abc:", "abc:x", "abc:-1"):
+        assert parse_event_id(value) is None, value
+
+
+def test_replay_after_last_event_id():
+    async def main():
+        feed = Feed()
+        session = StreamSession("s1", feed.events())
+        for index in range(1, 6):
+            feed.put(("delta", {"content": f"第{index}段"}))
+        feed.put(None)
+        await wait_until(lambda: session.done)
+
+        events = await collect(session.replay())
+        assert [event_id for event_id, _, _ in events] == [f"s1:{index}" for index in range(1, 6)]
+        assert [data["content"] for _, _, data in events] == [f"第{index}段" for index in range(1, 6)]
+
+        # 从 Last-Event-ID 之后继续
+        after = parse_event_id(events[2][0])[1]
+        resumed = await collect(session.replay(after))
+        assert resumed == events[3:]
+        assert await collect(session.replay(5)) == []
+
+    asyncio.run(main())
+
+
+def test_live_reader_waits_for_new_events():
+    async def main():
+        feed = Feed()
+        session = StreamSession("live", feed.events())
+        reader = asyncio.create_task(collect(session.replay()))
+        for index in range(3):
+            feed.put(("delta", {"content": str(index)}))
+            await wait_until(lambda: session.count == index + 1)
+        assert not reader.done()
+        feed.put(("complete", {"success": True}))
+        feed.put(None)
+        events = await asyncio.wait_for(reader, 2)
+        assert [kind for _, kind, _ in events] == ["delta"] * 3 + ["complete"]
+
+    asyncio.run(main())
+
+
+def test_generator_error_becomes_error_event():
+    async def failing():
+        yield "delta", {"content": "部分"}
+        raise RuntimeError("上游失败")
+
+    async def main():
+        session = StreamSession("err", failing())
+        events = await asyncio.wait_for(collect(session.replay()), 2)
+        assert [kind for _, kind, _ in events] == ["delta", "error"]
+        assert events[-1][2]["error"] == "上游失败" and session.done
+
+    asyncio.run(main())
+
+
+def test_overflow_when_resuming_dropped_events():
+    async def main():
+        feed = Feed()
+        session = StreamSession("full", feed.events(), max_bytes=300)
+        for index in range(20):
+            feed.put(("delta", {"content": f"{index:02d}" * 10}))
+        feed.put(None)
+        await wait_until(lambda: session.done)
+
+        # 只保留最新的事件，不超过上限
+        assert session.first_seq > 1 and session.size <= 300
+        assert session.count - session.first_seq + 1 == len(session.events)
+        assert not session.can_replay(0) and session.can_replay(session.first_seq - 1)
+
+        events = await collect(session.replay(0))
+        assert len(events) == 1 and events[0][1] == "error"
+        assert events[0][2]["error"] == "stream_buffer_overflow"
+
+        # 仍在缓存中的部分可以正常续传
+        events = await collect(session.replay(session.first_seq - 1))
+        assert [event_id for event_id, _, _ in events] == [
+            f"full:{seq}" for seq in range(session.first_seq, session.count + 1)
+        ]
+
+    asyncio.run(main())
+
+
+def test_slow_reader_gets_overflow_error():
+    """读取方暂停期间后续事件被丢弃，继续读取时收到 error 事件而不是错位的事件"""
+    async def main():
+        feed = Feed()
+        session = StreamSession("slow", feed.events(), max_bytes=400)
+        for index in range(3):
+            feed.put(("delta", {"content": f"a{index}"}))
+        await wait_until(lambda: session.count == 3)
+
+        reader = session.replay()
+        first = parse_sse(await reader.__anext__())
+        assert first[0][0] == "slow:1"
+
+        # 读取方暂停在第一个事件之后，后台继续生成直到丢弃了第 2 个事件
+        for index in range(30):
+            feed.put(("delta", {"content": f"b{index}" * 10}))
+        feed.put(None)
+        await wait_until(lambda: session.done)
+        assert session.first_seq > 2
+
+        rest = parse_sse("".join([event async for event in reader]))
+        assert len(rest) == 1 and rest[0][1] == "error", rest
+        assert rest[0][2]["error"] == "stream_buffer_overflow"
+
+    asyncio.run(main())
+
+
+async def finished_session(registry: StreamSessionRegistry):
+    feed = Feed()
+    session = registry.start(feed.events())
+    feed.put(("complete", {"success": True}))
+    feed.put(None)
+    await wait_until(lambda: session.done)
+    return session
+
+
+def test_ttl_expiry():
+    async def main():
+        registry = StreamSessionRegistry(ttl=0.05, max_sessions=10)
+        finished = await finished_session(registry)
+        running_feed = Feed()
+        running = registry.start(running_feed.events())
+        assert registry.get(finished.id) is finished
+
+        await asyncio.sleep(0.1)
+        # 结束超过 ttl 的会话被清理，进行中的会话不受影响
+        assert registry.get(finished.id) is None
+        assert registry.get(running.id) is running
+
+        running_feed.put(None)
+        await wait_until(lambda: running.done)
+        assert registry.get(running.id) is running
+        await asyncio.sleep(0.1)
+        assert registry.get(running.id) is None
+
+    asyncio.run(main())
+
+
+def test_eviction_and_session_cap():
+    async def main():
+        registry = StreamSessionRegistry(ttl=300, max_sessions=3)
+        first = await finished_session(registry)
+        second = await finished_session(registry)
+        feed = Feed()
+        running = registry.start(feed.events())
+
+        # 达到上限时淘汰最早结束的会话
+        third = registry.start(Feed().events())
+        assert registry.get(first.id) is None and registry.get(second.id) is second
+        fourth = registry.start(Feed().events())
+        assert registry.get(second.id) is None
+
+        # 全部进行中时拒绝新会话
+        try:
+            registry.start(Feed().events())
+        except StreamSessionLimitError:
+            pass
+        else:
+            raise AssertionError("会话数达到上限时应抛出 StreamSessionLimitError")
+        assert {session.id for session in (running, third, fourth)} == set(registry._sessions)
+
+        registry.close()
+        await asyncio.sleep(0)
+        assert registry._sessions == {} and running._task.cancelled()
+
+    asyncio.run(main())
+
+
+ANSWER_TOKENS = ["我昨天", "晚上在家", "看电视，", "看的是新闻联播。"]
+
+
+def llm_handler(request: httpx.Request) -> httpx.Response:
+    lines = [
+        f"data: {json.dumps({'choices': [{'delta': {'content': token}}]}, ensure_ascii=False)}"
+        for token in ANSWER_TOKENS
+    ]
+    return httpx.Response(200, text="\n\n".join(lines + ["data: [DONE]"]) + "\n\n")
+
+
+@contextmanager
+def protocol_client():
+    """挂载 supabase_transcription 路由的测试应用，LLM 使用假的服务商接口"""
+    saved = (http_client._create, http_client._client, llm_router.providers, llm_cache.enabled)
+    http_client._create = lambda: httpx.AsyncClient(transport=httpx.MockTransport(llm_handler))
+    http_client._client = None
+    llm_router.providers = [OpenAICompatibleProvider("test", "https://llm.test/v1", "test-model", "test-key")]
+    llm_cache.enabled = False
+    app = FastAPI()
+    app.include_router(supabase_transcription.router)
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        stream_sessions.close()
+        http_client._create, http_client._client, llm_router.providers, llm_cache.enabled = saved
+
+
+TEXT = "问：你昨天晚上在哪里？\n答：我在家里看电视。\n问：看的什么节目？\n答：新闻联播。"
+
+
+def test_convert_stream_protocols():
+    answer = "".join(ANSWER_TOKENS)
+    with protocol_client() as client:
+        # v1：chunk 事件附带全文，complete 事件附带最终文本，没有事件ID
+        response = client.post("/convert/stream", json={"text": TEXT})
+        assert response.status_code == 200 and "x-stream-id" not in response.headers
+        events = parse_sse(response.text)
+        assert events[0][1] == "start" and events[0][2]["protocol"] == 1
+        chunks = [data for _, kind, data in events if kind == "chunk"]
+        assert [data["content"] for data in chunks] == ANSWER_TOKENS
+        assert chunks[-1]["partial_content"] == answer
+        assert events[-1][1] == "complete" and events[-1][2]["final_content"] == answer
+        assert all(event_id is None for event_id, _, _ in events)
+
+        # v2：delta 事件只含增量，事件带 "会话ID:序号"，complete 不重复全文
+        response = client.post("/convert/stream", json={"text": TEXT, "protocol": 2})
+        assert response.status_code == 200
+        stream_id = response.headers["x-stream-id"]
+        events = parse_sse(response.text)
+        assert [event_id for event_id, _, _ in events] == [f"{stream_id}:{seq}" for seq in range(1, len(events) + 1)]
+        assert events[0][2]["protocol"] == 2
+        assert "".join(data["content"] for _, kind, data in events if kind == "delta") == answer
+        assert events[-1][1] == "complete" and "final_content" not in events[-1][2]
+        assert events[-1][2]["chunks"] == len(ANSWER_TOKENS)
+
+        # 带 Last-Event-ID 续传，从下一个事件开始
+        resumed = client.get(f"/convert/stream/{stream_id}", headers={"Last-Event-ID": events[2][0]})
+        assert resumed.status_code == 200
+        assert [event[:2] for event in parse_sse(resumed.text)] == [event[:2] for event in events[3:]]
+        # 不带 Last-Event-ID 时从头发送，其他会话的事件ID 被忽略
+        resumed = client.get(f"/convert/stream/{stream_id}", headers={"Last-Event-ID": "other:3"})
+        assert len(parse_sse(resumed.text)) == len(events)
+        assert client.get("/convert/stream/missing").status_code == 404
+
+        # stream-simple 同样支持 v2
+        response = client.post("/convert/stream-simple", json={"text": TEXT, "protocol": 2})
+        assert response.status_code == 200 and response.headers["x-stream-id"] != stream_id
+
+        # 不支持的协议版本
+        for protocol in (0, 3, "v2"):
+            assert client.post("/convert/stream", json={"text": TEXT, "protocol": protocol}).status_code == 422
+        assert client.post("/convert/stream", json={"text": "  ", "protocol": 2}).status_code == 400
+
+
+def test_convert_stream_resume_after_overflow_returns_410():
+    with protocol_client() as client:
+        original = stream_sessions.max_bytes
+        stream_sessions.max_bytes = 600
+        try:
+            response = client.post("/convert/stream", json={"text": TEXT, "protocol": 2})
+        finally:
+            stream_sessions.max_bytes = original
+        stream_id = response.headers["x-stream-id"]
+        # 一次性读取时事件尚未被丢弃；之后从头续传需要的事件已不在缓存中
+        assert parse_sse(response.text)[-1][1] in ("complete", "error")
+        assert client.get(f"/convert/stream/{stream_id}").status_code == 410
+
+
+def main():
+    """主测试函数"""
+    print("🚀 开始可续传流式会话测试\n")
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    for test in tests:
+        test()
+        print(f"✅ {test.__name__}")
+    print(f"\n🎉 {len(tests)} 项测试全部通过")
+
+
+if __name__ == "__main__":
+    main()